@@ -6,9 +6,15 @@ Core模块：核心功能模块
 from .lsl_manager import LSLManager
 from .transform_manager import TransformManager
 from .audio_manager import AudioManager
+from .frame_bus import FrameBus
+from .lsl_shards import LSLShardGroup
+from .natnet_aggregator import NatNetAggregator
 
 __all__ = [
     'LSLManager',
     'TransformManager',
     'AudioManager',
+    'FrameBus',
+    'LSLShardGroup',
+    'NatNetAggregator',
 ]
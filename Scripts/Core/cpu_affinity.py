@@ -0,0 +1,66 @@
+"""
+CPU亲和性工具 (V3.4)
+多分片采集时将各分片的接收线程/采集进程绑定到不同CPU核心，减少相互抢占
+
+- Linux: os.sched_setaffinity（支持线程级绑定）
+- Windows/macOS: psutil（可选依赖，仅支持进程级绑定）
+"""
+
+import os
+import threading
+import logging
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+logger = logging.getLogger('CPUAffinity')
+
+
+def pin_current_thread(cpus):
+    """将当前线程绑定到指定CPU核心（仅Linux支持线程级绑定）
+
+    Args:
+        cpus: CPU核心编号列表，如[2, 3]
+    Returns:
+        bool: 是否成功
+    """
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(threading.get_native_id(), set(cpus))
+            logger.info(f"线程 {threading.current_thread().name} 已绑定CPU: {sorted(cpus)}")
+            return True
+
+        logger.warning("当前平台不支持线程级CPU绑定，已忽略（可改用进程分片模式）")
+        return False
+
+    except Exception as e:
+        logger.error(f"线程CPU绑定失败: {e}")
+        return False
+
+
+def pin_current_process(cpus):
+    """将当前进程绑定到指定CPU核心
+
+    Args:
+        cpus: CPU核心编号列表，如[2, 3]
+    Returns:
+        bool: 是否成功
+    """
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, set(cpus))
+        elif psutil:
+            psutil.Process().cpu_affinity(list(cpus))
+        else:
+            logger.warning("未安装psutil，无法设置进程CPU绑定")
+            return False
+
+        logger.info(f"进程 {os.getpid()} 已绑定CPU: {sorted(cpus)}")
+        return True
+
+    except Exception as e:
+        logger.error(f"进程CPU绑定失败: {e}")
+        return False
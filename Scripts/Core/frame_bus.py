@@ -0,0 +1,265 @@
+"""
+NatNet帧分发总线 (V3.4)
+将单一的NatNet帧回调扇出给多个命名订阅者
+
+每个订阅者拥有：
+- 独立的有界队列和投递策略（latest仅最新帧 / lossless尽量无损 / sampled每N帧取样）
+- 独立的执行方式（inline在接收线程内直接执行，或threaded独立线程）
+- 独立的延迟与丢帧统计
+
+慢速订阅者（如CSV保存、诊断打印）只会丢弃自己队列中的帧，
+不会阻塞接收线程，也不会延迟实时位置/LSL位置推送路径
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+
+
+# 投递策略
+POLICY_LATEST = 'latest'        # 仅保留最新帧（队列长度1，旧帧被覆盖）
+POLICY_LOSSLESS = 'lossless'    # 按顺序投递全部帧（队列满时丢弃新帧并计数）
+POLICY_SAMPLED = 'sampled'      # 每N帧投递一帧
+
+VALID_POLICIES = (POLICY_LATEST, POLICY_LOSSLESS, POLICY_SAMPLED)
+
+
+class FrameSubscriber:
+    """帧总线订阅者"""
+
+    def __init__(self, name, callback, policy=POLICY_LOSSLESS, queue_size=256,
+                 sample_every=1, threaded=True):
+        """
+        Args:
+            name: 订阅者名称（唯一）
+            callback: 回调函数 callback(frame)
+            policy: 投递策略 latest / lossless / sampled
+            queue_size: 队列容量（latest策略固定为1）
+            sample_every: sampled策略下每N帧投递一次
+            threaded: True=独立线程执行，False=在发布线程内直接执行
+        """
+        if policy not in VALID_POLICIES:
+            raise ValueError(f"未知投递策略: {policy}")
+
+        self.name = name
+        self.callback = callback
+        self.policy = policy
+        self.sample_every = max(1, int(sample_every))
+        self.threaded = threaded
+        self.enabled = True
+        self.logger = logging.getLogger(f'FrameSubscriber.{name}')
+
+        # 有界队列（元素为 (seq, publish_time, frame)）
+        maxlen = 1 if policy == POLICY_LATEST else max(1, int(queue_size))
+        self.queue = deque(maxlen=maxlen)
+        self.condition = threading.Condition()
+
+        # 线程
+        self.thread = None
+        self.running = False
+        self.draining = False  # 停止时是否先处理完队列中的剩余帧
+
+        # 统计信息
+        self.offered_count = 0
+        self.delivered_count = 0
+        self.dropped_count = 0
+        self.error_count = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.last_seq = 0
+
+    def offer(self, seq, publish_time, frame):
+        """(发布线程) 投递一帧，永不阻塞"""
+        if not self.enabled:
+            return
+
+        self.offered_count += 1
+        if self.policy == POLICY_SAMPLED and (self.offered_count - 1) % self.sample_every != 0:
+            return
+
+        if not self.threaded:
+            self._deliver(seq, publish_time, frame)
+            return
+
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                if self.policy == POLICY_LATEST:
+                    # 覆盖旧帧
+                    self.queue.append((seq, publish_time, frame))
+                else:
+                    # 队列已满：丢弃新帧，保持已排队帧的连续性
+                    pass
+                self.dropped_count += 1
+            else:
+                self.queue.append((seq, publish_time, frame))
+            self.condition.notify()
+
+    def _deliver(self, seq, publish_time, frame):
+        """执行回调并更新延迟统计"""
+        lag = time.perf_counter() - publish_time
+        self.last_lag = lag
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        self.last_seq = seq
+
+        try:
+            self.callback(frame)
+        except Exception as e:
+            self.error_count += 1
+            self.logger.error(f"订阅者回调错误: {e}")
+
+        self.delivered_count += 1
+
+    def _run(self):
+        """(订阅者线程) 从队列取帧并执行回调（drain停止时处理完剩余帧后退出）"""
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait(timeout=0.1)
+                if not self.queue or not (self.running or self.draining):
+                    break
+                seq, publish_time, frame = self.queue.popleft()
+
+            self._deliver(seq, publish_time, frame)
+
+    def start(self):
+        """启动订阅者线程（inline订阅者无需线程）"""
+        if not self.threaded or self.running:
+            return
+
+        self.running = True
+        self.thread = threading.Thread(
+            target=self._run,
+            name=f'FrameSubscriber-{self.name}',
+            daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout=1.0, drain=False):
+        """停止订阅者线程
+
+        Args:
+            timeout: 等待线程结束的超时（秒）
+            drain: 是否先处理完队列中的剩余帧（无损订阅者关闭前使用），超时后未处理的帧计为丢帧
+        """
+        if not self.running:
+            return
+
+        with self.condition:
+            self.draining = drain
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        self.thread = None
+
+        with self.condition:
+            self.draining = False
+            if self.queue:
+                self.dropped_count += len(self.queue)
+                self.logger.warning(f"停止时丢弃 {len(self.queue)} 帧")
+                self.queue.clear()
+
+    def get_stats(self):
+        """获取订阅者统计信息"""
+        return {
+            'policy': self.policy,
+            'threaded': self.threaded,
+            'enabled': self.enabled,
+            'queue_depth': len(self.queue),
+            'queue_capacity': self.queue.maxlen,
+            'offered': self.offered_count,
+            'delivered': self.delivered_count,
+            'dropped': self.dropped_count,
+            'errors': self.error_count,
+            'last_lag_ms': self.last_lag * 1000.0,
+            'max_lag_ms': self.max_lag * 1000.0,
+            'mean_lag_ms': (self.total_lag / self.delivered_count * 1000.0) if self.delivered_count else 0.0
+        }
+
+
+class FrameBus:
+    """NatNet帧分发总线"""
+
+    def __init__(self, name='FrameBus'):
+        self.logger = logging.getLogger(name)
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.running = False
+
+    def subscribe(self, name, callback, policy=POLICY_LOSSLESS, queue_size=256,
+                  sample_every=1, threaded=True):
+        """注册命名订阅者（同名订阅者会被替换）
+
+        inline订阅者按注册顺序在发布线程内执行，应保持轻量
+
+        Returns:
+            FrameSubscriber: 订阅者对象
+        """
+        subscriber = FrameSubscriber(name, callback, policy, queue_size, sample_every, threaded)
+
+        with self.lock:
+            old = self.subscribers.get(name)
+            subscribers = dict(self.subscribers)
+            subscribers[name] = subscriber
+            self.subscribers = subscribers
+
+        if old:
+            old.stop()
+        if self.running:
+            subscriber.start()
+
+        self.logger.info(f"订阅者已注册: {name} (policy={policy}, threaded={threaded})")
+        return subscriber
+
+    def unsubscribe(self, name):
+        """注销订阅者"""
+        with self.lock:
+            subscribers = dict(self.subscribers)
+            subscriber = subscribers.pop(name, None)
+            self.subscribers = subscribers
+
+        if subscriber:
+            subscriber.stop()
+            self.logger.info(f"订阅者已注销: {name}")
+            return True
+        return False
+
+    def get_subscriber(self, name):
+        """获取订阅者对象"""
+        return self.subscribers.get(name)
+
+    def publish(self, frame):
+        """(接收线程) 将一帧分发给所有订阅者"""
+        self.seq += 1
+        publish_time = time.perf_counter()
+
+        # 订阅者字典采用写时复制，发布路径无需加锁
+        for subscriber in self.subscribers.values():
+            subscriber.offer(self.seq, publish_time, frame)
+
+    def start(self):
+        """启动所有threaded订阅者"""
+        self.running = True
+        for subscriber in self.subscribers.values():
+            subscriber.start()
+
+    def stop(self, drain=False, timeout=1.0):
+        """停止所有订阅者线程
+
+        Args:
+            drain: 是否让各订阅者先处理完队列中的剩余帧（应先停止发布）
+            timeout: 每个订阅者的等待超时（秒）
+        """
+        self.running = False
+        for subscriber in self.subscribers.values():
+            subscriber.stop(timeout=timeout, drain=drain)
+
+    def get_stats(self):
+        """获取所有订阅者统计信息"""
+        return {name: sub.get_stats() for name, sub in self.subscribers.items()}
@@ -0,0 +1,274 @@
+"""
+地理围栏事件引擎 (V3.4)
+在采集线程上对每个NatNet帧评估声明式区域（圆形、墙面带、多边形），
+产生带帧时间戳（LSL时钟）的进入/离开/停留事件，实验流程从队列中读取，
+到达判定与Marker时间戳不再受渲染循环帧率和取样时机影响
+
+- 区域以水平面(X, Z)上的有符号距离描述：< 0 在区域内，> 0 在区域外（米）
+- 滞回：有符号距离 <= 0 时进入；超过 exit_margin 后才判定离开，边界抖动不会反复触发
+- 停留：进入后连续停留 dwell 秒（按帧时间戳计算）时触发一次停留事件
+- 事件：{'type', 'subject', 'region', 'timestamp', 'frame_number', 'position'}
+- 区域较多时经spatial_index.RegionGridIndex只评估所在格子的候选区域与当前所在区域
+"""
+
+import math
+import threading
+import logging
+from queue import Queue, Full, Empty
+
+
+EVENT_ENTER = 'enter'
+EVENT_EXIT = 'exit'
+EVENT_DWELL = 'dwell'
+
+# 区域数超过该值时使用网格索引筛选候选区域
+INDEX_MIN_REGIONS = 8
+
+
+class CircleRegion:
+    """圆形区域（隐藏目标、墙面标记邻域）"""
+
+    def __init__(self, region_id, center, radius, dwell=None):
+        """
+        Args:
+            region_id: 区域ID（如'A3'、'P1'）
+            center: (x, z) 圆心（米）
+            radius: 半径（米）
+            dwell: 停留事件所需时长（秒），None表示不产生停留事件
+        """
+        self.region_id = region_id
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = float(radius)
+        self.dwell = dwell
+
+    def signed_distance(self, x, z):
+        return math.hypot(x - self.center[0], z - self.center[1]) - self.radius
+
+    def bounds(self):
+        """外接矩形 (x_min, z_min, x_max, z_max)"""
+        cx, cz = self.center
+        return cx - self.radius, cz - self.radius, cx + self.radius, cz + self.radius
+
+
+class BandRegion:
+    """线段带状区域（沿墙面的一条带）"""
+
+    def __init__(self, region_id, start, end, half_width, dwell=None):
+        """
+        Args:
+            start, end: (x, z) 线段端点（米）
+            half_width: 带半宽（米）
+        """
+        self.region_id = region_id
+        self.start = (float(start[0]), float(start[1]))
+        self.end = (float(end[0]), float(end[1]))
+        self.half_width = float(half_width)
+        self.dwell = dwell
+
+        dx, dz = self.end[0] - self.start[0], self.end[1] - self.start[1]
+        self._dx, self._dz = dx, dz
+        self._length_sq = dx * dx + dz * dz
+
+    def signed_distance(self, x, z):
+        px, pz = x - self.start[0], z - self.start[1]
+        t = (px * self._dx + pz * self._dz) / self._length_sq if self._length_sq > 0 else 0.0
+        t = min(1.0, max(0.0, t))
+        return math.hypot(px - t * self._dx, pz - t * self._dz) - self.half_width
+
+    def bounds(self):
+        w = self.half_width
+        return (min(self.start[0], self.end[0]) - w, min(self.start[1], self.end[1]) - w,
+                max(self.start[0], self.end[0]) + w, max(self.start[1], self.end[1]) + w)
+
+
+class PolygonRegion:
+    """多边形区域（顶点按顺序给出，自动闭合）"""
+
+    def __init__(self, region_id, vertices, dwell=None):
+        """
+        Args:
+            vertices: [(x, z), ...] 顶点（米），至少3个
+        """
+        if len(vertices) < 3:
+            raise ValueError(f"多边形区域至少需要3个顶点: {region_id}")
+        self.region_id = region_id
+        self.vertices = [(float(v[0]), float(v[1])) for v in vertices]
+        self.dwell = dwell
+
+    def _contains(self, x, z):
+        """射线法判断点是否在多边形内"""
+        inside = False
+        vertices = self.vertices
+        j = len(vertices) - 1
+        for i in range(len(vertices)):
+            xi, zi = vertices[i]
+            xj, zj = vertices[j]
+            if (zi > z) != (zj > z) and x < (xj - xi) * (z - zi) / (zj - zi) + xi:
+                inside = not inside
+            j = i
+        return inside
+
+    def signed_distance(self, x, z):
+        distance = float('inf')
+        vertices = self.vertices
+        j = len(vertices) - 1
+        for i in range(len(vertices)):
+            (ax, az), (bx, bz) = vertices[j], vertices[i]
+            dx, dz = bx - ax, bz - az
+            length_sq = dx * dx + dz * dz
+            t = ((x - ax) * dx + (z - az) * dz) / length_sq if length_sq > 0 else 0.0
+            t = min(1.0, max(0.0, t))
+            distance = min(distance, math.hypot(x - ax - t * dx, z - az - t * dz))
+            j = i
+        return -distance if self._contains(x, z) else distance
+
+    def bounds(self):
+        xs = [v[0] for v in self.vertices]
+        zs = [v[1] for v in self.vertices]
+        return min(xs), min(zs), max(xs), max(zs)
+
+
+class _RegionState:
+    """单个(被试, 区域)的围栏状态"""
+
+    __slots__ = ('inside', 'enter_time', 'dwell_fired')
+
+    def __init__(self):
+        self.inside = False
+        self.enter_time = None
+        self.dwell_fired = False
+
+
+class GeofenceEngine:
+    """逐帧围栏评估与事件队列"""
+
+    def __init__(self, exit_margin=0.05, queue_size=1000):
+        """
+        Args:
+            exit_margin: 离开判定的滞回距离（米）
+            queue_size: 事件队列容量（满时丢弃最新事件并计数）
+        """
+        self.logger = logging.getLogger('GeofenceEngine')
+        self.exit_margin = exit_margin
+        self.events = Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+
+        # 写时复制：采集线程读取的 (regions, index, states) 整体替换
+        self.regions = ()
+        self.subjects = ()
+        self._config = ((), None, {})
+
+        self.event_count = 0
+        self.dropped_events = 0
+
+    @property
+    def active(self):
+        return bool(self.regions and self.subjects)
+
+    def set_regions(self, regions, subjects):
+        """设置当前评估的区域与被试（替换之前的设置，清空未读事件）
+
+        Args:
+            regions: 区域对象列表
+            subjects: 被试名称列表（如['Sub001']）
+        """
+        with self.lock:
+            regions = tuple(regions)
+            subjects = tuple(subjects)
+            index = None
+            if len(regions) > INDEX_MIN_REGIONS:
+                from .spatial_index import RegionGridIndex
+                index = RegionGridIndex(regions, padding=self.exit_margin)
+            # {被试: ([每个区域的状态], 当前所在区域序号集合)}
+            states = {subject: ([_RegionState() for _ in regions], set()) for subject in subjects}
+            self._config = (regions, index, states)
+            self.regions = regions
+            self.subjects = subjects
+            self._drain_queue()
+
+    def clear(self):
+        """停止评估"""
+        self.set_regions([], [])
+
+    def _drain_queue(self):
+        while True:
+            try:
+                self.events.get_nowait()
+            except Empty:
+                return
+
+    def update(self, positions, timestamp, frame_number=None):
+        """(采集线程) 评估一帧
+
+        Args:
+            positions: {被试: (x, z)}，仅包含本帧有有效位置的被试
+            timestamp: 帧时间戳（LSL时钟）
+            frame_number: 帧号
+        """
+        regions, index, states = self._config
+        for subject, (x, z) in positions.items():
+            if subject not in states:
+                continue
+            subject_states, inside_set = states[subject]
+
+            if index is None:
+                candidates = range(len(regions))
+            else:
+                # 所在格子的候选区域 + 当前处于其中的区域（需要判定离开）
+                candidates = inside_set.union(index.candidates(x, z).tolist())
+
+            for i in candidates:
+                region = regions[i]
+                state = subject_states[i]
+                distance = region.signed_distance(x, z)
+
+                if not state.inside:
+                    if distance <= 0.0:
+                        state.inside = True
+                        inside_set.add(i)
+                        state.enter_time = timestamp
+                        state.dwell_fired = False
+                        self._emit(EVENT_ENTER, subject, region, timestamp, frame_number, (x, z))
+                    continue
+
+                if distance > self.exit_margin:
+                    state.inside = False
+                    inside_set.discard(i)
+                    self._emit(EVENT_EXIT, subject, region, timestamp, frame_number, (x, z))
+                elif (region.dwell is not None and not state.dwell_fired
+                      and timestamp - state.enter_time >= region.dwell):
+                    state.dwell_fired = True
+                    self._emit(EVENT_DWELL, subject, region, timestamp, frame_number, (x, z))
+
+    def _emit(self, event_type, subject, region, timestamp, frame_number, position):
+        event = {
+            'type': event_type,
+            'subject': subject,
+            'region': region.region_id,
+            'timestamp': timestamp,
+            'frame_number': frame_number,
+            'position': position
+        }
+        try:
+            self.events.put_nowait(event)
+            self.event_count += 1
+        except Full:
+            self.dropped_events += 1
+
+    def poll_events(self):
+        """(主线程) 取出所有未读事件（按发生顺序）"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except Empty:
+                return events
+
+    def get_stats(self):
+        return {
+            'regions': [region.region_id for region in self.regions],
+            'subjects': list(self.subjects),
+            'events': self.event_count,
+            'pending': self.events.qsize(),
+            'dropped': self.dropped_events
+        }
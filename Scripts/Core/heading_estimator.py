@@ -0,0 +1,95 @@
+"""
+朝向估计器 (V3.4)
+每个NatNet帧将所有刚体/骨骼根关节的四元数一次性向量化转换为水平朝向（yaw）和角速度
+
+- 坐标系：Motive Y轴向上，yaw为前向轴在X-Z水平面上的方位角（弧度，atan2(f_x, f_z)），
+  前向轴投影到水平面后计算，俯仰/侧倾不影响朝向
+- 角速度：相邻两帧yaw差值展开到[-π, π)后除以帧间隔（弧度/秒），经指数平滑
+- 四元数顺序与NatNet一致：(qx, qy, qz, qw)
+"""
+
+import numpy as np
+
+
+class HeadingEstimator:
+    """向量化朝向与角速度估计"""
+
+    def __init__(self, forward_axis='z', rate_alpha=0.3, capacity=16):
+        """
+        Args:
+            forward_axis: 物体局部前向轴（'z'或'x'，取决于Motive中刚体的建立方式）
+            rate_alpha: 角速度指数平滑系数（1.0表示不平滑）
+            capacity: 初始对象容量（超出时自动扩容）
+        """
+        self.forward_axis = forward_axis
+        self.rate_alpha = rate_alpha
+
+        self.index = {}  # {name: 行号}
+        self.names = []
+        self.yaw = np.zeros(capacity)
+        self.yaw_rate = np.zeros(capacity)
+        self.last_time = np.full(capacity, np.nan)
+
+    def _rows(self, names):
+        """获取名称对应的行号（新对象分配新行）"""
+        rows = []
+        for name in names:
+            row = self.index.get(name)
+            if row is None:
+                row = len(self.names)
+                if row >= len(self.yaw):
+                    grow = len(self.yaw)
+                    self.yaw = np.concatenate([self.yaw, np.zeros(grow)])
+                    self.yaw_rate = np.concatenate([self.yaw_rate, np.zeros(grow)])
+                    self.last_time = np.concatenate([self.last_time, np.full(grow, np.nan)])
+                self.index[name] = row
+                self.names.append(name)
+            rows.append(row)
+        return np.asarray(rows, dtype=np.intp)
+
+    def quaternions_to_yaw(self, quaternions):
+        """四元数数组 (N, 4) [qx, qy, qz, qw] -> yaw数组 (N,)"""
+        q = np.asarray(quaternions, dtype=np.float64)
+        x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+
+        if self.forward_axis == 'x':
+            # R·(1,0,0) 的X/Z分量
+            forward_x = 1.0 - 2.0 * (y * y + z * z)
+            forward_z = 2.0 * (x * z - w * y)
+        else:
+            # R·(0,0,1) 的X/Z分量
+            forward_x = 2.0 * (x * z + w * y)
+            forward_z = 1.0 - 2.0 * (x * x + y * y)
+
+        return np.arctan2(forward_x, forward_z)
+
+    def update(self, names, quaternions, timestamp):
+        """加入一帧所有对象的四元数
+
+        Args:
+            names: 对象名称列表
+            quaternions: (N, 4) 四元数
+            timestamp: 帧时间戳（秒）
+        Returns:
+            (yaw, yaw_rate): 本帧各对象的朝向与角速度数组，顺序与names一致
+        """
+        if not names:
+            return np.empty(0), np.empty(0)
+
+        rows = self._rows(names)
+        yaw = self.quaternions_to_yaw(quaternions)
+
+        # 角速度（首次出现的对象为0）
+        dt = timestamp - self.last_time[rows]
+        delta = np.mod(yaw - self.yaw[rows] + np.pi, 2.0 * np.pi) - np.pi  # 展开到[-π, π)
+        valid = np.isfinite(dt) & (dt > 0)
+        instant_rate = np.where(valid, delta / np.where(valid, dt, 1.0), 0.0)
+        yaw_rate = np.where(valid,
+                            self.yaw_rate[rows] + self.rate_alpha * (instant_rate - self.yaw_rate[rows]),
+                            0.0)
+
+        self.yaw[rows] = yaw
+        self.yaw_rate[rows] = yaw_rate
+        self.last_time[rows] = timestamp
+
+        return yaw, yaw_rate
@@ -0,0 +1,417 @@
+"""
+独立采集进程服务 (V3.4)
+将LSLManager的采集部分（NatNet接收、解码、LSL广播、CSV保存）运行在独立进程中，
+避免PsychoPy进程中的GC停顿、TextStim创建和GIL竞争延迟数据接收
+
+进程间通信：
+- 位置数据：采集进程将帧一致的最新位置写入共享内存（SharedPoseBuffer，序列锁）
+- Marker命令：单向管道，主进程只写、采集进程只读，无需加锁
+- 围栏事件：单向队列，采集进程在围栏判定后立即放入，主进程每帧非阻塞取出（无往返）
+- 控制命令：双向管道（启动/停止数据保存、统计信息、退出），请求带序号，
+  发送/接收在锁内成对执行，超时后迟到的应答按序号丢弃
+
+IngestServiceClient与LSLManager接口兼容，实验流程只需替换管理器实例
+"""
+
+import time
+import logging
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from queue import Empty
+
+from .shared_pose_buffer import SharedPoseBuffer, DEFAULT_SLOT_COUNT
+from .frame_bus import POLICY_LOSSLESS
+from .cpu_affinity import pin_current_process
+
+
+def _ingest_process_main(shm_name, marker_conn, command_conn, geofence_queue, options, shard=None,
+                         cpu_affinity=None):
+    """(采集进程) 运行LSLManager并发布位置到共享内存"""
+    # 先绑定CPU，之后创建的NatNet/保存线程继承该亲和性
+    if cpu_affinity:
+        pin_current_process(cpu_affinity)
+
+    from .lsl_manager import LSLManager
+
+    logger = logging.getLogger('IngestService')
+    pose_buffer = SharedPoseBuffer(shm_name, create=False)
+    manager = LSLManager(shard=shard)
+
+    def publish_shared_poses(data_dict):
+        """(帧总线inline订阅者) 在pose订阅者之后发布整帧位置"""
+        poses = {}
+        for name, skeleton_data in list(manager.latest_skeleton_data.items()):
+            pos = skeleton_data['pelvis_position']
+            poses[name] = (pos[0], pos[1], pos[2], skeleton_data['timestamp'], skeleton_data['valid'])
+            if 'filtered_position' in skeleton_data:
+                poses[name] += skeleton_data['filtered_position']
+        pose_buffer.publish(poses, data_dict.get('frame_number', 0), data_dict['recv_time'])
+
+    # 围栏设置代号（每次set_geofences递增），主进程据此丢弃旧区域的事件
+    geofence_generation = [0]
+
+    def forward_geofence_events(data_dict):
+        """(帧总线inline订阅者) 在围栏判定之后将本帧事件放入单向队列（不阻塞接收线程）"""
+        generation = geofence_generation[0]
+        events = manager.poll_geofence_events()
+        if events:
+            geofence_queue.put((generation, events))
+
+    manager.frame_bus.subscribe('shared_pose', publish_shared_poses,
+                                policy=POLICY_LOSSLESS, threaded=False)
+    manager.frame_bus.subscribe('geofence_forward', forward_geofence_events,
+                                policy=POLICY_LOSSLESS, threaded=False)
+
+    success = manager.start_services(**options)
+    command_conn.send(('ready', success))
+
+    parent = multiprocessing.parent_process()
+    running = success
+
+    try:
+        while running:
+            ready = wait([marker_conn, command_conn], timeout=0.5)
+
+            if not ready:
+                # 主进程意外退出时自行结束
+                if parent is not None and not parent.is_alive():
+                    logger.warning("主进程已退出，采集进程结束")
+                    break
+                continue
+
+            # Marker优先处理
+            if marker_conn in ready:
+                while marker_conn.poll():
+                    code, meaning, timestamp = marker_conn.recv()
+                    manager.send_marker(code, meaning, timestamp=timestamp)
+
+            if command_conn in ready:
+                # 命令格式: (请求序号, 命令名, *参数)，应答: ('result', 请求序号, 结果)
+                request_id, name, *args = command_conn.recv()
+
+                if name == 'start_saving':
+                    result = manager.start_optitrack_data_saving(*args)
+                elif name == 'stop_saving':
+                    result = manager.stop_optitrack_data_saving()
+                elif name == 'stats':
+                    result = manager.get_stats()
+                elif name == 'connection':
+                    result = manager.is_connected()
+                elif name == 'trial_context':
+                    manager.set_trial_context(*args)
+                    result = True
+                elif name == 'set_geofences':
+                    geofence_generation[0], regions, subjects = args
+                    result = manager.set_geofences(regions, subjects)
+                elif name == 'shutdown':
+                    running = False
+                    continue
+                else:
+                    logger.warning(f"未知命令: {name}")
+                    result = None
+                command_conn.send(('result', request_id, result))
+
+    except (EOFError, OSError) as e:
+        logger.warning(f"管道已关闭，采集进程结束: {e}")
+
+    finally:
+        manager.cleanup()
+        pose_buffer.close()
+        # 主进程可能已不再读取队列，退出时不等待队列后台线程写完
+        geofence_queue.cancel_join_thread()
+
+
+class IngestServiceClient:
+    """采集进程客户端（与LSLManager接口兼容）"""
+
+    def __init__(self, slot_count=DEFAULT_SLOT_COUNT, startup_timeout=15.0, request_timeout=2.0,
+                 shard=None, cpu_affinity=None):
+        """
+        Args:
+            slot_count: 共享内存最大对象数
+            startup_timeout: 等待采集进程就绪的超时（秒）
+            request_timeout: 控制命令超时（秒）
+            shard: 分片名称（采集进程中以LSLManager(shard=...)运行，流名称带分片前缀）
+            cpu_affinity: 采集进程绑定的CPU核心列表
+        """
+        self.logger = logging.getLogger('IngestServiceClient')
+        self.shard = shard
+        self.cpu_affinity = cpu_affinity
+        self.slot_count = slot_count
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+
+        self.process = None
+        self.pose_buffer = None
+        self.marker_conn = None
+        self.command_conn = None
+        self.geofence_queue = None
+        self.geofence_generation = 0
+        self.request_lock = threading.Lock()  # 控制命令发送/接收成对执行（遥测线程与实验线程共用管道）
+        self.request_id = 0
+        self.running = False
+        self.degraded_mode = False
+        self.trial_context = (None, None)  # (试次, 阶段)，本进程副本
+
+    def start_services(self, server_ip="192.168.3.58", client_ip="192.168.3.55", use_multicast=True,
+                       enable_position_broadcast=True, sub_ids=['001', '002'],
+                       enable_telemetry=True, telemetry_port=9109, cpu_affinity=None, resample_rate=None,
+                       enable_heading_stream=False, pose_filter=None, pose_filter_params=None,
+                       enable_synchrony_stream=False, synchrony_window=2.0):
+        """启动独立采集进程（参数与LSLManager.start_services一致）"""
+        try:
+            print("\n🚀 启动独立采集进程...")
+
+            self.pose_buffer = SharedPoseBuffer(create=True, slot_count=self.slot_count)
+
+            # Marker单向管道 + 控制双向管道
+            marker_recv, self.marker_conn = multiprocessing.Pipe(duplex=False)
+            self.command_conn, command_child = multiprocessing.Pipe(duplex=True)
+            self.geofence_queue = multiprocessing.Queue()
+
+            options = {
+                'server_ip': server_ip,
+                'client_ip': client_ip,
+                'use_multicast': use_multicast,
+                'enable_position_broadcast': enable_position_broadcast,
+                'sub_ids': list(sub_ids),
+                'enable_telemetry': enable_telemetry,
+                'telemetry_port': telemetry_port,
+                'resample_rate': resample_rate,
+                'enable_heading_stream': enable_heading_stream,
+                'pose_filter': pose_filter,
+                'pose_filter_params': pose_filter_params,
+                'enable_synchrony_stream': enable_synchrony_stream,
+                'synchrony_window': synchrony_window
+            }
+
+            self.process = multiprocessing.Process(
+                target=_ingest_process_main,
+                args=(self.pose_buffer.name, marker_recv, command_child, self.geofence_queue, options,
+                      self.shard, cpu_affinity or self.cpu_affinity),
+                name=f'NatNetIngest-{self.shard}' if self.shard else 'NatNetIngest',
+                daemon=True
+            )
+            self.process.start()
+
+            # 等待采集进程就绪
+            if not self.command_conn.poll(self.startup_timeout):
+                print("❌ 采集进程启动超时")
+                self.cleanup()
+                return False
+
+            _, success = self.command_conn.recv()
+            if not success:
+                print("❌ 采集进程服务启动失败")
+                self.cleanup()
+                return False
+
+            self.running = True
+            print(f"✅ 独立采集进程已启动 (PID: {self.process.pid})")
+            print(f"   共享内存: {self.pose_buffer.name} ({self.pose_buffer.size} 字节)")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"采集进程启动失败: {e}")
+            print(f"❌ 采集进程启动失败: {e}")
+            return False
+
+    def _request(self, name, *args):
+        """发送控制命令并等待结果（线程安全，丢弃此前超时请求的迟到应答）"""
+        if not self.running:
+            return None
+
+        with self.request_lock:
+            try:
+                self.request_id += 1
+                request_id = self.request_id
+                self.command_conn.send((request_id, name) + args)
+
+                deadline = time.perf_counter() + self.request_timeout
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or not self.command_conn.poll(remaining):
+                        self.logger.warning(f"采集进程响应超时: {name}")
+                        return None
+                    _, reply_id, result = self.command_conn.recv()
+                    if reply_id == request_id:
+                        return result
+                    self.logger.warning(f"丢弃过期应答: 请求 {reply_id}（当前 {request_id}）")
+
+            except (EOFError, OSError) as e:
+                self.logger.error(f"采集进程通信错误: {e}")
+                return None
+
+    def send_marker(self, code: int, meaning: str = "", timestamp=None):
+        """将TTL Code发送到采集进程（单向管道，不等待）"""
+        try:
+            if not self.running:
+                self.logger.warning("采集进程未运行")
+                return False
+
+            self.marker_conn.send((code, meaning, timestamp))
+            info_msg = f"⏰ Marker已排队: {code}"
+            if meaning:
+                info_msg += f" ({meaning})"
+            print(info_msg)
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Marker发送到采集进程错误: {e}")
+            return False
+
+    def get_latest_skeleton_data(self, skeleton_name, filtered=False):
+        """从共享内存读取指定骨骼的最新位置（返回格式与LSLManager一致）"""
+        from .lsl_manager import candidate_skeleton_names
+
+        try:
+            if not self.pose_buffer:
+                return None
+
+            snapshot = self.pose_buffer.read()
+            if not snapshot:
+                return None
+
+            poses = snapshot['poses']
+            for name in candidate_skeleton_names(skeleton_name):
+                pose = poses.get(name)
+                if pose and pose['valid']:
+                    use_filtered = filtered and pose['filtered']
+                    prefix = 'filtered_' if use_filtered else ''
+                    return {
+                        'x': pose[f'{prefix}x'],
+                        'y': pose[f'{prefix}y'],
+                        'z': pose[f'{prefix}z'],
+                        'timestamp': pose['timestamp'],
+                        'valid': True,
+                        'filtered': use_filtered
+                    }
+
+            return None
+
+        except Exception as e:
+            self.logger.error(f"读取共享内存位置错误: {e}")
+            return None
+
+    def wait_for_pose(self, last_sequence, timeout):
+        """等待共享内存位置更新（跨进程无条件变量，按0.5ms间隔轮询序列号）
+
+        Returns:
+            int: 当前序列号（与last_sequence相同表示超时、无新位置）
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            snapshot = self.pose_buffer.read() if self.pose_buffer else None
+            sequence = snapshot['seq'] if snapshot else 0
+            if sequence != last_sequence or time.perf_counter() >= deadline:
+                return sequence
+            time.sleep(0.0005)
+
+    def get_latest_rigid_body(self, rigid_body_name):
+        """刚体数据不经共享内存发布"""
+        return None
+    
+    def get_latest_heading(self, subject_name):
+        """朝向数据不经共享内存发布（可订阅采集进程输出的朝向LSL流）"""
+        return None
+
+    def get_latest_synchrony(self):
+        """同步指标不经共享内存发布（可订阅采集进程输出的Dyad_Synchrony流）"""
+        return None
+
+    def start_optitrack_data_saving(self, dyad_id, session_id=None):
+        """在采集进程中启动OptiTrack数据保存"""
+        return bool(self._request('start_saving', dyad_id, session_id))
+
+    def stop_optitrack_data_saving(self):
+        """在采集进程中停止OptiTrack数据保存"""
+        return bool(self._request('stop_saving'))
+
+    def set_trial_context(self, trial=None, phase=None):
+        """设置采集进程中的当前试次/阶段"""
+        self.trial_context = (trial, phase)
+        return bool(self._request('trial_context', trial, phase))
+
+    def set_geofences(self, regions, subjects):
+        """在采集进程中设置围栏区域（区域对象经管道传递，之前区域的未读事件被丢弃）"""
+        self.geofence_generation += 1
+        return bool(self._request('set_geofences', self.geofence_generation, list(regions), list(subjects)))
+
+    def clear_geofences(self):
+        return self.set_geofences([], [])
+
+    def poll_geofence_events(self):
+        """取出采集进程转发的未读围栏事件（非阻塞，不经过控制管道）"""
+        events = []
+        if self.geofence_queue is None:
+            return events
+        while True:
+            try:
+                generation, batch = self.geofence_queue.get_nowait()
+                if generation == self.geofence_generation:
+                    events.extend(batch)
+            except Empty:
+                return events
+            except (EOFError, OSError) as e:
+                self.logger.error(f"读取围栏事件错误: {e}")
+                return events
+
+    def is_connected(self):
+        """检查采集进程及NatNet/LSL连接状态"""
+        status = self._request('connection')
+        if status is None:
+            return {'natnet': False, 'lsl_marker': False, 'degraded_mode': True}
+        return status
+
+    def get_stats(self):
+        """获取采集进程统计信息（附加共享内存状态）"""
+        stats = self._request('stats') or {}
+
+        snapshot = self.pose_buffer.read() if self.pose_buffer else None
+        stats['ingest_process'] = {
+            'alive': bool(self.process and self.process.is_alive()),
+            'pid': self.process.pid if self.process else None,
+            'shared_seq': snapshot['seq'] if snapshot else 0,
+            'shared_frame_age': (time.time() - snapshot['capture_time']) if snapshot else None
+        }
+        return stats
+
+    def cleanup(self):
+        """停止采集进程并释放共享内存"""
+        try:
+            print("\n🧹 正在停止独立采集进程...")
+
+            if self.process and self.process.is_alive():
+                try:
+                    with self.request_lock:
+                        self.command_conn.send((None, 'shutdown'))
+                except (EOFError, OSError):
+                    pass
+                self.process.join(timeout=5.0)
+                if self.process.is_alive():
+                    print("⚠️  强制终止采集进程")
+                    self.process.terminate()
+                    self.process.join(timeout=1.0)
+
+            self.running = False
+            self.process = None
+
+            for conn in (self.marker_conn, self.command_conn):
+                if conn:
+                    conn.close()
+            self.marker_conn = None
+            self.command_conn = None
+
+            if self.geofence_queue:
+                self.geofence_queue.close()
+                self.geofence_queue = None
+
+            if self.pose_buffer:
+                self.pose_buffer.close()
+                self.pose_buffer = None
+
+            print("✅ 独立采集进程已停止")
+
+        except Exception as e:
+            self.logger.error(f"采集进程清理错误: {e}")
@@ -0,0 +1,144 @@
+"""
+键盘采集 (V3.4)
+观察者按键不再按渲染帧轮询 event.getKeys：使用 psychopy.hardware.keyboard 记录按下时刻，
+映射到LSL时钟后经队列交给试次循环，LSL Marker使用按下时刻而非被发现的那一帧
+
+- Psychtoolbox后端：按键事件由PTB键盘队列在操作系统事件时刻打时间戳，
+  后台线程每毫秒取出一次并放入队列（与渲染循环无关）
+- 其他后端（event）：依赖窗口事件分发，只能在主线程读取，get_presses() 调用时读取
+- 时间映射：key.rt 为相对键盘时钟的按下时刻，按"距按下已过去的时间"映射到LSL时钟，
+  与各PsychoPy版本tDown的时间基准无关
+- 队列元素：{'key', 'timestamp'（LSL时钟）, 'latency'（按下到入队的延迟，秒）}
+"""
+
+import time
+import threading
+import logging
+from queue import Queue, Empty
+
+try:
+    from pylsl import local_clock
+except ImportError:
+    local_clock = time.time
+
+
+class KeyboardCapture:
+    """按键采集（按下时刻映射到LSL时钟）"""
+
+    def __init__(self, key_list=('space',), poll_interval=0.001):
+        """
+        Args:
+            key_list: 采集的按键
+            poll_interval: 后台线程读取间隔（秒），只影响入队延迟，不影响时间戳精度
+        """
+        self.logger = logging.getLogger('KeyboardCapture')
+        self.key_list = list(key_list)
+        self.poll_interval = poll_interval
+
+        self.keyboard = None
+        self.clock = None
+        self.threaded = False
+        self.running = False
+        self.thread = None
+
+        self.presses = Queue()
+        self.press_count = 0
+        self.max_latency = 0.0
+
+    def start(self):
+        """创建键盘设备（PTB后端时启动后台线程）"""
+        try:
+            from psychopy import core
+            from psychopy.hardware import keyboard
+
+            self.clock = core.Clock()
+            self.keyboard = keyboard.Keyboard(clock=self.clock)
+            self.keyboard.clearEvents()
+            self.threaded = bool(getattr(keyboard, 'havePTB', False))
+
+            if self.threaded:
+                self.running = True
+                self.thread = threading.Thread(target=self._capture_loop, name='KeyboardCapture', daemon=True)
+                self.thread.start()
+
+            print(f"✅ 键盘采集已启动（{'PTB后台线程' if self.threaded else '主线程读取'}）: {', '.join(self.key_list)}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"键盘采集启动失败: {e}")
+            print(f"❌ 键盘采集启动失败: {e}")
+            return False
+
+    def _capture_loop(self):
+        """(后台线程) 读取键盘队列"""
+        while self.running:
+            try:
+                self._collect()
+            except Exception as e:
+                self.logger.error(f"读取按键错误: {e}")
+                time.sleep(0.1)
+            time.sleep(self.poll_interval)
+
+    def _collect(self):
+        """读取新按键并映射到LSL时钟后入队"""
+        keys = self.keyboard.getKeys(keyList=self.key_list, waitRelease=False, clear=True)
+        if not keys:
+            return
+
+        lsl_now = local_clock()
+        clock_now = self.clock.getTime()
+        for key in keys:
+            age = max(0.0, clock_now - key.rt)
+            self.presses.put({
+                'key': key.name,
+                'timestamp': lsl_now - age,
+                'latency': age
+            })
+            self.press_count += 1
+            self.max_latency = max(self.max_latency, age)
+
+    def get_presses(self):
+        """(主线程) 取出所有新按键（按发生顺序）"""
+        if self.keyboard is None:
+            return []
+        if not self.threaded:
+            try:
+                self._collect()
+            except Exception as e:
+                self.logger.error(f"读取按键错误: {e}")
+
+        presses = []
+        while True:
+            try:
+                presses.append(self.presses.get_nowait())
+            except Empty:
+                return presses
+
+    def clear(self):
+        """丢弃已采集和尚未读取的按键（如指导语界面开始实验的空格键）"""
+        if self.keyboard is None:
+            return
+        try:
+            self.keyboard.clearEvents()
+        except Exception as e:
+            self.logger.error(f"清空键盘事件错误: {e}")
+        while True:
+            try:
+                self.presses.get_nowait()
+            except Empty:
+                return
+
+    def stop(self):
+        """停止采集"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def get_stats(self):
+        return {
+            'threaded': self.threaded,
+            'presses': self.press_count,
+            'pending': self.presses.qsize(),
+            'max_latency': self.max_latency
+        }
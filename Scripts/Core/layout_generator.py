@@ -0,0 +1,250 @@
+"""
+隐藏目标布局生成器与布局库 (V3.4)
+取代逐点拒绝采样：泊松圆盘采样一次得到满足最小间距的极大点集，从中随机取所需数量的目标，
+约束可满足时总能生成完整布局；离线预计算的布局库按平衡评分分层，运行时按dyad/session O(1)查表
+
+- poisson_disk_points: Bridson泊松圆盘采样（背景网格，格边长 r/√2，每格至多一个点）
+- generate_target_layout: 在边距内采样并取num_targets个点，点数不足时重采样；
+    多轮仍不足时在稠密候选网格上做确定性的最远点贪心，仍不可满足时抛出ValueError
+- score_layouts: 每个布局的距墙最小距离、目标间最小距离与平衡评分（向量化）
+- LayoutLibrary: 读取Tools/build_layout_library.py生成的.npz布局库
+    库按评分分K层、层内等量存储（层优先顺序）；session按拉丁方在层间轮换，
+    dyad之间依次取层内不同布局：索引 = 层 × 每层数量 + 层内序号；
+    查表时按请求的房间尺寸/目标数/最小间距/边距校验所取布局，不符合时返回None由调用方重新生成
+"""
+
+import math
+import logging
+from pathlib import Path
+
+import numpy as np
+
+
+# ========== 路径配置常量 ==========
+LAYOUT_LIBRARY_PATH = Path(__file__).parent.parent.parent / 'Config' / 'layout_library.npz'
+
+# ========== 回退搜索常量 ==========
+FALLBACK_GRID_STEPS = 32      # 候选网格：每个最小间距内的格数
+FALLBACK_GRID_MAX = 241       # 候选网格每边最多点数
+
+
+def poisson_disk_points(width, height, min_distance, rng=None, k=30):
+    """Bridson泊松圆盘采样
+
+    Args:
+        width, height: 采样矩形尺寸（米），原点在左下角
+        min_distance: 点间最小距离（米）
+        rng: numpy随机数生成器
+        k: 每个活动点的候选数
+    Returns:
+        (M, 2) 点坐标
+    """
+    rng = rng or np.random.default_rng()
+    cell = min_distance / math.sqrt(2.0)
+    nx = max(1, int(math.ceil(width / cell)))
+    nz = max(1, int(math.ceil(height / cell)))
+    grid = np.full((nx, nz), -1, dtype=np.intp)
+
+    points = [rng.uniform((0.0, 0.0), (width, height))]
+    grid[min(int(points[0][0] / cell), nx - 1), min(int(points[0][1] / cell), nz - 1)] = 0
+    active = [0]
+
+    while active:
+        slot = rng.integers(len(active))
+        origin = points[active[slot]]
+
+        # 一次生成k个环形候选 [r, 2r)
+        radius = min_distance * np.sqrt(rng.uniform(1.0, 4.0, k))
+        angle = rng.uniform(0.0, 2.0 * math.pi, k)
+        candidates = origin + np.column_stack([radius * np.cos(angle), radius * np.sin(angle)])
+        inside = ((candidates[:, 0] >= 0) & (candidates[:, 0] < width) &
+                  (candidates[:, 1] >= 0) & (candidates[:, 1] < height))
+
+        accepted = False
+        for candidate in candidates[inside]:
+            gx, gz = int(candidate[0] / cell), int(candidate[1] / cell)
+            neighbours = grid[max(gx - 2, 0):gx + 3, max(gz - 2, 0):gz + 3]
+            neighbours = neighbours[neighbours >= 0]
+            if len(neighbours):
+                distance = np.hypot(*(np.asarray([points[i] for i in neighbours]) - candidate).T)
+                if distance.min() < min_distance:
+                    continue
+            grid[gx, gz] = len(points)
+            active.append(len(points))
+            points.append(candidate)
+            accepted = True
+            break
+
+        if not accepted:
+            active.pop(slot)
+
+    return np.asarray(points)
+
+
+def farthest_point_layout(width, height, num_targets, min_distance):
+    """稠密候选网格上的最远点贪心（确定性回退）
+
+    泊松采样得到的是随机极大点集，目标数接近装箱上限时（如6×6房间、边距1.0下的4@2.8m、5@2.6m）
+    多轮仍可能不足；网格包含边界与角点，依次从四角与中心出发，每步取离已选点最远的候选点
+
+    Args:
+        width, height: 采样矩形尺寸（米），原点在左下角
+    Returns:
+        (num_targets, 2) 点坐标；找不到时返回None
+    """
+    step = min_distance / FALLBACK_GRID_STEPS
+    xs = np.linspace(0.0, width, min(FALLBACK_GRID_MAX, int(math.ceil(width / step)) + 1))
+    zs = np.linspace(0.0, height, min(FALLBACK_GRID_MAX, int(math.ceil(height / step)) + 1))
+    grid = np.stack(np.meshgrid(xs, zs, indexing='ij'), axis=-1).reshape(-1, 2)
+
+    starts = [(0.0, 0.0), (width, height), (0.0, height), (width, 0.0), (width / 2.0, height / 2.0)]
+    for start in starts:
+        chosen = [np.asarray(start)]
+        nearest = np.hypot(*(grid - chosen[0]).T)
+        while len(chosen) < num_targets:
+            best = int(np.argmax(nearest))
+            if nearest[best] < min_distance:
+                break
+            chosen.append(grid[best])
+            nearest = np.minimum(nearest, np.hypot(*(grid - grid[best]).T))
+        if len(chosen) == num_targets:
+            return np.asarray(chosen)
+    return None
+
+
+def generate_target_layout(num_targets=3, min_distance=2.0, edge_margin=1.0,
+                           room_size=(6.0, 6.0), rng=None, max_rounds=50):
+    """生成一个隐藏目标布局（世界坐标，房间中心为原点）
+
+    Returns:
+        (num_targets, 2) 目标中心
+    Raises:
+        ValueError: 边距过大，或泊松采样与网格回退均无法放下num_targets个目标
+    """
+    rng = rng or np.random.default_rng()
+    width = room_size[0] - 2.0 * edge_margin
+    height = room_size[1] - 2.0 * edge_margin
+    if width < 0 or height < 0:
+        raise ValueError(f"边距过大: room_size={room_size}, edge_margin={edge_margin}")
+
+    best = None
+    for _ in range(max_rounds):
+        points = poisson_disk_points(width, height, min_distance, rng)
+        if len(points) >= num_targets:
+            best = points[rng.choice(len(points), num_targets, replace=False)]
+            break
+
+    if best is None:
+        best = farthest_point_layout(width, height, num_targets, min_distance)
+    if best is None:
+        raise ValueError(f"约束不可满足: 无法在 {room_size} 房间（边距 {edge_margin}m）内放下 "
+                         f"{num_targets} 个间距 ≥ {min_distance}m 的目标")
+
+    # 平移到以房间中心为原点
+    offset = np.array([-room_size[0] / 2.0 + edge_margin, -room_size[1] / 2.0 + edge_margin])
+    return best + offset
+
+
+def score_layouts(centers, room_size=(6.0, 6.0)):
+    """布局评分（向量化）
+
+    Args:
+        centers: (L, n, 2) 布局目标中心
+    Returns:
+        dict: wall_distance (L,) 目标到最近墙的最小距离；pair_distance (L,) 目标间最小距离；
+              score (L,) 平衡评分（两者之和，用于分层）
+    """
+    centers = np.asarray(centers, dtype=np.float64)
+    half = np.asarray(room_size, dtype=np.float64) / 2.0
+    wall_distance = (half - np.abs(centers)).min(axis=(1, 2))
+
+    diff = centers[:, :, None, :] - centers[:, None, :, :]
+    pair = np.hypot(diff[..., 0], diff[..., 1])
+    n = centers.shape[1]
+    pair[:, np.arange(n), np.arange(n)] = np.inf
+    pair_distance = pair.min(axis=(1, 2)) if n > 1 else np.full(len(centers), np.inf)
+
+    return {
+        'wall_distance': wall_distance,
+        'pair_distance': pair_distance,
+        'score': wall_distance + np.where(np.isfinite(pair_distance), pair_distance, 0.0)
+    }
+
+
+class LayoutLibrary:
+    """预计算布局库（O(1)按dyad/session查表）"""
+
+    def __init__(self, path=LAYOUT_LIBRARY_PATH):
+        self.logger = logging.getLogger('LayoutLibrary')
+        self.path = Path(path)
+        with np.load(self.path) as data:
+            self.centers = data['centers']
+            self.radius = float(data['radius'])
+            self.strata = int(data['strata'])
+            self.per_stratum = int(data['per_stratum'])
+            self.room_size = tuple(data['room_size'].tolist())
+            self.scores = {key: data[key] for key in ('wall_distance', 'pair_distance', 'score')}
+
+    @classmethod
+    def load(cls, path=LAYOUT_LIBRARY_PATH):
+        """布局库文件存在时加载，否则返回None"""
+        if not Path(path).exists():
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            logging.getLogger('LayoutLibrary').error(f"布局库加载失败 {path}: {e}")
+            return None
+
+    def index_for(self, dyad_id, session_id):
+        """dyad/session -> 布局索引
+
+        层 = (session + dyad) mod K（拉丁方：每个dyad的各session落在不同层，各层在session间平衡）
+        层内序号 = dyad mod 每层数量
+        """
+        dyad, session = int(dyad_id), int(session_id)
+        stratum = (session - 1 + dyad - 1) % self.strata
+        within = (dyad - 1) % self.per_stratum
+        return stratum * self.per_stratum + within
+
+    def validate(self, index, room_size=None, num_targets=None, min_distance=None, edge_margin=None):
+        """校验库中布局是否满足请求的约束（未给出的约束不检查）
+
+        Returns:
+            str: 不匹配原因；满足时返回None
+        """
+        centers = self.centers[index]
+        if room_size is not None and not np.allclose(self.room_size, room_size):
+            return f"房间尺寸 {self.room_size} ≠ {tuple(room_size)}"
+        if num_targets is not None and len(centers) != num_targets:
+            return f"目标数 {len(centers)} ≠ {num_targets}"
+
+        scores = score_layouts(centers[None], room_size or self.room_size)
+        if min_distance is not None and scores['pair_distance'][0] < min_distance - 1e-6:
+            return f"目标间距 {scores['pair_distance'][0]:.3f}m < {min_distance}m"
+        if edge_margin is not None and scores['wall_distance'][0] < edge_margin - 1e-6:
+            return f"距墙 {scores['wall_distance'][0]:.3f}m < 边距 {edge_margin}m"
+        return None
+
+    def lookup(self, dyad_id, session_id, room_size=None, num_targets=None, min_distance=None,
+               edge_margin=None):
+        """获取指定dyad/session的布局
+
+        Args:
+            room_size, num_targets, min_distance, edge_margin: 请求的约束（给出时校验所取布局）
+        Returns:
+            dict: {'index', 'stratum', 'centers': [(x, z), ...], 'radius', 'score'}；
+                  布局不满足请求的约束时返回None
+        """
+        index = self.index_for(dyad_id, session_id)
+        mismatch = self.validate(index, room_size, num_targets, min_distance, edge_margin)
+        if mismatch:
+            self.logger.warning(f"布局库布局 #{index} 不符合请求: {mismatch}")
+            return None
+        return {
+            'index': index,
+            'stratum': index // self.per_stratum,
+            'centers': [tuple(float(v) for v in c) for c in self.centers[index]],
+            'radius': self.radius,
+            'score': float(self.scores['score'][index])
+        }
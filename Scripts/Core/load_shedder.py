@@ -0,0 +1,136 @@
+"""
+采集回调负载控制器 (V3.4)
+测量NatNet帧回调耗时，持续超出帧间隔预算时按固定顺序降级：
+
+    0. 正常
+    1. 关闭调试打印
+    2. CSV保存切换为原始数据包归档
+    3. 骨骼数据（备选路径）抽帧处理
+
+实时位置（Markerset质心）和LSL位置推送永不降级。
+回调耗时包含等待GIL的时间，因此同时反映保存/调试线程带来的负载。
+负载持续回落后逐级恢复；每次切换都带时间戳记录，便于评估每个会话的数据质量影响
+"""
+
+import time
+import logging
+
+
+SHED_NONE = 0
+SHED_DEBUG = 1
+SHED_RAW_ARCHIVE = 2
+SHED_DECIMATE = 3
+
+SHED_LEVEL_NAMES = {
+    SHED_NONE: '正常',
+    SHED_DEBUG: '关闭调试打印',
+    SHED_RAW_ARCHIVE: '原始数据包归档',
+    SHED_DECIMATE: '骨骼抽帧处理'
+}
+
+
+class IngestBudgetController:
+    """采集回调预算控制器"""
+
+    def __init__(self, frame_rate=120.0, overrun_frames=120, recover_frames=1200,
+                 recover_ratio=0.6, alpha=0.05, on_transition=None):
+        """
+        Args:
+            frame_rate: NatNet帧率，预算 = 1/frame_rate
+            overrun_frames: 滑动平均耗时连续超预算多少帧后降一级
+            recover_frames: 滑动平均耗时连续低于 预算*recover_ratio 多少帧后恢复一级
+            recover_ratio: 恢复阈值比例（迟滞，避免频繁切换）
+            alpha: 耗时滑动平均平滑系数
+            on_transition: 级别切换回调 on_transition(old_level, new_level, event)
+        """
+        self.logger = logging.getLogger('IngestBudgetController')
+        self.budget = 1.0 / frame_rate
+        self.overrun_frames = overrun_frames
+        self.recover_frames = recover_frames
+        self.recover_ratio = recover_ratio
+        self.alpha = alpha
+        self.on_transition = on_transition
+
+        self.level = SHED_NONE
+        self.mean_duration = 0.0
+        self.overrun_streak = 0
+        self.recover_streak = 0
+        self.transitions = []
+
+    def set_frame_rate(self, frame_rate):
+        """更新帧率（预算随之变化）"""
+        self.budget = 1.0 / frame_rate
+
+    def update(self, duration, frame_number=0):
+        """(接收线程) 记录一次回调耗时，返回当前降级级别"""
+        if self.mean_duration == 0.0:
+            self.mean_duration = duration
+        else:
+            self.mean_duration += self.alpha * (duration - self.mean_duration)
+
+        if self.mean_duration > self.budget:
+            self.overrun_streak += 1
+            self.recover_streak = 0
+            if self.overrun_streak >= self.overrun_frames and self.level < SHED_DECIMATE:
+                self._transition(self.level + 1, frame_number, '回调耗时持续超出预算')
+        elif self.mean_duration < self.budget * self.recover_ratio:
+            self.recover_streak += 1
+            self.overrun_streak = 0
+            if self.recover_streak >= self.recover_frames and self.level > SHED_NONE:
+                self._transition(self.level - 1, frame_number, '回调耗时已回落')
+        else:
+            self.overrun_streak = 0
+            self.recover_streak = 0
+
+        return self.level
+
+    def _transition(self, new_level, frame_number, reason):
+        """切换降级级别并记录"""
+        old_level = self.level
+        self.level = new_level
+        self.overrun_streak = 0
+        self.recover_streak = 0
+
+        event = {
+            'timestamp': _lsl_clock(),
+            'wall_time': time.time(),
+            'frame_number': frame_number,
+            'from_level': old_level,
+            'to_level': new_level,
+            'from_name': SHED_LEVEL_NAMES[old_level],
+            'to_name': SHED_LEVEL_NAMES[new_level],
+            'mean_duration_ms': self.mean_duration * 1000.0,
+            'budget_ms': self.budget * 1000.0,
+            'reason': reason
+        }
+        self.transitions.append(event)
+
+        self.logger.warning(
+            f"负载级别切换: {event['from_name']}({old_level}) -> {event['to_name']}({new_level}), "
+            f"帧={frame_number}, 平均耗时={event['mean_duration_ms']:.2f}ms, "
+            f"预算={event['budget_ms']:.2f}ms, 原因={reason}"
+        )
+
+        if self.on_transition:
+            try:
+                self.on_transition(old_level, new_level, event)
+            except Exception as e:
+                self.logger.error(f"降级切换回调错误: {e}")
+
+    def get_stats(self):
+        return {
+            'level': self.level,
+            'level_name': SHED_LEVEL_NAMES[self.level],
+            'mean_duration_ms': self.mean_duration * 1000.0,
+            'budget_ms': self.budget * 1000.0,
+            'transitions': list(self.transitions)
+        }
+
+
+def _lsl_clock():
+    """LSL时钟（pylsl不可用时使用本地时间）"""
+    try:
+        from pylsl import local_clock
+        return local_clock()
+    except ImportError:
+        return time.time()
@@ -9,6 +9,10 @@ LSL/NatNet混合管理器 (V3.0版)
 - 骨骼数据获取：提取指定骨骼的Root/Pelvis核心3D位置
 - 刚体数据获取：获取最新刚体3D世界坐标
 - Degraded Mode：仅NatNet接收，无LSL Marker发送
+- 分片模式（V3.4）：LSLManager(shard="RoomA") 创建独立实例，拥有各自的NatNet客户端、
+  位置缓存、带分片前缀的LSL流和数据保存器；LSLManager() 仍为单例（默认分片）
+- Offline Mode（V3.4）：offline_mode=True时不连接Motive，模拟帧或原始数据包回放经
+  inject_mocap_data/inject_packet进入相同的帧总线（Tools/headless_runner.py）
 """
 
 import sys
@@ -16,9 +20,19 @@ import threading
 import time
 import logging
 from queue import Queue, Empty
-from collections import deque
 from pathlib import Path
 
+from .frame_bus import FrameBus, POLICY_LOSSLESS, POLICY_SAMPLED
+from .telemetry import TelemetryRegistry, TelemetryServer
+from .load_shedder import IngestBudgetController, SHED_DEBUG, SHED_RAW_ARCHIVE, SHED_DECIMATE
+from .cpu_affinity import pin_current_thread
+from .pose_resampler import PoseResampler
+from .heading_estimator import HeadingEstimator
+from .pose_filter import create_filter_bank
+from .quality_monitor import MarkerQualityMonitor
+from .synchrony import SynchronyTracker
+from .geofence import GeofenceEngine
+
 # 导入OptiTrack数据保存器
 try:
     from .optitrack_data_saver import OptiTrackDataSaver
@@ -42,35 +56,103 @@ except ImportError as e:
     print(f"   请确保路径正确: {natnet_path}")
     NatNetClient = DataDescriptions = MoCapData = None
 
+if NatNetClient:
+    class CapturingNatNetClient(NatNetClient):
+        """可保留当前原始数据包的NatNet客户端（负载降级时用于原始包归档）"""
+        
+        def __init__(self):
+            super().__init__()
+            self.capture_packets = False
+            self.current_packet = None
+        
+        def _NatNetClient__process_message(self, data, print_level=0):
+            # 解码与帧回调在同一线程内同步执行，回调中可读取current_packet
+            if self.capture_packets:
+                self.current_packet = bytes(data)
+            return super()._NatNetClient__process_message(data, print_level)
+else:
+    CapturingNatNetClient = None
+
 # 导入LSL
 try:
-    from pylsl import StreamInfo, StreamOutlet
+    from pylsl import StreamInfo, StreamOutlet, local_clock
     print("✅ pylsl已导入")
 except ImportError as e:
     print(f"❌ 无法导入pylsl: {e}")
     print("   LSL Marker功能将不可用")
     StreamInfo = StreamOutlet = None
+    local_clock = time.time
+
+
+def candidate_skeleton_names(skeleton_name):
+    """生成骨骼名称的所有可能存储格式
+    
+    "Sub001" -> ["Sub001", "Skeleton_1", "Skeleton_001"]，其他格式直接使用
+    """
+    if skeleton_name.startswith('Sub'):
+        # Sub001格式 -> 转换为多种可能的存储格式
+        try:
+            sub_id = skeleton_name[3:]  # 提取001部分
+            skeleton_id = int(sub_id)   # 转换为数字1
+            return [
+                skeleton_name,  # Sub001
+                f"Skeleton_{skeleton_id}",  # Skeleton_1
+                f"Skeleton_{sub_id}"  # Skeleton_001
+            ]
+        except ValueError:
+            return [skeleton_name]
+    
+    # 其他格式直接使用
+    return [skeleton_name]
+
+
+def candidate_heading_sources(subject_name):
+    """生成被试朝向的候选数据源（骨骼根关节优先，其次同编号刚体）
+    
+    "Sub001" -> ["Sub001", "Skeleton_1", "Skeleton_001", "RigidBody_1"]
+    """
+    names = candidate_skeleton_names(subject_name)
+    if subject_name.startswith('Sub'):
+        try:
+            names.append(f"RigidBody_{int(subject_name[3:])}")
+        except ValueError:
+            pass
+    return names
 
 
 class LSLManager:
-    """LSL/NatNet混合管理器（单例）"""
+    """LSL/NatNet混合管理器（默认单例，可按分片创建独立实例）"""
     
     _instance = None
+    _shards = {}
     _lock = threading.Lock()
     
-    def __new__(cls):
+    def __new__(cls, shard=None):
+        # 命名分片：每个分片一个独立实例
+        if shard is not None:
+            with cls._lock:
+                if shard not in cls._shards:
+                    cls._shards[shard] = super().__new__(cls)
+                return cls._shards[shard]
+        
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
         return cls._instance
     
-    def __init__(self):
+    def __init__(self, shard=None):
         if hasattr(self, '_initialized'):
             return
         
         self._initialized = True
-        self.logger = logging.getLogger('LSLManager')
+        
+        # 分片标识（None=默认单例，流名称保持不变）
+        self.shard = shard
+        self.stream_prefix = f"{shard}_" if shard else ""
+        self.logger = logging.getLogger(f'LSLManager.{shard}' if shard else 'LSLManager')
+        self.cpu_affinity = None
+        self._receive_thread_pinned = False
         
         # NatNet客户端配置
         self.natnet_client = None
@@ -87,6 +169,13 @@ class LSLManager:
         # LSL OptiTrack位置广播（新增V3.3）
         self.position_outlets = {}  # {Sub001: outlet, Sub002: outlet}
         self.position_broadcast_enabled = True  # 是否启用位置广播
+        self.resampler = None  # 等间隔重采样位置流（V3.4，可选）
+        self.pose_filter = None  # 位置滤波器组（V3.4，可选；启用后位置流增加3个滤波通道）
+        self.heading_outlets = {}  # {Sub001: outlet} 朝向流（V3.4，可选）
+        self.heading_sources = {}  # {Sub001: [数据源名称]}，默认见candidate_heading_sources
+        self.synchrony = None  # 双人同步指标（V3.4，可选）
+        self.geofence = GeofenceEngine()  # 逐帧围栏评估（实验流程通过set_geofences设置区域）
+        self.geofence_names = {}  # {被试: 候选存储名称}
         
         # NatNet数据接收
         self.natnet_running = False
@@ -95,22 +184,61 @@ class LSLManager:
         # 数据缓存
         self.latest_rigid_bodies = {}
         self.latest_skeleton_data = {}
+        self.latest_headings = {}  # {名称: {'yaw', 'yaw_rate', 'timestamp', 'valid'}}
+        self.pose_sequence = 0  # 位置缓存更新序号（每个NatNet帧加1）
+        self.pose_condition = threading.Condition()  # 位置缓存更新通知（渲染循环帧节拍模式）
+        self.trial_context = (None, None)  # (试次, 阶段)，由set_trial_context设置
+        self.heading_estimator = HeadingEstimator()
         self.frame_count = 0
         self.start_time = None
         
-        # 统计信息（最近5秒）
-        self.frame_timestamps = deque(maxlen=600)  # 假设120Hz
+        # 运行时遥测（O(1)增量滚动统计）
+        self.last_frame_time = None
+        self.telemetry = TelemetryRegistry()
+        self.frame_rate = self.telemetry.rate('natnet_frame', 'NatNet帧到达率(Hz)与间隔抖动(s)')
+        self.callback_time = self.telemetry.stat('ingest_callback_seconds', 'NatNet帧回调耗时(s)')
+        self.marker_latency = self.telemetry.stat('marker_queue_latency_seconds', 'Marker排队到发送的延迟(s)')
+        self.saver_queue_depth = self.telemetry.stat('saver_queue_depth', 'OptiTrack保存队列深度(帧)')
+        self.lsl_push_time = self.telemetry.stat('lsl_push_seconds', 'LSL位置推送耗时(s)')
+        self.telemetry_server = None
+        
+        # 回调负载控制（持续超出帧间隔预算时逐级降级）
+        self.budget_controller = IngestBudgetController(frame_rate=120.0,
+                                                        on_transition=self._on_shed_transition)
+        self.skeleton_decimation = 1  # 骨骼备选路径每N帧处理一次
+        
+        # 标记质量监测（逐被试全标记帧比例、遮挡率、质心离散度、残差）
+        self.quality_monitor = MarkerQualityMonitor()
         
         # Degraded Mode
         self.degraded_mode = False
         
+        # Offline Mode（不连接Motive，帧由inject_mocap_data/inject_packet注入，用于无界面运行与回放）
+        self.offline_mode = False
+        self.offline_decoder = None  # 回放原始数据包时的NatNet解码器（不创建套接字）
+        
         # OptiTrack数据保存器
         self.optitrack_saver = None
         if OptiTrackDataSaver:
-            self.optitrack_saver = OptiTrackDataSaver()
+            self.optitrack_saver = OptiTrackDataSaver(shard=shard)
         
         # 帧计数（用于数据保存）
         self.natnet_frame_number = 0
+        
+        # 帧分发总线（位置缓存、LSL推送、CSV保存、调试打印各自独立）
+        self.frame_bus = FrameBus(f'LSLManager.{shard}.FrameBus' if shard else 'LSLManager.FrameBus')
+        self._setup_frame_bus()
+        
+        # 即时指标
+        self.telemetry.gauge('natnet_frames_total', lambda: self.frame_count, 'NatNet累计帧数')
+        self.telemetry.gauge('marker_queue_size', lambda: self.marker_queue.qsize(), 'Marker发送队列长度')
+        self.telemetry.gauge('frame_bus_dropped',
+                             lambda: {name: sub.dropped_count for name, sub in self.frame_bus.subscribers.items()},
+                             '帧总线各订阅者丢帧数')
+        self.telemetry.gauge('ingest_shed_level', lambda: self.budget_controller.level,
+                             '采集回调降级级别(0正常 1关闭调试 2原始包归档 3骨骼抽帧)')
+        self.telemetry.gauge('marker_all_visible_fraction', self.quality_monitor.get_all_markers_fractions,
+                             '各被试全标记帧比例(滑动)')
     
     def initialize_marker_outlet(self):
         """创建LSL Marker Stream Outlet"""
@@ -122,12 +250,12 @@ class LSLManager:
             
             # 创建LSL Marker流
             marker_info = StreamInfo(
-                name='Navigation_Markers',
+                name=f'{self.stream_prefix}Navigation_Markers',
                 type='Markers',
                 channel_count=1,
                 nominal_srate=0,  # 不规则采样
                 channel_format='int32',
-                source_id='navigation_ttl_markers'
+                source_id=f'{self.stream_prefix}navigation_ttl_markers'
             )
             
             # 添加通道描述
@@ -139,7 +267,7 @@ class LSLManager:
             
             self.marker_outlet = StreamOutlet(marker_info)
             
-            print("✅ LSL Marker流已创建")
+            print(f"✅ LSL Marker流已创建: {self.stream_prefix}Navigation_Markers")
             return True
             
         except Exception as e:
@@ -170,16 +298,17 @@ class LSLManager:
             
             for sub_id in sub_ids:
                 # 为每个Sub创建一个LSL流
-                stream_name = f"Sub{sub_id}_Position"
+                stream_name = f"{self.stream_prefix}Sub{sub_id}_Position"
                 
-                # 创建StreamInfo（3通道：X, Y, Z）
+                # 创建StreamInfo（3通道：X, Y, Z；启用滤波时追加Filtered_X/Y/Z）
+                channel_count = 6 if self.pose_filter else 3
                 position_info = StreamInfo(
                     name=stream_name,
                     type='MoCap',  # 动作捕捉类型
-                    channel_count=3,  # X, Y, Z
+                    channel_count=channel_count,
                     nominal_srate=0,  # 不规则采样（跟随NatNet帧率~120Hz）
                     channel_format='float32',
-                    source_id=f'optitrack_sub{sub_id}'
+                    source_id=f'{self.stream_prefix}optitrack_sub{sub_id}'
                 )
                 
                 # 添加通道描述（详细元数据）
@@ -192,18 +321,29 @@ class LSLManager:
                     ch.append_child_value("type", "Position")
                     ch.append_child_value("coordinate_system", "Motive_World")
                 
+                if self.pose_filter:
+                    for axis in ['X', 'Y', 'Z']:
+                        ch = channels.append_child("channel")
+                        ch.append_child_value("label", f"Filtered_Position_{axis}")
+                        ch.append_child_value("unit", "meters")
+                        ch.append_child_value("type", "Position")
+                        ch.append_child_value("coordinate_system", "Motive_World")
+                        ch.append_child_value("filter", type(self.pose_filter).__name__)
+                
                 # 添加设备信息
                 acquisition = position_info.desc().append_child("acquisition")
                 acquisition.append_child_value("manufacturer", "OptiTrack")
                 acquisition.append_child_value("system", "Motive")
                 acquisition.append_child_value("protocol", "NatNet")
                 acquisition.append_child_value("subject_id", f"Sub{sub_id}")
+                if self.shard:
+                    acquisition.append_child_value("shard", self.shard)
                 
                 # 创建Outlet
                 outlet = StreamOutlet(position_info)
                 self.position_outlets[f"Sub{sub_id}"] = outlet
                 
-                print(f"  ✅ 已创建: {stream_name} (3通道: X, Y, Z)")
+                print(f"  ✅ 已创建: {stream_name} ({channel_count}通道)")
             
             print(f"✅ OptiTrack位置LSL流已创建（共{len(self.position_outlets)}个）")
             return True
@@ -213,16 +353,71 @@ class LSLManager:
             print(f"⚠️  位置LSL流创建失败: {e}")
             return False
     
+    def initialize_heading_outlets(self, sub_ids=['001', '002']):
+        """创建被试朝向LSL流（V3.4新增）
+        
+        每个被试一个流（3通道：Yaw, YawRate, Valid），数据源为同名骨骼根关节或同编号刚体
+        
+        Args:
+            sub_ids: 被试ID列表，如['001', '002']
+        """
+        try:
+            if not StreamInfo or not StreamOutlet:
+                print("⚠️  LSL不可用，无法创建朝向流")
+                return False
+            
+            for sub_id in sub_ids:
+                stream_name = f"{self.stream_prefix}Sub{sub_id}_Heading"
+                
+                heading_info = StreamInfo(
+                    name=stream_name,
+                    type='MoCap',
+                    channel_count=3,  # Yaw, YawRate, Valid
+                    nominal_srate=0,  # 不规则采样（跟随NatNet帧率）
+                    channel_format='float32',
+                    source_id=f'{self.stream_prefix}optitrack_sub{sub_id}_heading'
+                )
+                
+                channels = heading_info.desc().append_child("channels")
+                for label, unit, channel_type in [('Yaw', 'radians', 'Orientation'),
+                                                  ('YawRate', 'radians/second', 'AngularVelocity'),
+                                                  ('Valid', '', 'Flag')]:
+                    ch = channels.append_child("channel")
+                    ch.append_child_value("label", label)
+                    ch.append_child_value("unit", unit)
+                    ch.append_child_value("type", channel_type)
+                    ch.append_child_value("coordinate_system", "Motive_World_Y_Up")
+                
+                acquisition = heading_info.desc().append_child("acquisition")
+                acquisition.append_child_value("manufacturer", "OptiTrack")
+                acquisition.append_child_value("system", "Motive")
+                acquisition.append_child_value("protocol", "NatNet")
+                acquisition.append_child_value("subject_id", f"Sub{sub_id}")
+                
+                self.heading_outlets[f"Sub{sub_id}"] = StreamOutlet(heading_info)
+                print(f"  ✅ 已创建: {stream_name} (3通道: Yaw, YawRate, Valid)")
+            
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"朝向LSL流创建失败: {e}")
+            print(f"⚠️  朝向LSL流创建失败: {e}")
+            return False
+    
     def _marker_send_loop(self):
         """(独立线程) 从队列中取出Marker Code，异步发送"""
         while self.marker_running:
             try:
-                # 从队列获取标记
-                marker_code = self.marker_queue.get(timeout=0.1)
+                # 从队列获取标记（code, LSL时间戳或None, 排队时刻）
+                marker_code, marker_timestamp, queued_at = self.marker_queue.get(timeout=0.1)
+                self.marker_latency.update(time.perf_counter() - queued_at)
                 
                 if self.marker_outlet and not self.degraded_mode:
-                    # 发送到LSL
-                    self.marker_outlet.push_sample([marker_code])
+                    # 发送到LSL（指定时间戳时使用该时间戳，如屏幕翻转时刻）
+                    if marker_timestamp is not None:
+                        self.marker_outlet.push_sample([marker_code], marker_timestamp)
+                    else:
+                        self.marker_outlet.push_sample([marker_code])
                     self.logger.info(f"LSL Marker发送: {marker_code}")  # 移除emoji避免编码错误
                 else:
                     # Degraded Mode: 只记录到日志
@@ -236,8 +431,14 @@ class LSLManager:
                 self.logger.error(f"LSL Marker发送错误: {e}")
                 time.sleep(0.01)
     
-    def send_marker(self, code: int, meaning: str = ""):
-        """主线程调用：将TTL Code放入异步发送队列"""
+    def send_marker(self, code: int, meaning: str = "", timestamp=None):
+        """主线程调用：将TTL Code放入异步发送队列
+        
+        Args:
+            code: TTL码
+            meaning: 文本含义（仅用于打印）
+            timestamp: LSL时钟时间戳（如屏幕翻转时刻），None表示发送时刻
+        """
         try:
             if not self.marker_running:
                 self.logger.warning("Marker发送线程未运行")
@@ -245,7 +446,7 @@ class LSLManager:
             
             # 放入发送队列
             if not self.marker_queue.full():
-                self.marker_queue.put(code)
+                self.marker_queue.put((code, timestamp, time.perf_counter()))
                 info_msg = f"⏰ Marker已排队: {code}"
                 if meaning:
                     info_msg += f" ({meaning})"
@@ -276,7 +477,7 @@ class LSLManager:
             print(f"   组播模式: {use_multicast}")
             
             # 创建NatNet客户端
-            self.natnet_client = NatNetClient()
+            self.natnet_client = CapturingNatNetClient()
             self.natnet_client.set_client_address(client_ip)
             self.natnet_client.set_server_address(server_ip)
             self.natnet_client.set_use_multicast(use_multicast)
@@ -284,6 +485,9 @@ class LSLManager:
             # 关闭NatNet的verbose输出（避免淹没我们的调试信息）
             self.natnet_client.set_print_level(0)  # 0=关闭, 1=开启, >1=每N帧打印一次
             
+            # 启动帧总线订阅者线程
+            self.frame_bus.start()
+            
             # 设置回调函数（使用new_frame_with_data_listener获取完整MoCapData对象）
             self.natnet_client.new_frame_with_data_listener = self._on_new_frame
             self.natnet_client.rigid_body_listener = self._on_rigid_body_frame
@@ -307,6 +511,11 @@ class LSLManager:
                 print("   4. IP地址是否正确")
                 return False
             
+            # 记录NatNet版本（原始数据包归档需要据此解码）
+            if self.optitrack_saver:
+                self.optitrack_saver.natnet_version = (self.natnet_client.get_major(),
+                                                       self.natnet_client.get_minor())
+            
             self.natnet_connected = True
             self.start_time = time.time()
             self.frame_count = 0
@@ -319,9 +528,50 @@ class LSLManager:
             print(f"❌ NatNet初始化失败: {e}")
             return False
     
+    def start_offline_source(self):
+        """Offline Mode：不创建NatNet客户端，启动帧总线后由inject_mocap_data/inject_packet注入帧"""
+        self.frame_bus.start()
+        self.natnet_connected = True
+        self.start_time = time.time()
+        self.frame_count = 0
+        print("✅ Offline Mode: 帧由模拟数据/原始数据包回放注入")
+        return True
+    
+    def inject_mocap_data(self, mocap_data, frame_number=None):
+        """(Offline Mode) 注入一帧MoCapData，与NatNet回调走相同的帧总线路径（在调用线程内执行inline订阅者）"""
+        self._on_new_frame({'mocap_data': mocap_data, 'frame_number': frame_number})
+    
+    def inject_packet(self, packet, major, minor):
+        """(Offline Mode) 解码并注入一个原始NatNet数据包（natnet_capture归档中的记录）
+        
+        Args:
+            packet: 原始数据包（非帧数据包被忽略）
+            major/minor: 录制时的NatNet版本（RawPacketReader.major/minor）
+        """
+        if not CapturingNatNetClient:
+            self.logger.error("NatNetSDK不可用，无法解码原始数据包")
+            return False
+        
+        if self.offline_decoder is None:
+            self.offline_decoder = CapturingNatNetClient()
+            self.offline_decoder.set_print_level(0)
+            self.offline_decoder.new_frame_with_data_listener = self._on_new_frame
+            self.offline_decoder.rigid_body_listener = self._on_rigid_body_frame
+        self.offline_decoder._NatNetClient__nat_net_requested_version = [major, minor, 0, 0]
+        
+        if int.from_bytes(packet[0:2], byteorder='little', signed=True) != NatNetClient.NAT_FRAMEOFDATA:
+            return False
+        self.offline_decoder._NatNetClient__process_message(packet, 0)
+        return True
+    
     def _on_new_frame(self, data_dict):
         """NatNet新帧回调函数（使用new_frame_with_data_listener）
         
+        仅做计数和打时间戳，然后通过帧总线分发给各订阅者：
+            - pose: 实时位置缓存 + LSL位置推送（inline，接收线程内执行）
+            - optitrack_saver: CSV保存（独立线程，无损队列）
+            - debug: 调试打印（独立线程，每120帧取样）
+        
         data_dict包含:
             - "mocap_data": MoCapFrame对象（包含marker_set_data, skeleton_data等）
             - "frame_number": 帧号
@@ -333,184 +583,481 @@ class LSLManager:
                 self.logger.warning("data_dict中缺少mocap_data")
                 return
             
-            mocap_data = data_dict["mocap_data"]
+            callback_start = time.perf_counter()
+            
+            # 首帧时将NatNet接收线程绑定到指定CPU核心
+            if self.cpu_affinity and not self._receive_thread_pinned:
+                self._receive_thread_pinned = True
+                pin_current_thread(self.cpu_affinity)
             
             self.frame_count += 1
             self.natnet_frame_number += 1
             current_time = time.time()
-            self.frame_timestamps.append(current_time)
+            self.last_frame_time = current_time
+            self.frame_rate.tick(current_time)
             
-            # 保存原始NatNet数据（如果数据保存器可用）
-            if self.optitrack_saver and self.optitrack_saver.is_active:
-                # 保存Markerset数据（marker_set_data，包含命名的markerset如Sub001）
-                if hasattr(mocap_data, 'marker_set_data') and mocap_data.marker_set_data:
-                    marker_set_list = getattr(mocap_data.marker_set_data, 'marker_data_list', [])
-                    if marker_set_list:
-                        self.optitrack_saver.save_marker_data(self.natnet_frame_number, marker_set_list)
-                
-                # 保存骨骼数据
-                if hasattr(mocap_data, 'skeleton_data') and mocap_data.skeleton_data:
-                    skeleton_list = getattr(mocap_data.skeleton_data, 'skeleton_list', [])
-                    if skeleton_list:
-                        self.optitrack_saver.save_skeleton_data(self.natnet_frame_number, skeleton_list)
-                
-                # 保存刚体数据
-                if hasattr(mocap_data, 'rigid_body_data') and mocap_data.rigid_body_data:
-                    rigidbody_list = getattr(mocap_data.rigid_body_data, 'rigid_body_list', [])
-                    if rigidbody_list:
-                        self.optitrack_saver.save_rigidbody_data(self.natnet_frame_number, rigidbody_list)
-            
-            # 处理Markerset数据（优先，用于实时跟踪）
-            if hasattr(mocap_data, 'marker_set_data') and mocap_data.marker_set_data:
-                marker_set_list = getattr(mocap_data.marker_set_data, 'marker_data_list', [])
+            # 附加接收信息后分发
+            data_dict['recv_time'] = current_time
+            data_dict['lsl_time'] = local_clock()
+            data_dict['local_frame_number'] = self.natnet_frame_number
+            if self.natnet_client and self.natnet_client.capture_packets:
+                data_dict['raw_packet'] = self.natnet_client.current_packet
+            self.frame_bus.publish(data_dict)
+            
+            # 遥测：保存队列深度与回调耗时
+            self.saver_queue_depth.update(len(self.saver_subscriber.queue))
+            callback_duration = time.perf_counter() - callback_start
+            self.callback_time.update(callback_duration)
+            
+            # 负载控制（可能触发降级/恢复）
+            self.budget_controller.update(callback_duration, self.natnet_frame_number)
+            
+        except Exception as e:
+            self.logger.error(f"新帧处理错误: {e}")
+    
+    def _setup_frame_bus(self):
+        """注册帧总线订阅者"""
+        self.frame_bus.subscribe('pose', self._process_pose_frame,
+                                 policy=POLICY_LOSSLESS, threaded=False)
+        self.frame_bus.subscribe('heading', self._process_heading_frame,
+                                 policy=POLICY_LOSSLESS, threaded=False)
+        self.frame_bus.subscribe('geofence', self._update_geofence,
+                                 policy=POLICY_LOSSLESS, threaded=False)
+        self.frame_bus.subscribe('pose_notify', self._notify_new_pose,
+                                 policy=POLICY_LOSSLESS, threaded=False)
+        self.saver_subscriber = self.frame_bus.subscribe('optitrack_saver', self._save_frame,
+                                                         policy=POLICY_LOSSLESS, queue_size=2000, threaded=True)
+        self.frame_bus.subscribe('quality', self._update_marker_quality,
+                                 policy=POLICY_LOSSLESS, queue_size=512, threaded=True)
+        self.frame_bus.subscribe('debug', self._print_frame_debug,
+                                 policy=POLICY_SAMPLED, queue_size=4, sample_every=120, threaded=True)
+    
+    def _process_heading_frame(self, data_dict):
+        """(帧总线inline订阅者) 一次性计算本帧所有刚体/骨骼根关节的朝向与角速度"""
+        # 负载降级时与骨骼处理一同抽帧（角速度按实际帧间隔计算）
+        if self.skeleton_decimation > 1 and data_dict['local_frame_number'] % self.skeleton_decimation:
+            return
+        
+        mocap_data = data_dict["mocap_data"]
+        names = []
+        quaternions = []
+        
+        # 刚体（仅跟踪有效的）
+        if hasattr(mocap_data, 'rigid_body_data') and mocap_data.rigid_body_data:
+            for rigid_body in getattr(mocap_data.rigid_body_data, 'rigid_body_list', []):
+                if rigid_body.tracking_valid:
+                    names.append(f"RigidBody_{rigid_body.id_num}")
+                    quaternions.append(rigid_body.rot)
+        
+        # 骨骼根关节（列表中的第一个关节）
+        if hasattr(mocap_data, 'skeleton_data') and mocap_data.skeleton_data:
+            for skeleton in getattr(mocap_data.skeleton_data, 'skeleton_list', []):
+                joints = getattr(skeleton, 'rigid_body_list', [])
+                if not joints:
+                    continue
+                model_name = getattr(skeleton, 'name', None)
+                if isinstance(model_name, bytes):
+                    model_name = model_name.decode('utf-8')
+                names.append(model_name or f"Skeleton_{skeleton.id_num}")
+                quaternions.append(joints[0].rot)
+        
+        if not names:
+            return
+        
+        timestamp = data_dict['lsl_time']
+        yaw, yaw_rate = self.heading_estimator.update(names, quaternions, timestamp)
+        
+        for i, name in enumerate(names):
+            self.latest_headings[name] = {
+                'yaw': float(yaw[i]),
+                'yaw_rate': float(yaw_rate[i]),
+                'timestamp': timestamp,
+                'valid': True
+            }
+        
+        # 推送朝向流（本帧有数据源的被试）
+        for subject, outlet in self.heading_outlets.items():
+            for source in self.heading_sources.get(subject) or candidate_heading_sources(subject):
+                heading = self.latest_headings.get(source)
+                if heading and heading['timestamp'] == timestamp:
+                    try:
+                        outlet.push_sample([heading['yaw'], heading['yaw_rate'], 1.0], timestamp)
+                    except Exception as e:
+                        self.logger.warning(f"LSL朝向推送失败 {subject}: {e}")
+                    break
+    
+    def get_latest_heading(self, subject_name):
+        """获取被试最新朝向
+        
+        Args:
+            subject_name: 被试名称（如"Sub001"）或数据源名称（如"RigidBody_1"）
+        
+        Returns:
+            dict: {'yaw': 弧度, 'yaw_rate': 弧度/秒, 'timestamp': LSL时间戳, 'valid': bool} 或 None
+        """
+        sources = self.heading_sources.get(subject_name) or candidate_heading_sources(subject_name)
+        for source in sources:
+            heading = self.latest_headings.get(source)
+            if heading and heading['valid']:
+                return heading
+        return None
+    
+    def _feed_resampler(self, data_dict):
+        """(帧总线inline订阅者) 将本帧更新的Markerset质心送入等间隔重采样器"""
+        recv_time = data_dict['recv_time']
+        for subject in self.resampler.outlets:
+            skeleton_data = self.latest_skeleton_data.get(subject)
+            if skeleton_data and skeleton_data['timestamp'] == recv_time and skeleton_data.get('source') == 'markerset':
+                x, y, z = skeleton_data['pelvis_position']
+                self.resampler.add_sample(subject, x, y, z, data_dict['lsl_time'])
+    
+    def _update_synchrony(self, data_dict):
+        """(帧总线inline订阅者) 两名被试在本帧均有更新时增量更新同步指标"""
+        recv_time = data_dict['recv_time']
+        data_a = self.latest_skeleton_data.get(self.synchrony.subject_a)
+        data_b = self.latest_skeleton_data.get(self.synchrony.subject_b)
+        if not (data_a and data_b and data_a['timestamp'] == recv_time and data_b['timestamp'] == recv_time):
+            return
+        
+        heading_a = self.get_latest_heading(self.synchrony.subject_a)
+        heading_b = self.get_latest_heading(self.synchrony.subject_b)
+        self.synchrony.update(
+            data_dict['lsl_time'],
+            data_a.get('filtered_position', data_a['pelvis_position']),
+            data_b.get('filtered_position', data_b['pelvis_position']),
+            heading_a['yaw'] if heading_a else None,
+            heading_b['yaw'] if heading_b else None
+        )
+    
+    def _update_geofence(self, data_dict):
+        """(帧总线inline订阅者) 用本帧更新的被试位置评估围栏区域"""
+        if not self.geofence.active:
+            return
+        
+        recv_time = data_dict['recv_time']
+        positions = {}
+        for subject, names in self.geofence_names.items():
+            for name in names:
+                skeleton_data = self.latest_skeleton_data.get(name)
+                if skeleton_data and skeleton_data['valid'] and skeleton_data['timestamp'] == recv_time:
+                    pos = skeleton_data.get('filtered_position', skeleton_data['pelvis_position'])
+                    positions[subject] = (pos[0], pos[2])
+                    break
+        
+        if positions:
+            self.geofence.update(positions, data_dict['lsl_time'], data_dict['local_frame_number'])
+    
+    def set_geofences(self, regions, subjects):
+        """设置逐帧评估的围栏区域（替换之前的区域，清空未读事件）
+        
+        Args:
+            regions: 区域对象列表（geofence.CircleRegion/BandRegion/PolygonRegion）
+            subjects: 被试名称列表（如['Sub001']）
+        """
+        self.geofence_names = {subject: candidate_skeleton_names(subject) for subject in subjects}
+        self.geofence.set_regions(regions, subjects)
+        return True
+    
+    def clear_geofences(self):
+        """停止围栏评估"""
+        self.geofence.clear()
+        return True
+    
+    def poll_geofence_events(self):
+        """取出所有未读围栏事件（timestamp为触发帧的LSL时间戳）"""
+        return self.geofence.poll_events()
+    
+    def get_latest_synchrony(self):
+        """获取最新同步指标
+        
+        Returns:
+            dict: {'distance', 'distance_mean', 'velocity_corr', 'relative_heading', 'timestamp', 'valid'} 或 None
+        """
+        return self.synchrony.latest if self.synchrony else None
+    
+    def _on_shed_transition(self, old_level, new_level, event):
+        """(接收线程) 应用降级级别：实时位置与LSL位置推送始终不受影响"""
+        # 1. 调试打印
+        debug_subscriber = self.frame_bus.get_subscriber('debug')
+        if debug_subscriber:
+            debug_subscriber.enabled = new_level < SHED_DEBUG
+        
+        # 2. CSV保存 -> 原始数据包归档（带raw_packet的帧由保存线程直接归档）
+        if self.natnet_client:
+            self.natnet_client.capture_packets = new_level >= SHED_RAW_ARCHIVE
+        
+        # 3. 骨骼备选路径抽帧
+        self.skeleton_decimation = 4 if new_level >= SHED_DECIMATE else 1
+        
+        arrow = '⬇️' if new_level > old_level else '⬆️'
+        print(f"{arrow}  采集负载级别: {event['from_name']} -> {event['to_name']} "
+              f"(回调 {event['mean_duration_ms']:.2f}ms / 预算 {event['budget_ms']:.2f}ms)")
+        
+        if self.optitrack_saver and self.optitrack_saver.is_active:
+            self.optitrack_saver.log_load_shedding(event)
+    
+    def _process_pose_frame(self, data_dict):
+        """(帧总线inline订阅者) 更新实时位置缓存并推送LSL位置流"""
+        mocap_data = data_dict["mocap_data"]
+        current_time = data_dict['recv_time']
+        frame_subjects = []  # [(model_name, 质心, 存储名称)]
+        
+        # 处理Markerset数据（优先，用于实时跟踪）
+        if hasattr(mocap_data, 'marker_set_data') and mocap_data.marker_set_data:
+            marker_set_list = getattr(mocap_data.marker_set_data, 'marker_data_list', [])
+            
+            for marker_set in marker_set_list:
+                # 获取Markerset名称（如"Sub001"）
+                model_name = getattr(marker_set, 'model_name', None)
+                if model_name:
+                    try:
+                        if isinstance(model_name, bytes):
+                            model_name = model_name.decode('utf-8', errors='replace')
+                    except Exception as e:
+                        self.logger.warning(f"无法解码model_name: {e}")
+                        model_name = str(model_name)
                 
-                for marker_set in marker_set_list:
-                    # 获取Markerset名称（如"Sub001"）
-                    model_name = getattr(marker_set, 'model_name', None)
-                    if model_name:
-                        try:
-                            if isinstance(model_name, bytes):
-                                model_name = model_name.decode('utf-8', errors='replace')
-                        except Exception as e:
-                            self.logger.warning(f"无法解码model_name: {e}")
-                            model_name = str(model_name)
+                # 跳过"all"这个总集合
+                if model_name and model_name.lower() != 'all':
+                    # 获取marker位置列表（NatNet SDK: marker_pos_list是位置列表，不是对象列表）
+                    marker_positions = getattr(marker_set, 'marker_pos_list', [])
                     
-                    # 跳过"all"这个总集合
-                    if model_name and model_name.lower() != 'all':
-                        # 获取marker位置列表（NatNet SDK: marker_pos_list是位置列表，不是对象列表）
-                        marker_positions = getattr(marker_set, 'marker_pos_list', [])
+                    if marker_positions:
+                        # 计算所有marker的质心作为这个subject的位置
+                        pos_x_sum = 0.0
+                        pos_y_sum = 0.0
+                        pos_z_sum = 0.0
+                        valid_marker_count = 0
+                        
+                        for pos in marker_positions:
+                            # pos直接是[x, y, z]列表（Y是Up-axis）
+                            if pos and len(pos) >= 3:
+                                pos_x_sum += pos[0]
+                                pos_y_sum += pos[1]  # Y是Up-axis
+                                pos_z_sum += pos[2]
+                                valid_marker_count += 1
                         
-                        if marker_positions:
-                            # 计算所有marker的质心作为这个subject的位置
-                            pos_x_sum = 0.0
-                            pos_y_sum = 0.0
-                            pos_z_sum = 0.0
-                            valid_marker_count = 0
+                        if valid_marker_count > 0:
+                            # 质心位置
+                            centroid_position = (
+                                pos_x_sum / valid_marker_count,
+                                pos_y_sum / valid_marker_count,
+                                pos_z_sum / valid_marker_count
+                            )
                             
-                            for pos in marker_positions:
-                                # pos直接是[x, y, z]列表（Y是Up-axis）
-                                if pos and len(pos) >= 3:
-                                    pos_x_sum += pos[0]
-                                    pos_y_sum += pos[1]  # Y是Up-axis
-                                    pos_z_sum += pos[2]
-                                    valid_marker_count += 1
+                            # 存储到latest_skeleton_data（复用相同的数据结构）
+                            storage_names = [model_name]  # Sub001格式
                             
-                            if valid_marker_count > 0:
-                                # 质心位置
-                                centroid_position = (
-                                    pos_x_sum / valid_marker_count,
-                                    pos_y_sum / valid_marker_count,
-                                    pos_z_sum / valid_marker_count
-                                )
-                                
-                                # 存储到latest_skeleton_data（复用相同的数据结构）
-                                storage_names = [model_name]  # Sub001格式
-                                
-                                # 提取ID号（如从"Sub001"提取1）
-                                if model_name.startswith('Sub'):
-                                    try:
-                                        sub_id_str = model_name[3:]  # "001"
-                                        sub_id = int(sub_id_str)
-                                        storage_names.append(f"Skeleton_{sub_id}")  # Skeleton_1
-                                    except ValueError:
-                                        pass
-                                
-                                for name in storage_names:
-                                    self.latest_skeleton_data[name] = {
-                                        'skeleton_id': 0,
-                                        'model_name': model_name,
-                                        'pelvis_position': centroid_position,
-                                        'timestamp': current_time,
-                                        'valid': True,
-                                        'source': 'markerset'  # 标记数据来源
-                                    }
-                                
-                                # 推送到LSL位置流（V3.3新增）
-                                if self.position_broadcast_enabled and model_name in self.position_outlets:
-                                    try:
-                                        position_sample = [
-                                            float(centroid_position[0]),  # X
-                                            float(centroid_position[1]),  # Y
-                                            float(centroid_position[2])   # Z
-                                        ]
-                                        self.position_outlets[model_name].push_sample(position_sample)
-                                    except Exception as e:
-                                        self.logger.warning(f"LSL位置推送失败 {model_name}: {e}")
-                                
-                                # 调试信息（每120帧打印一次）
-                                if self.frame_count % 120 == 1:
-                                    print(f"[NatNet] Markerset数据: {model_name} -> 质心: ({centroid_position[0]:.3f}, {centroid_position[1]:.3f}, {centroid_position[2]:.3f}) [{valid_marker_count}个标记] -> 已存储为: {storage_names}")
-            
-            # 处理骨骼数据（用于实时跟踪，作为备选）
-            if hasattr(mocap_data, 'skeleton_data') and mocap_data.skeleton_data:
-                skeleton_list = getattr(mocap_data.skeleton_data, 'skeleton_list', [])
+                            # 提取ID号（如从"Sub001"提取1）
+                            if model_name.startswith('Sub'):
+                                try:
+                                    sub_id_str = model_name[3:]  # "001"
+                                    sub_id = int(sub_id_str)
+                                    storage_names.append(f"Skeleton_{sub_id}")  # Skeleton_1
+                                except ValueError:
+                                    pass
+                            
+                            for name in storage_names:
+                                self.latest_skeleton_data[name] = {
+                                    'skeleton_id': 0,
+                                    'model_name': model_name,
+                                    'pelvis_position': centroid_position,
+                                    'timestamp': current_time,
+                                    'valid': True,
+                                    'source': 'markerset',  # 标记数据来源
+                                    'marker_count': valid_marker_count
+                                }
+                            
+                            frame_subjects.append((model_name, centroid_position, storage_names))
+        
+        # 位置滤波（所有被试一次向量化计算）
+        filtered_positions = None
+        if self.pose_filter and frame_subjects:
+            filtered_positions = self.pose_filter.update(
+                [subject[0] for subject in frame_subjects],
+                [subject[1] for subject in frame_subjects],
+                data_dict['lsl_time']
+            )
+        
+        for i, (model_name, centroid_position, storage_names) in enumerate(frame_subjects):
+            position_sample = [
+                float(centroid_position[0]),  # X
+                float(centroid_position[1]),  # Y
+                float(centroid_position[2])   # Z
+            ]
+            
+            if filtered_positions is not None:
+                filtered_position = tuple(float(v) for v in filtered_positions[i])
+                for name in storage_names:
+                    self.latest_skeleton_data[name]['filtered_position'] = filtered_position
+                position_sample.extend(filtered_position)  # Filtered_X/Y/Z
+            
+            # 推送到LSL位置流（V3.3新增）
+            if self.position_broadcast_enabled and model_name in self.position_outlets:
+                try:
+                    push_start = time.perf_counter()
+                    self.position_outlets[model_name].push_sample(position_sample)
+                    self.lsl_push_time.update(time.perf_counter() - push_start)
+                except Exception as e:
+                    self.logger.warning(f"LSL位置推送失败 {model_name}: {e}")
+        
+        # 处理骨骼数据（用于实时跟踪，作为备选；负载降级时抽帧）
+        if self.skeleton_decimation > 1 and data_dict['local_frame_number'] % self.skeleton_decimation:
+            return
+        
+        if hasattr(mocap_data, 'skeleton_data') and mocap_data.skeleton_data:
+            skeleton_list = getattr(mocap_data.skeleton_data, 'skeleton_list', [])
+            
+            for skeleton in skeleton_list:
+                skeleton_id = skeleton.id_num
                 
-                # 调试：首次发现骨骼时打印
-                if skeleton_list and self.frame_count % 120 == 1:
-                    print(f"🔍 发现 {len(skeleton_list)} 个骨骼对象")
+                # 获取Motive中的Model Name（如Sub001）
+                model_name = getattr(skeleton, 'name', None)
+                if model_name and isinstance(model_name, bytes):
+                    model_name = model_name.decode('utf-8')
                 
-                for skeleton in skeleton_list:
-                    skeleton_id = skeleton.id_num
-                    
-                    # 获取Motive中的Model Name（如Sub001）
-                    model_name = getattr(skeleton, 'name', None)
-                    if model_name and isinstance(model_name, bytes):
-                        model_name = model_name.decode('utf-8')
-                    
-                    # 查找Pelvis/Root Joint
-                    pelvis_position = None
-                    joints = getattr(skeleton, 'rigid_body_list', [])
-                    if joints:
-                        for joint in joints:
-                            joint_name = getattr(joint, 'name', '')
-                            if isinstance(joint_name, bytes):
-                                joint_name = joint_name.decode('utf-8')
-                            joint_name_lower = joint_name.lower()
-                            
-                            # 查找Pelvis或第一个关节
-                            if 'pelvis' in joint_name_lower or 'root' in joint_name_lower or joint.id_num == 0:
-                                pelvis_position = (joint.pos[0], joint.pos[1], joint.pos[2])
-                                break
-                    
-                    # 如果没有找到特定关节，使用第一个关节
-                    if not pelvis_position and joints and len(joints) > 0:
-                        first_joint = joints[0]
-                        pelvis_position = (first_joint.pos[0], first_joint.pos[1], first_joint.pos[2])
-                    
-                    if pelvis_position:
-                        # 存储多种命名格式
-                        storage_names = []
-                        if model_name:
-                            storage_names.append(model_name)  # Sub001
-                        storage_names.append(f"Skeleton_{skeleton_id}")  # Skeleton_1
-                        
-                        for name in storage_names:
-                            self.latest_skeleton_data[name] = {
-                                'skeleton_id': skeleton_id,
-                                'model_name': model_name,
-                                'pelvis_position': pelvis_position,
-                                'timestamp': current_time,
-                                'valid': True
-                            }
+                # 查找Pelvis/Root Joint
+                pelvis_position = None
+                joints = getattr(skeleton, 'rigid_body_list', [])
+                if joints:
+                    for joint in joints:
+                        joint_name = getattr(joint, 'name', '')
+                        if isinstance(joint_name, bytes):
+                            joint_name = joint_name.decode('utf-8')
+                        joint_name_lower = joint_name.lower()
                         
-                        # 调试信息（每120帧打印一次）
-                        if self.frame_count % 120 == 1:
-                            print(f"📊 骨骼数据: {model_name} (ID={skeleton_id}) -> Pelvis位置: ({pelvis_position[0]:.3f}, {pelvis_position[1]:.3f}, {pelvis_position[2]:.3f})")
-            
-            # 每100帧打印一次统计
-            if self.frame_count % 100 == 0:
-                if self.start_time:
-                    duration = current_time - self.start_time
-                    fps = self.frame_count / duration if duration > 0 else 0
-                    print(f"[NatNet] 帧数: {self.frame_count}, FPS: {fps:.1f}, 缓存骨骼: {list(self.latest_skeleton_data.keys())}")
-                    
-                    # 输出数据保存统计
-                    if self.optitrack_saver and self.optitrack_saver.is_active:
-                        stats = self.optitrack_saver.get_statistics()
-                        print(f"💾 OptiTrack数据: Marker={stats['marker_count']}, Skeleton={stats['skeleton_count']}, RigidBody={stats['rigidbody_count']}")
+                        # 查找Pelvis或第一个关节
+                        if 'pelvis' in joint_name_lower or 'root' in joint_name_lower or joint.id_num == 0:
+                            pelvis_position = (joint.pos[0], joint.pos[1], joint.pos[2])
+                            break
+                
+                # 如果没有找到特定关节，使用第一个关节
+                if not pelvis_position and joints and len(joints) > 0:
+                    first_joint = joints[0]
+                    pelvis_position = (first_joint.pos[0], first_joint.pos[1], first_joint.pos[2])
+                
+                if pelvis_position:
+                    # 存储多种命名格式
+                    storage_names = []
+                    if model_name:
+                        storage_names.append(model_name)  # Sub001
+                    storage_names.append(f"Skeleton_{skeleton_id}")  # Skeleton_1
                     
-        except Exception as e:
-            self.logger.error(f"新帧处理错误: {e}")
+                    for name in storage_names:
+                        self.latest_skeleton_data[name] = {
+                            'skeleton_id': skeleton_id,
+                            'model_name': model_name,
+                            'pelvis_position': pelvis_position,
+                            'timestamp': current_time,
+                            'valid': True
+                        }
+    
+    def _notify_new_pose(self, data_dict):
+        """(帧总线inline订阅者) 位置缓存与围栏更新完成后唤醒等待新位置的渲染循环"""
+        with self.pose_condition:
+            self.pose_sequence += 1
+            self.pose_condition.notify_all()
+    
+    def wait_for_pose(self, last_sequence, timeout):
+        """等待位置缓存更新（序号不同于last_sequence）或超时
+        
+        Args:
+            last_sequence: 调用方已读取的序号
+            timeout: 最长等待时间（秒），<=0时立即返回
+            
+        Returns:
+            int: 当前序号（与last_sequence相同表示超时、无新位置）
+        """
+        with self.pose_condition:
+            if timeout > 0:
+                self.pose_condition.wait_for(lambda: self.pose_sequence != last_sequence, timeout)
+            return self.pose_sequence
+    
+    def _update_marker_quality(self, data_dict):
+        """(帧总线threaded订阅者) 更新逐被试标记质量统计"""
+        mocap_data = data_dict["mocap_data"]
+        
+        marker_set_data = getattr(mocap_data, 'marker_set_data', None)
+        if not marker_set_data:
+            return
+        
+        labeled_marker_data = getattr(mocap_data, 'labeled_marker_data', None)
+        self.quality_monitor.update(
+            getattr(marker_set_data, 'marker_data_list', []),
+            getattr(labeled_marker_data, 'labeled_marker_list', None),
+            frame_number=data_dict.get('local_frame_number')
+        )
+    
+    def set_trial_context(self, trial=None, phase=None):
+        """设置当前试次/阶段（试次开始时调用，trial=None表示试次外）"""
+        self.trial_context = (trial, phase)
+        self.quality_monitor.set_trial_context(trial, phase)
+    
+    def _save_frame(self, data_dict):
+        """(帧总线threaded订阅者) 保存原始NatNet数据到CSV"""
+        if not (self.optitrack_saver and self.optitrack_saver.is_active):
+            return
+        
+        mocap_data = data_dict["mocap_data"]
+        frame_number = data_dict['local_frame_number']
+        timestamp = data_dict['lsl_time']  # 接收时刻（而非保存线程写入时刻）
+        
+        # 负载降级期间：直接归档原始数据包，跳过逐字段CSV格式化
+        raw_packet = data_dict.get('raw_packet')
+        if raw_packet:
+            self.optitrack_saver.save_raw_packet(frame_number, raw_packet, timestamp=timestamp)
+            return
+        
+        # 保存Markerset数据（marker_set_data，包含命名的markerset如Sub001）
+        if hasattr(mocap_data, 'marker_set_data') and mocap_data.marker_set_data:
+            marker_set_list = getattr(mocap_data.marker_set_data, 'marker_data_list', [])
+            if marker_set_list:
+                labeled_marker_data = getattr(mocap_data, 'labeled_marker_data', None)
+                self.optitrack_saver.save_marker_data(
+                    frame_number, marker_set_list,
+                    getattr(labeled_marker_data, 'labeled_marker_list', None),
+                    timestamp=timestamp
+                )
+        
+        # 保存骨骼数据
+        if hasattr(mocap_data, 'skeleton_data') and mocap_data.skeleton_data:
+            skeleton_list = getattr(mocap_data.skeleton_data, 'skeleton_list', [])
+            if skeleton_list:
+                self.optitrack_saver.save_skeleton_data(frame_number, skeleton_list, timestamp=timestamp)
+        
+        # 保存刚体数据
+        if hasattr(mocap_data, 'rigid_body_data') and mocap_data.rigid_body_data:
+            rigidbody_list = getattr(mocap_data.rigid_body_data, 'rigid_body_list', [])
+            if rigidbody_list:
+                self.optitrack_saver.save_rigidbody_data(frame_number, rigidbody_list, timestamp=timestamp)
+    
+    def _print_frame_debug(self, data_dict):
+        """(帧总线取样订阅者) 调试信息与统计打印（每120帧一次）"""
+        mocap_data = data_dict["mocap_data"]
+        
+        # Markerset质心
+        for name, skeleton_data in list(self.latest_skeleton_data.items()):
+            if skeleton_data.get('source') == 'markerset' and name == skeleton_data.get('model_name'):
+                pos = skeleton_data['pelvis_position']
+                print(f"[NatNet] Markerset数据: {name} -> 质心: ({pos[0]:.3f}, {pos[1]:.3f}, {pos[2]:.3f}) [{skeleton_data.get('marker_count', 0)}个标记]")
+        
+        # 骨骼对象
+        if hasattr(mocap_data, 'skeleton_data') and mocap_data.skeleton_data:
+            skeleton_list = getattr(mocap_data.skeleton_data, 'skeleton_list', [])
+            if skeleton_list:
+                print(f"🔍 发现 {len(skeleton_list)} 个骨骼对象")
+        
+        # 帧率统计（增量滚动估计）
+        print(f"[NatNet] 帧数: {self.frame_count}, FPS: {self.frame_rate.rate:.1f}, "
+              f"抖动: {self.frame_rate.jitter * 1000.0:.2f}ms, 回调: {self.callback_time.mean * 1000.0:.2f}ms, "
+              f"缓存骨骼: {list(self.latest_skeleton_data.keys())}")
+        
+        # 输出数据保存统计
+        if self.optitrack_saver and self.optitrack_saver.is_active:
+            stats = self.optitrack_saver.get_statistics()
+            saver_sub = self.frame_bus.get_subscriber('optitrack_saver')
+            dropped = saver_sub.dropped_count if saver_sub else 0
+            print(f"💾 OptiTrack数据: Marker={stats['marker_count']}, Skeleton={stats['skeleton_count']}, RigidBody={stats['rigidbody_count']}, 丢帧={dropped}")
     
     def _on_rigid_body_frame(self, rigid_body_id, position, rotation):
         """NatNet刚体帧回调函数"""
@@ -530,53 +1077,39 @@ class LSLManager:
         except Exception as e:
             self.logger.error(f"刚体数据处理错误: {e}")
     
-    def get_latest_skeleton_data(self, skeleton_name):
+    def get_latest_skeleton_data(self, skeleton_name, filtered=False):
         """提取指定骨骼的Root/Pelvis核心3D位置
         
         Args:
             skeleton_name: 骨骼名称，支持多种格式：
                 - "Sub001" -> 映射到存储的"Skeleton_1"格式
                 - "Skeleton_1" -> 直接使用
+            filtered: 是否返回滤波后位置（未启用滤波器时返回原始位置）
                 
         Returns:
             dict: {
                 'x': float, 'y': float, 'z': float,
-                'timestamp': float, 'valid': bool
+                'timestamp': float, 'valid': bool, 'filtered': bool
             } 或 None
         """
         try:
-            # 生成可能的骨骼名称列表
-            possible_names = []
-            
-            if skeleton_name.startswith('Sub'):
-                # Sub001格式 -> 转换为多种可能的存储格式
-                try:
-                    sub_id = skeleton_name[3:]  # 提取001部分
-                    skeleton_id = int(sub_id)   # 转换为数字1
-                    possible_names = [
-                        skeleton_name,  # Sub001
-                        f"Skeleton_{skeleton_id}",  # Skeleton_1
-                        f"Skeleton_{sub_id}"  # Skeleton_001
-                    ]
-                except ValueError:
-                    possible_names = [skeleton_name]
-            else:
-                # 其他格式直接使用
-                possible_names = [skeleton_name]
-            
             # 尝试每种可能的名称
-            for name in possible_names:
+            for name in candidate_skeleton_names(skeleton_name):
                 if name in self.latest_skeleton_data:
                     skeleton_data = self.latest_skeleton_data[name]
                     
                     if skeleton_data['valid']:
                         pos = skeleton_data['pelvis_position']
+                        use_filtered = filtered and 'filtered_position' in skeleton_data
+                        if use_filtered:
+                            pos = skeleton_data['filtered_position']
                         return {
                             'x': pos[0],
                             'y': pos[1],
                             'z': pos[2],
                             'timestamp': skeleton_data['timestamp'],
-                            'valid': True
+                            'valid': True,
+                            'filtered': use_filtered
                         }
             
             return None
@@ -630,10 +1163,9 @@ class LSLManager:
         # NatNet连接检查：最近3秒内有数据帧，或者刚连接成功（10秒内）
         natnet_connected = False
         if self.natnet_connected:
-            if self.frame_timestamps:
+            if self.last_frame_time:
                 # 有数据帧：检查最后一帧时间
-                last_frame_time = self.frame_timestamps[-1]
-                natnet_connected = (current_time - last_frame_time) < 3.0
+                natnet_connected = (current_time - self.last_frame_time) < 3.0
             elif self.start_time:
                 # 刚连接，还没有数据帧：给10秒缓冲时间
                 time_since_start = current_time - self.start_time
@@ -665,17 +1197,13 @@ class LSLManager:
             'last_frame_age': None
         }
         
-        if self.frame_timestamps:
-            # 计算帧率（最近5秒）
-            recent_timestamps = [t for t in self.frame_timestamps if current_time - t < 5.0]
-            if len(recent_timestamps) > 1:
-                time_span = recent_timestamps[-1] - recent_timestamps[0]
-                if time_span > 0:
-                    natnet_stats['fps'] = len(recent_timestamps) / time_span
+        if self.last_frame_time:
+            # 帧率与抖动（增量滚动估计）
+            natnet_stats['fps'] = self.frame_rate.rate
+            natnet_stats['jitter_ms'] = self.frame_rate.jitter * 1000.0
             
             # 最后一帧的年龄
-            last_time = self.frame_timestamps[-1]
-            natnet_stats['last_frame_age'] = current_time - last_time
+            natnet_stats['last_frame_age'] = current_time - self.last_frame_time
             natnet_stats['connected'] = natnet_stats['last_frame_age'] < 3.0
         
         # LSL Marker统计
@@ -687,8 +1215,16 @@ class LSLManager:
         }
         
         return {
+            'shard': self.shard,
             'natnet': natnet_stats,
-            'lsl_marker': marker_stats
+            'lsl_marker': marker_stats,
+            'frame_bus': self.frame_bus.get_stats(),
+            'load_shedding': self.budget_controller.get_stats(),
+            'resampler': self.resampler.get_stats() if self.resampler else None,
+            'marker_quality': self.quality_monitor.get_stats(),
+            'synchrony': self.synchrony.get_stats() if self.synchrony else None,
+            'geofence': self.geofence.get_stats(),
+            'telemetry': self.telemetry.snapshot()['stats']
         }
     
     def start_optitrack_data_saving(self, dyad_id, session_id=None):
@@ -722,7 +1258,10 @@ class LSLManager:
             return False
         
     def start_services(self, server_ip="192.168.3.58", client_ip="192.168.3.55", use_multicast=True, 
-                       enable_position_broadcast=True, sub_ids=['001', '002']):
+                       enable_position_broadcast=True, sub_ids=['001', '002'],
+                       enable_telemetry=True, telemetry_port=9109, cpu_affinity=None, resample_rate=None,
+                       enable_heading_stream=False, pose_filter=None, pose_filter_params=None,
+                       enable_synchrony_stream=False, synchrony_window=2.0):
         """启动所有服务（NatNet + LSL Marker + LSL位置流）
         
         Args:
@@ -731,12 +1270,27 @@ class LSLManager:
             use_multicast: 是否使用组播
             enable_position_broadcast: 是否启用OptiTrack位置LSL广播（V3.3新增）
             sub_ids: 要广播的被试ID列表（V3.3新增）
+            enable_telemetry: 是否启动本地遥测端点和JSON快照（V3.4新增）
+            telemetry_port: 遥测HTTP端口（仅绑定127.0.0.1）
+            cpu_affinity: NatNet接收线程绑定的CPU核心列表，如[2, 3]（分片模式下避免相互抢占）
+            resample_rate: 额外输出等间隔重采样位置流的采样率（如120.0），None表示不启用
+            enable_heading_stream: 是否输出被试朝向LSL流（朝向始终可通过get_latest_heading获取）
+            pose_filter: 位置滤波器类型（'one_euro'或'kalman'），None表示不滤波
+            pose_filter_params: 滤波器参数（如{'min_cutoff': 1.0, 'beta': 20.0}）
+            enable_synchrony_stream: 是否输出双人同步指标流（sub_ids前两名被试，约10Hz）
+            synchrony_window: 同步指标滑动窗口长度（秒）
         """
         try:
-            print("\n🚀 启动LSL/NatNet混合管理器...")
+            print(f"\n🚀 启动LSL/NatNet混合管理器{f' [{self.shard}]' if self.shard else ''}...")
             
             # 设置位置广播开关
             self.position_broadcast_enabled = enable_position_broadcast
+            self.cpu_affinity = cpu_affinity
+            
+            # 位置滤波器组（需在创建位置流之前设置，决定位置流通道数）
+            if pose_filter and not self.pose_filter:
+                self.pose_filter = create_filter_bank(pose_filter, **(pose_filter_params or {}))
+                print(f"✅ 位置滤波已启用: {type(self.pose_filter).__name__}")
             
             # 1. 初始化LSL Marker输出流
             if not self.initialize_marker_outlet():
@@ -747,6 +1301,34 @@ class LSLManager:
                 if not self.initialize_position_outlets(sub_ids):
                     print("⚠️  位置LSL流初始化失败，但继续运行")
             
+            # 1.55 被试朝向流（V3.4，可选）
+            if enable_heading_stream and not self.heading_outlets:
+                if not self.initialize_heading_outlets(sub_ids):
+                    print("⚠️  朝向LSL流初始化失败，但继续运行")
+            
+            # 1.6 等间隔重采样位置流（V3.4，可选）
+            if enable_position_broadcast and resample_rate and not self.resampler:
+                resampler = PoseResampler(rate=resample_rate)
+                if resampler.create_outlets(sub_ids, self.stream_prefix):
+                    self.resampler = resampler
+                    self.frame_bus.subscribe('resampler', self._feed_resampler,
+                                             policy=POLICY_LOSSLESS, threaded=False)
+                    self.resampler.start()
+                else:
+                    print("⚠️  重采样位置流初始化失败，但继续运行")
+            
+            # 1.7 双人同步指标流（V3.4，可选；在pose/heading订阅者之后逐帧更新）
+            if enable_synchrony_stream and len(sub_ids) >= 2 and not self.synchrony:
+                synchrony = SynchronyTracker(f"Sub{sub_ids[0]}", f"Sub{sub_ids[1]}",
+                                             window=synchrony_window,
+                                             frame_rate=1.0 / self.budget_controller.budget)
+                if synchrony.create_outlet(self.stream_prefix):
+                    self.synchrony = synchrony
+                    self.frame_bus.subscribe('synchrony', self._update_synchrony,
+                                             policy=POLICY_LOSSLESS, threaded=False)
+                else:
+                    print("⚠️  同步指标流初始化失败，但继续运行")
+            
             # 2. 启动LSL Marker异步发送线程
             if not self.degraded_mode:
                 self.marker_running = True
@@ -759,11 +1341,20 @@ class LSLManager:
             else:
                 print("⚠️  Degraded Mode: 仅NatNet接收，无LSL Marker发送")
             
-            # 3. 初始化NatNet客户端
-            if not self.initialize_natnet_client(server_ip, client_ip, use_multicast):
+            # 3. 初始化NatNet客户端（Offline Mode下只启动帧总线，等待注入帧）
+            if self.offline_mode:
+                self.start_offline_source()
+            elif not self.initialize_natnet_client(server_ip, client_ip, use_multicast):
                 print("❌ NatNet客户端初始化失败")
                 return False
             
+            # 4. 启动遥测端点（另一个终端可通过 /metrics 查看运行状态）
+            if enable_telemetry and not self.telemetry_server:
+                snapshot_name = f'Telemetry_{self.shard}' if self.shard else 'Telemetry'
+                self.telemetry_server = TelemetryServer(self.telemetry, port=telemetry_port,
+                                                        snapshot_name=snapshot_name)
+                self.telemetry_server.start()
+            
             print("✅ LSL/NatNet混合管理器启动成功")
             print(f"   数据流: Motive → NatNet → Python")
             if not self.degraded_mode:
@@ -785,6 +1376,16 @@ class LSLManager:
         try:
             print("\n🧹 正在清理LSL/NatNet资源...")
             
+            # 先停止NatNet客户端（不再发布新帧）
+            if self.natnet_client and self.natnet_running:
+                self.natnet_running = False
+                self.natnet_connected = False
+                self.natnet_client.shutdown()
+                print("✅ NatNet客户端已停止")
+            
+            # 停止帧总线订阅者线程（保存等无损订阅者先写完已排队的帧）
+            self.frame_bus.stop(drain=True, timeout=10.0)
+            
             # 停止OptiTrack数据保存
             self.stop_optitrack_data_saving()
             
@@ -792,6 +1393,13 @@ class LSLManager:
             if self.position_outlets:
                 print(f"   清理 {len(self.position_outlets)} 个LSL位置流...")
                 self.position_outlets.clear()
+            self.heading_outlets.clear()
+            
+            # 停止等间隔重采样
+            if self.resampler:
+                self.frame_bus.unsubscribe('resampler')
+                self.resampler.stop()
+                self.resampler = None
             
             # 停止LSL Marker线程
             if self.marker_running:
@@ -800,12 +1408,10 @@ class LSLManager:
                     self.marker_thread.join(timeout=1.0)
                 print("✅ LSL Marker线程已停止")
             
-            # 停止NatNet客户端
-            if self.natnet_client and self.natnet_running:
-                self.natnet_running = False
-                self.natnet_connected = False
-                self.natnet_client.shutdown()
-                print("✅ NatNet客户端已停止")
+            # 停止遥测端点（写入最终快照）
+            if self.telemetry_server:
+                self.telemetry_server.stop()
+                self.telemetry_server = None
             
             # 统计信息
             if self.start_time:
@@ -0,0 +1,196 @@
+"""
+多分片采集组 (V3.4)
+一台采集电脑同时服务多个追踪空间（每个房间一个Dyad、一台Motive）
+
+每个分片拥有独立的NatNet客户端、位置缓存、带分片前缀的LSL流和数据保存器：
+- thread模式：LSLManager(shard=...) 在本进程中运行，NatNet接收线程按分片绑定CPU（Linux）
+- process模式：IngestServiceClient(shard=...) 在独立进程中运行，整个进程绑定CPU
+
+默认分片（default=True）使用LSLManager()单例，流名称不加前缀，现有实验流程无需修改。
+聚合健康视图通过本地遥测端点 /metrics 按分片标签输出（一次抓取只查询一次各分片，
+process模式下经IngestServiceClient加锁的控制管道查询）
+"""
+
+import time
+import logging
+import threading
+
+from .lsl_manager import LSLManager
+from .ingest_service import IngestServiceClient
+from .telemetry import TelemetryRegistry, TelemetryServer
+
+
+MODE_THREAD = 'thread'
+MODE_PROCESS = 'process'
+
+HEALTH_CACHE_TTL = 0.5  # 遥测指标共用健康视图的最长缓存时间（秒）
+
+
+class LSLShardGroup:
+    """多分片采集组"""
+
+    def __init__(self, mode=MODE_THREAD, telemetry_port=9109):
+        """
+        Args:
+            mode: 'thread'（进程内分片）或 'process'（每个分片一个采集进程）
+            telemetry_port: 聚合遥测HTTP端口，None表示不启动
+        """
+        self.logger = logging.getLogger('LSLShardGroup')
+        self.mode = mode
+        self.telemetry_port = telemetry_port
+
+        self.shards = {}        # {name: LSLManager 或 IngestServiceClient}
+        self.shard_options = {}  # {name: start_services参数}
+        self.default_shard = None
+
+        # 健康视图缓存（同一次/metrics抓取的各指标共用一次查询）
+        self.health_lock = threading.Lock()
+        self.cached_health = None
+
+        self.telemetry = TelemetryRegistry()
+        self.telemetry_server = None
+        self._register_gauges()
+
+    def add_shard(self, name, server_ip, client_ip, use_multicast=True, sub_ids=['001', '002'],
+                  cpu_affinity=None, default=False):
+        """添加分片
+
+        Args:
+            name: 分片名称（如"RoomA"），用作LSL流名称前缀
+            server_ip: 该房间Motive服务器IP
+            client_ip: 本机接收该房间数据的网卡IP
+            use_multicast: 是否使用组播
+            sub_ids: 该分片广播的被试ID列表
+            cpu_affinity: 绑定的CPU核心列表，如[2, 3]
+            default: 是否为默认分片（使用LSLManager()单例，流名称不加前缀）
+        """
+        if name in self.shards:
+            self.logger.warning(f"分片已存在: {name}")
+            return self.shards[name]
+
+        if default:
+            if self.default_shard:
+                raise ValueError(f"默认分片已存在: {self.default_shard}")
+            manager = IngestServiceClient() if self.mode == MODE_PROCESS else LSLManager()
+            self.default_shard = name
+        elif self.mode == MODE_PROCESS:
+            manager = IngestServiceClient(shard=name)
+        else:
+            manager = LSLManager(shard=name)
+
+        self.shards[name] = manager
+        self.shard_options[name] = {
+            'server_ip': server_ip,
+            'client_ip': client_ip,
+            'use_multicast': use_multicast,
+            'sub_ids': list(sub_ids),
+            'cpu_affinity': cpu_affinity,
+            'enable_telemetry': False
+        }
+        return manager
+
+    def get_shard(self, name=None):
+        """获取分片管理器（name为None时返回默认分片）"""
+        if name is None:
+            name = self.default_shard
+        return self.shards.get(name)
+
+    def start(self):
+        """启动所有分片（任一分片失败返回False，其余分片继续运行）"""
+        print(f"\n🚀 启动多分片采集组（{self.mode}模式，{len(self.shards)}个分片）...")
+
+        all_ok = True
+        for name, manager in self.shards.items():
+            ok = manager.start_services(**self.shard_options[name])
+            if ok:
+                print(f"  ✅ 分片已启动: {name}")
+            else:
+                print(f"  ❌ 分片启动失败: {name}")
+                all_ok = False
+
+        if self.telemetry_port is not None and not self.telemetry_server:
+            self.telemetry_server = TelemetryServer(self.telemetry, port=self.telemetry_port,
+                                                    snapshot_name='Telemetry_Shards')
+            self.telemetry_server.start()
+
+        return all_ok
+
+    def get_health(self, max_age=0.0):
+        """聚合健康视图
+
+        Args:
+            max_age: 可接受的缓存时长（秒），0表示重新查询各分片
+
+        Returns:
+            dict: {
+                'all_healthy': bool,
+                'shards': {name: {'connected', 'fps', 'last_frame_age', 'shed_level', ...}}
+            }
+        """
+        with self.health_lock:
+            cached = self.cached_health
+            if cached and max_age > 0 and time.time() - cached['time'] <= max_age:
+                return cached
+            self.cached_health = self._query_health()
+            return self.cached_health
+
+    def _query_health(self):
+        """查询各分片统计并生成健康视图"""
+        shards = {}
+        for name, manager in self.shards.items():
+            try:
+                stats = manager.get_stats() or {}
+            except Exception as e:
+                self.logger.error(f"获取分片统计失败 {name}: {e}")
+                stats = {}
+
+            natnet = stats.get('natnet', {})
+            shards[name] = {
+                'connected': bool(natnet.get('connected')),
+                'fps': natnet.get('fps', 0.0),
+                'jitter_ms': natnet.get('jitter_ms'),
+                'last_frame_age': natnet.get('last_frame_age'),
+                'total_frames': natnet.get('total_frames', 0),
+                'shed_level': stats.get('load_shedding', {}).get('level', 0),
+                'marker_queue': stats.get('lsl_marker', {}).get('queue_size', 0),
+                'degraded_mode': stats.get('lsl_marker', {}).get('degraded_mode', True)
+            }
+            if 'ingest_process' in stats:
+                shards[name]['process_alive'] = stats['ingest_process']['alive']
+
+        return {
+            'time': time.time(),
+            'all_healthy': bool(shards) and all(s['connected'] for s in shards.values()),
+            'shards': shards
+        }
+
+    def _register_gauges(self):
+        """注册按分片标签输出的聚合指标"""
+        def by_shard(key):
+            # 无数据的分片（如尚未收到帧时的last_frame_age=None）不输出，避免被误读为0
+            return lambda: {name: float(value[key])
+                            for name, value in self.get_health(max_age=HEALTH_CACHE_TTL)['shards'].items()
+                            if value.get(key) is not None}
+
+        self.telemetry.gauge('shard_connected', by_shard('connected'), '分片NatNet连接状态')
+        self.telemetry.gauge('shard_fps', by_shard('fps'), '分片NatNet帧率(Hz)')
+        self.telemetry.gauge('shard_last_frame_age', by_shard('last_frame_age'), '分片最后一帧年龄(s)')
+        self.telemetry.gauge('shard_shed_level', by_shard('shed_level'), '分片采集回调降级级别')
+
+    def get_stats(self):
+        """各分片完整统计信息"""
+        return {name: manager.get_stats() for name, manager in self.shards.items()}
+
+    def cleanup(self):
+        """停止所有分片"""
+        for name, manager in self.shards.items():
+            try:
+                manager.cleanup()
+            except Exception as e:
+                self.logger.error(f"分片清理错误 {name}: {e}")
+
+        if self.telemetry_server:
+            self.telemetry_server.stop()
+            self.telemetry_server = None
+
+        print("✅ 多分片采集组已停止")
@@ -0,0 +1,330 @@
+"""
+多服务器NatNet聚合器 (V3.4)
+同时连接多台Motive（相邻区域的两套相机系统），将各服务器的帧映射到统一的LSL时钟，
+按时间顺序合并为一条逐被试位置流，重叠区域按质量分数择优
+
+- 时钟映射：每个服务器 offset = min(LSL到达时间 - Motive时间戳)（最小延迟滤波），
+  允许以有限速率向上漂移以跟踪时钟漂移
+- 合并：各服务器帧按映射时间进入小顶堆；水位线 = 各活跃服务器最新映射时间的最小值，
+  水位线之前的帧已全部到达，按容差分组输出融合帧；长时间无数据的服务器不阻塞输出
+- 择优：同一被试取质量分数最高的服务器（可见标记数 / 该被试历史最大标记数）
+- 每个融合帧的工作量为 O(服务器数 × 被试数)，服务器数固定，即 O(被试数)
+
+融合帧通过FrameBus分发；get_latest_skeleton_data()与LSLManager接口一致。
+单机测试：Tools/natnet_replay_server.py 在回环地址上回放两份原始数据包归档
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+from .frame_bus import FrameBus
+from .lsl_manager import NatNetClient, candidate_skeleton_names
+
+try:
+    from pylsl import local_clock
+except ImportError:
+    local_clock = time.time
+
+
+class ServerClockMapper:
+    """Motive服务器时钟 -> LSL时钟"""
+
+    def __init__(self, max_drift=1e-4):
+        """
+        Args:
+            max_drift: 偏移允许的最大上漂速率（秒/秒），用于跟踪时钟漂移
+        """
+        self.max_drift = max_drift
+        self.offset = None
+        self.last_server_time = None
+
+    def update(self, server_time, lsl_time):
+        """加入一次观测，返回映射后的LSL时间"""
+        sample = lsl_time - server_time
+
+        if self.offset is None or sample < self.offset:
+            # 更小的延迟：直接采用
+            self.offset = sample
+        elif self.last_server_time is not None:
+            # 更大的延迟：仅按最大漂移速率缓慢跟随
+            elapsed = max(0.0, server_time - self.last_server_time)
+            self.offset += min(sample - self.offset, self.max_drift * elapsed)
+
+        self.last_server_time = server_time
+        return server_time + self.offset
+
+    def to_lsl(self, server_time):
+        return server_time + (self.offset or 0.0)
+
+
+class NatNetSource:
+    """单个Motive服务器连接"""
+
+    def __init__(self, name, server_ip, client_ip, use_multicast=False,
+                 multicast_address=None, command_port=None, data_port=None):
+        self.name = name
+        self.server_ip = server_ip
+        self.client_ip = client_ip
+        self.use_multicast = use_multicast
+        self.multicast_address = multicast_address
+        self.command_port = command_port
+        self.data_port = data_port
+
+        self.client = None
+        self.clock = ServerClockMapper()
+        self.latest_time = None
+        self.last_arrival = None
+        self.frame_count = 0
+        self.max_marker_count = {}  # {subject: 历史最大标记数}
+
+
+class NatNetAggregator:
+    """多服务器NatNet聚合器"""
+
+    def __init__(self, frame_rate=240.0, stale_timeout=0.1):
+        """
+        Args:
+            frame_rate: 服务器帧率（合并容差 = 半个帧间隔）
+            stale_timeout: 服务器超过该时长（秒）无数据时不再阻塞合并输出
+        """
+        self.logger = logging.getLogger('NatNetAggregator')
+        self.tolerance = 0.5 / frame_rate
+        self.stale_timeout = stale_timeout
+
+        self.sources = {}
+        self.lock = threading.Lock()
+        self.heap = []
+        self.sequence = itertools.count()
+
+        # 融合输出
+        self.frame_bus = FrameBus('NatNetAggregator.FrameBus')
+        self.latest_poses = {}
+        self.fused_frame_count = 0
+        self.late_frame_count = 0
+        self.last_fused_time = None
+        self.running = False
+
+    def add_source(self, name, server_ip, client_ip, use_multicast=False,
+                   multicast_address=None, command_port=None, data_port=None):
+        """添加一个Motive服务器（多台Motive使用组播时需各自配置不同的组播地址/端口）"""
+        self.sources[name] = NatNetSource(name, server_ip, client_ip, use_multicast,
+                                          multicast_address, command_port, data_port)
+        return self.sources[name]
+
+    def start(self, connect_timeout=3.0):
+        """连接所有服务器
+
+        Returns:
+            bool: 是否全部连接成功（部分成功时已连接的服务器继续运行）
+        """
+        if not NatNetClient:
+            self.logger.error("NatNetSDK不可用")
+            return False
+
+        self.frame_bus.start()
+        self.running = True
+
+        for source in self.sources.values():
+            client = NatNetClient()
+            client.set_client_address(source.client_ip)
+            client.set_server_address(source.server_ip)
+            client.set_use_multicast(source.use_multicast)
+            if source.multicast_address:
+                client.multicast_address = source.multicast_address
+            if source.command_port:
+                client.command_port = source.command_port
+            if source.data_port:
+                client.data_port = source.data_port
+            client.set_print_level(0)
+            client.new_frame_with_data_listener = (
+                lambda data_dict, src=source: self._on_source_frame(src, data_dict)
+            )
+
+            if not client.run('d'):
+                print(f"❌ NatNet服务器启动失败: {source.name} ({source.server_ip})")
+                continue
+            source.client = client
+            print(f"🔗 已连接NatNet服务器: {source.name} ({source.server_ip})")
+
+        # 等待各服务器握手完成
+        deadline = time.time() + connect_timeout
+        while time.time() < deadline:
+            if all(s.client and s.client.connected() for s in self.sources.values()):
+                break
+            time.sleep(0.05)
+
+        all_ok = True
+        for source in self.sources.values():
+            if not (source.client and source.client.connected()):
+                print(f"⚠️  NatNet服务器未响应: {source.name}")
+                all_ok = False
+
+        return all_ok
+
+    # ========== 接收线程 ==========
+
+    def _extract_poses(self, source, mocap_data):
+        """从一帧中提取各被试Markerset质心与质量分数"""
+        poses = {}
+        marker_set_data = getattr(mocap_data, 'marker_set_data', None)
+        if not marker_set_data:
+            return poses
+
+        for marker_set in getattr(marker_set_data, 'marker_data_list', []):
+            model_name = getattr(marker_set, 'model_name', None)
+            if isinstance(model_name, bytes):
+                model_name = model_name.decode('utf-8', errors='replace')
+            if not model_name or model_name.lower() == 'all':
+                continue
+
+            sum_x = sum_y = sum_z = 0.0
+            count = 0
+            for pos in getattr(marker_set, 'marker_pos_list', []):
+                # 遮挡标记以全零坐标上报，不参与质心
+                if pos and len(pos) >= 3 and (pos[0] or pos[1] or pos[2]):
+                    sum_x += pos[0]
+                    sum_y += pos[1]
+                    sum_z += pos[2]
+                    count += 1
+
+            if count == 0:
+                continue
+
+            max_count = source.max_marker_count.get(model_name, 0)
+            if count > max_count:
+                max_count = source.max_marker_count[model_name] = count
+
+            poses[model_name] = (sum_x / count, sum_y / count, sum_z / count, count / max_count)
+
+        return poses
+
+    def _on_source_frame(self, source, data_dict):
+        """(各服务器接收线程) 映射时钟、入堆并尝试输出融合帧"""
+        try:
+            arrival = local_clock()
+            poses = self._extract_poses(source, data_dict['mocap_data'])
+
+            with self.lock:
+                frame_time = source.clock.update(data_dict.get('timestamp', 0.0), arrival)
+                source.latest_time = frame_time
+                source.last_arrival = arrival
+                source.frame_count += 1
+
+                if self.last_fused_time is not None and frame_time < self.last_fused_time - self.tolerance:
+                    # 已输出时间之前到达的帧（时钟映射抖动）不再合并
+                    self.late_frame_count += 1
+                    return
+
+                heapq.heappush(self.heap, (frame_time, next(self.sequence), source.name, poses))
+                self._drain(arrival)
+
+        except Exception as e:
+            self.logger.error(f"聚合帧处理错误 {source.name}: {e}")
+
+    def _watermark(self, now):
+        """各活跃服务器最新映射时间的最小值"""
+        watermark = None
+        for source in self.sources.values():
+            if source.latest_time is None or now - source.last_arrival > self.stale_timeout:
+                continue
+            if watermark is None or source.latest_time < watermark:
+                watermark = source.latest_time
+        return watermark
+
+    def _drain(self, now):
+        """(持锁) 输出水位线之前所有完整的融合帧"""
+        watermark = self._watermark(now)
+        if watermark is None:
+            return
+
+        while self.heap and self.heap[0][0] + self.tolerance <= watermark:
+            group_time = self.heap[0][0]
+            fused = {}
+            source_names = []
+
+            while self.heap and self.heap[0][0] - group_time <= self.tolerance:
+                _, _, source_name, poses = heapq.heappop(self.heap)
+                source_names.append(source_name)
+                for subject, (x, y, z, quality) in poses.items():
+                    current = fused.get(subject)
+                    if current is None or quality > current['quality']:
+                        fused[subject] = {
+                            'x': x, 'y': y, 'z': z,
+                            'quality': quality,
+                            'source': source_name
+                        }
+
+            self._emit(group_time, fused, source_names)
+
+    def _emit(self, fused_time, fused, source_names):
+        """(持锁) 更新位置缓存并分发融合帧"""
+        self.fused_frame_count += 1
+        self.last_fused_time = fused_time
+
+        for subject, pose in fused.items():
+            pose['timestamp'] = fused_time
+            self.latest_poses[subject] = pose
+
+        self.frame_bus.publish({
+            'fused_frame_number': self.fused_frame_count,
+            'timestamp': fused_time,
+            'recv_time': time.time(),
+            'sources': source_names,
+            'poses': fused
+        })
+
+    # ========== 读取接口 ==========
+
+    def get_latest_skeleton_data(self, skeleton_name, filtered=False):
+        """获取指定被试的最新融合位置（返回格式与LSLManager一致，融合位置不做滤波）"""
+        for name in candidate_skeleton_names(skeleton_name):
+            pose = self.latest_poses.get(name)
+            if pose:
+                return {
+                    'x': pose['x'],
+                    'y': pose['y'],
+                    'z': pose['z'],
+                    'timestamp': pose['timestamp'],
+                    'valid': True,
+                    'filtered': False,
+                    'quality': pose['quality'],
+                    'source': pose['source']
+                }
+        return None
+
+    def get_stats(self):
+        """获取聚合统计信息"""
+        now = local_clock()
+        return {
+            'fused_frames': self.fused_frame_count,
+            'late_frames': self.late_frame_count,
+            'pending': len(self.heap),
+            'subjects': len(self.latest_poses),
+            'sources': {
+                name: {
+                    'connected': bool(source.client and source.client.connected()),
+                    'frames': source.frame_count,
+                    'clock_offset': source.clock.offset,
+                    'last_frame_age': (now - source.last_arrival) if source.last_arrival else None
+                }
+                for name, source in self.sources.items()
+            },
+            'frame_bus': self.frame_bus.get_stats()
+        }
+
+    def cleanup(self):
+        """断开所有服务器"""
+        self.running = False
+        for source in self.sources.values():
+            if source.client:
+                try:
+                    source.client.shutdown()
+                except Exception as e:
+                    self.logger.error(f"NatNet服务器断开错误 {source.name}: {e}")
+                source.client = None
+
+        self.frame_bus.stop()
+        print(f"✅ NatNet聚合器已停止（融合帧: {self.fused_frame_count}）")
@@ -0,0 +1,73 @@
+"""
+NatNet原始数据包归档 (V3.4)
+按接收顺序保存未解码的NatNet数据包，写入开销远低于逐字段CSV格式化
+
+文件格式（小端）：
+- 文件头(16字节): magic 'NNRAW1\\0\\0' | NatNet主版本(uint16) | 次版本(uint16) | 保留(4字节)
+- 记录: 接收时间戳(float64, LSL时钟) | 帧号(uint32) | 包长度(uint32) | 原始数据包
+"""
+
+import struct
+import logging
+
+
+MAGIC = b'NNRAW1\x00\x00'
+FILE_HEADER = struct.Struct('<8sHH4x')
+RECORD_HEADER = struct.Struct('<dII')
+
+
+class RawPacketWriter:
+    """NatNet原始数据包写入器"""
+
+    def __init__(self, path, major=0, minor=0, buffering=1024 * 1024):
+        self.logger = logging.getLogger('RawPacketWriter')
+        self.path = path
+        self.file = open(path, 'wb', buffering=buffering)
+        self.file.write(FILE_HEADER.pack(MAGIC, major, minor))
+        self.packet_count = 0
+        self.byte_count = 0
+
+    def write(self, timestamp, frame_number, packet):
+        """写入一个数据包"""
+        self.file.write(RECORD_HEADER.pack(timestamp, frame_number, len(packet)))
+        self.file.write(packet)
+        self.packet_count += 1
+        self.byte_count += RECORD_HEADER.size + len(packet)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.flush()
+            self.file.close()
+            self.file = None
+
+
+class RawPacketReader:
+    """NatNet原始数据包读取器（可迭代）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, self.major, self.minor = FILE_HEADER.unpack(self.file.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            self.file.close()
+            raise ValueError(f"不是NatNet原始数据包归档: {path}")
+
+    def __iter__(self):
+        """逐个返回 (timestamp, frame_number, packet)"""
+        while True:
+            header = self.file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, frame_number, length = RECORD_HEADER.unpack(header)
+            packet = self.file.read(length)
+            if len(packet) < length:
+                return
+            yield timestamp, frame_number, packet
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
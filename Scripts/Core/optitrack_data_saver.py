@@ -15,13 +15,19 @@ import logging
 import threading
 from collections import deque
 
+from .natnet_capture import RawPacketWriter
+from .quality_monitor import index_labeled_markers, marker_position_key
+
 
 class OptiTrackDataSaver:
     """OptiTrack数据保存器"""
     
-    def __init__(self):
+    def __init__(self, shard=None):
         self.logger = logging.getLogger('OptiTrackDataSaver')
         
+        # 分片名称（多房间并行采集时写入文件名，避免同一Dyad目录下重名）
+        self.shard = shard
+        
         # 会话信息
         self.dyad_id = None
         self.session_id = None
@@ -37,6 +43,13 @@ class OptiTrackDataSaver:
         self.skeleton_writer = None
         self.rigidbody_writer = None
         
+        # 原始数据包归档与负载降级记录（负载过高时启用，按需创建）
+        self.file_timestamp = None
+        self.raw_writer = None
+        self.natnet_version = (0, 0)
+        self.shedding_file = None
+        self.shedding_writer = None
+        
         # 数据缓冲（批量写入提高性能）
         self.marker_buffer = deque(maxlen=1000)
         self.skeleton_buffer = deque(maxlen=1000)
@@ -82,6 +95,9 @@ class OptiTrackDataSaver:
         try:
             # 生成带时间戳的文件名
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            if self.shard:
+                timestamp = f"{self.shard}_{timestamp}"
+            self.file_timestamp = timestamp
             
             # Optitrack_Marker.csv
             marker_path = self.output_dir / f'Optitrack_Marker_{timestamp}.csv'
@@ -141,20 +157,26 @@ class OptiTrackDataSaver:
         except ImportError:
             return time.time()
     
-    def save_marker_data(self, frame_number, marker_set_list):
+    def save_marker_data(self, frame_number, marker_set_list, labeled_marker_list=None, timestamp=None):
         """保存Markerset数据（marker_set_data，包含命名的markerset如Sub001）
         
         Args:
             frame_number: 帧号
             marker_set_list: Markerset列表，每个包含model_name和marker_data_list
+            labeled_marker_list: LabeledMarker列表（按坐标匹配填写Residual/Params，可选）
+            timestamp: 帧接收时刻（LSL时钟），None表示当前时刻
         """
         if not self.is_active:
             return
         
         try:
-            timestamp = self._get_lsl_timestamp()
+            if timestamp is None:
+                timestamp = self._get_lsl_timestamp()
+            labeled = index_labeled_markers(labeled_marker_list)
             
             with self.data_lock:
+                if not self.is_active:  # 已被close()关闭
+                    return
                 for marker_set in marker_set_list:
                     # 获取Markerset名称（如Sub001）
                     model_name = getattr(marker_set, 'model_name', 'Unknown')
@@ -169,6 +191,8 @@ class OptiTrackDataSaver:
                         if not (pos and len(pos) >= 3):
                             continue
                         
+                        residual, params = labeled.get(marker_position_key(pos), (0.0, 0))
+                        
                         # 写入CSV（使用model_name作为MarkerName）
                         self.marker_writer.writerow([
                             timestamp,           # Timestamp
@@ -178,8 +202,8 @@ class OptiTrackDataSaver:
                             pos[0],             # PosX
                             pos[1],             # PosY  
                             pos[2],             # PosZ
-                            0.0,                # Residual
-                            0                   # Params
+                            residual,           # Residual
+                            params              # Params
                         ])
                         
                         self.total_marker_count += 1
@@ -191,20 +215,24 @@ class OptiTrackDataSaver:
         except Exception as e:
             self.logger.error(f"保存标记数据错误: {e}")
     
-    def save_skeleton_data(self, frame_number, skeleton_list):
+    def save_skeleton_data(self, frame_number, skeleton_list, timestamp=None):
         """保存骨骼数据
         
         Args:
             frame_number: 帧号
             skeleton_list: 骨骼列表，每个骨骼包含关节信息
+            timestamp: 帧接收时刻（LSL时钟），None表示当前时刻
         """
         if not self.is_active:
             return
         
         try:
-            timestamp = self._get_lsl_timestamp()
+            if timestamp is None:
+                timestamp = self._get_lsl_timestamp()
             
             with self.data_lock:
+                if not self.is_active:  # 已被close()关闭
+                    return
                 for skeleton in skeleton_list:
                     skeleton_id = getattr(skeleton, 'id_num', 0)
                     skeleton_name = getattr(skeleton, 'name', f'Skeleton_{skeleton_id}')
@@ -249,20 +277,24 @@ class OptiTrackDataSaver:
         except Exception as e:
             self.logger.error(f"保存骨骼数据错误: {e}")
     
-    def save_rigidbody_data(self, frame_number, rigidbody_list):
+    def save_rigidbody_data(self, frame_number, rigidbody_list, timestamp=None):
         """保存刚体数据
         
         Args:
             frame_number: 帧号
             rigidbody_list: 刚体列表
+            timestamp: 帧接收时刻（LSL时钟），None表示当前时刻
         """
         if not self.is_active:
             return
         
         try:
-            timestamp = self._get_lsl_timestamp()
+            if timestamp is None:
+                timestamp = self._get_lsl_timestamp()
             
             with self.data_lock:
+                if not self.is_active:  # 已被close()关闭
+                    return
                 for rigidbody in rigidbody_list:
                     rb_id = getattr(rigidbody, 'id_num', 0)
                     rb_name = getattr(rigidbody, 'name', f'RigidBody_{rb_id}')
@@ -299,12 +331,73 @@ class OptiTrackDataSaver:
         except Exception as e:
             self.logger.error(f"保存刚体数据错误: {e}")
     
+    def save_raw_packet(self, frame_number, packet, timestamp=None):
+        """保存未解码的NatNet数据包（负载降级时替代CSV保存）
+        
+        Args:
+            frame_number: 帧号
+            packet: 原始数据包bytes
+            timestamp: 数据包接收时刻（LSL时钟），None表示当前时刻
+        """
+        if not self.is_active:
+            return
+        
+        try:
+            if timestamp is None:
+                timestamp = self._get_lsl_timestamp()
+            
+            with self.data_lock:
+                if not self.is_active:  # 已被close()关闭
+                    return
+                if not self.raw_writer:
+                    raw_path = self.output_dir / f'Optitrack_RawPackets_{self.file_timestamp}.natnet'
+                    self.raw_writer = RawPacketWriter(raw_path, *self.natnet_version)
+                    print(f"💾 原始数据包归档已启用: {raw_path.name}")
+                
+                self.raw_writer.write(timestamp, frame_number, packet)
+                
+        except Exception as e:
+            self.logger.error(f"保存原始数据包错误: {e}")
+    
+    def log_load_shedding(self, event):
+        """记录一次负载降级切换（Optitrack_LoadShedding.csv）
+        
+        Args:
+            event: IngestBudgetController生成的切换事件
+        """
+        if not self.is_active:
+            return
+        
+        try:
+            with self.data_lock:
+                if not self.is_active:  # 已被close()关闭
+                    return
+                if not self.shedding_writer:
+                    shedding_path = self.output_dir / f'Optitrack_LoadShedding_{self.file_timestamp}.csv'
+                    self.shedding_file = open(shedding_path, 'w', newline='', encoding='utf-8')
+                    self.shedding_writer = csv.writer(self.shedding_file)
+                    self.shedding_writer.writerow([
+                        'Timestamp', 'WallTime', 'FrameNumber', 'FromLevel', 'ToLevel',
+                        'ToName', 'MeanCallbackMs', 'BudgetMs', 'Reason'
+                    ])
+                
+                self.shedding_writer.writerow([
+                    event['timestamp'], event['wall_time'], event['frame_number'],
+                    event['from_level'], event['to_level'], event['to_name'],
+                    f"{event['mean_duration_ms']:.3f}", f"{event['budget_ms']:.3f}", event['reason']
+                ])
+                self.shedding_file.flush()
+                
+        except Exception as e:
+            self.logger.error(f"记录负载降级错误: {e}")
+    
     def get_statistics(self):
         """获取保存统计信息"""
         return {
             'marker_count': self.total_marker_count,
             'skeleton_count': self.total_skeleton_count,
             'rigidbody_count': self.total_rigidbody_count,
+            'raw_packet_count': self.raw_writer.packet_count if self.raw_writer else 0,
             'is_active': self.is_active,
             'output_dir': str(self.output_dir) if self.output_dir else None
         }
@@ -312,30 +405,44 @@ class OptiTrackDataSaver:
     def close(self):
         """关闭数据保存器并清理资源"""
         try:
-            self.is_active = False
-            
-            # 关闭文件
-            if self.marker_file:
-                self.marker_file.flush()
-                self.marker_file.close()
-                self.marker_file = None
-            
-            if self.skeleton_file:
-                self.skeleton_file.flush()
-                self.skeleton_file.close()
-                self.skeleton_file = None
-            
-            if self.rigidbody_file:
-                self.rigidbody_file.flush()
-                self.rigidbody_file.close()
-                self.rigidbody_file = None
-            
-            # 输出统计信息
-            stats = self.get_statistics()
+            # 持有写锁关闭，避免与保存线程中正在进行的写入交错
+            with self.data_lock:
+                self.is_active = False
+                
+                # 关闭文件
+                if self.marker_file:
+                    self.marker_file.flush()
+                    self.marker_file.close()
+                    self.marker_file = None
+                
+                if self.skeleton_file:
+                    self.skeleton_file.flush()
+                    self.skeleton_file.close()
+                    self.skeleton_file = None
+                
+                if self.rigidbody_file:
+                    self.rigidbody_file.flush()
+                    self.rigidbody_file.close()
+                    self.rigidbody_file = None
+                
+                # 输出统计信息（关闭归档文件前读取包计数）
+                stats = self.get_statistics()
+                
+                if self.raw_writer:
+                    self.raw_writer.close()
+                    self.raw_writer = None
+                
+                if self.shedding_file:
+                    self.shedding_file.close()
+                    self.shedding_file = None
+                    self.shedding_writer = None
+
             print(f"\n📊 OptiTrack数据保存统计:")
             print(f"   标记数据: {stats['marker_count']} 条")
             print(f"   骨骼数据: {stats['skeleton_count']} 条")
             print(f"   刚体数据: {stats['rigidbody_count']} 条")
+            if stats['raw_packet_count']:
+                print(f"   原始数据包: {stats['raw_packet_count']} 个（负载降级期间）")
             print(f"   保存路径: {stats['output_dir']}")
             print("✅ OptiTrack数据保存器已关闭")
             
@@ -354,8 +461,8 @@ Optitrack_Marker.csv:
 - MarkerID: 标记点ID
 - MarkerName: 标记点名称
 - PosX/Y/Z: 标记点3D位置坐标（米）
-- Residual: 标记点重建误差（像素）
-- Params: 标记点参数标志
+- Residual: 标记点重建误差（来自LabeledMarker，按坐标匹配；无匹配时为0）
+- Params: 标记点参数标志（0x01遮挡 0x02点云解算 0x04模型解算）
 
 Optitrack_Skeleton.csv:
 - Timestamp: LSL时间戳
@@ -377,4 +484,15 @@ Optitrack_RigidBody.csv:
 - RotX/Y/Z/W: 刚体旋转四元数
 - MeanError: 刚体重建均方误差
 - Tracked: 是否被成功跟踪
+
+Optitrack_RawPackets.natnet（仅在负载降级期间生成，格式见natnet_capture.py）:
+- 降级期间的帧以未解码NatNet数据包保存，不再写入上述CSV，可离线解码补全
+
+Optitrack_LoadShedding.csv（仅在发生负载降级时生成）:
+- Timestamp: 切换时刻的LSL时间戳
+- WallTime: 切换时刻的系统时间
+- FrameNumber: 切换时的帧号
+- FromLevel/ToLevel: 切换前后的降级级别（0正常 1关闭调试 2原始包归档 3骨骼抽帧）
+- MeanCallbackMs/BudgetMs: 回调平均耗时与预算（毫秒）
+- Reason: 切换原因
 """
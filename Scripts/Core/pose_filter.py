@@ -0,0 +1,184 @@
+"""
+位置滤波器组 (V3.4)
+每个NatNet帧对所有被试的Markerset质心做一次向量化滤波，抑制标记闪烁引起的抖动
+
+- OneEuroFilterBank: One-Euro自适应低通（Casiez et al., 2012）。静止时截止频率低（抖动小），
+  快速移动时截止频率随速度升高（延迟小）；以被试速度模长调节截止频率，三个坐标轴各向同性
+- KalmanFilterBank: 匀速模型卡尔曼滤波（每轴[位置, 速度]两状态，闭式2×2更新）
+- 帧间隔超过max_gap（如被试离开追踪区后重新出现）时该被试状态重置，不会从旧位置“滑”过来
+"""
+
+import numpy as np
+
+
+FILTER_ONE_EURO = 'one_euro'
+FILTER_KALMAN = 'kalman'
+
+
+class _FilterBank:
+    """按被试名称分配行的向量化状态容器"""
+
+    def __init__(self, max_gap=0.25, capacity=8):
+        self.max_gap = max_gap
+        self.index = {}
+        self.last_time = np.full(capacity, np.nan)
+        self._init_state(capacity)
+
+    def _init_state(self, capacity):
+        raise NotImplementedError
+
+    def _grow_state(self, grow):
+        raise NotImplementedError
+
+    def _rows(self, names):
+        """获取名称对应的行号（新被试分配新行）"""
+        rows = []
+        for name in names:
+            row = self.index.get(name)
+            if row is None:
+                row = len(self.index)
+                if row >= len(self.last_time):
+                    grow = len(self.last_time)
+                    self.last_time = np.concatenate([self.last_time, np.full(grow, np.nan)])
+                    self._grow_state(grow)
+                self.index[name] = row
+            rows.append(row)
+        return np.asarray(rows, dtype=np.intp)
+
+    def _intervals(self, rows, timestamp):
+        """帧间隔与需要重置的行（首次出现或间隔过大）"""
+        dt = timestamp - self.last_time[rows]
+        reset = ~np.isfinite(dt) | (dt <= 0) | (dt > self.max_gap)
+        self.last_time[rows] = timestamp
+        return np.where(reset, 1.0, dt), reset
+
+
+class OneEuroFilterBank(_FilterBank):
+    """向量化One-Euro滤波器组"""
+
+    def __init__(self, min_cutoff=1.0, beta=20.0, d_cutoff=1.0, max_gap=0.25):
+        """
+        Args:
+            min_cutoff: 静止时的截止频率（Hz），越小越平滑
+            beta: 速度系数（每米/秒提高的截止频率），越大快速移动时延迟越小
+            d_cutoff: 速度估计的截止频率（Hz）
+            max_gap: 超过该帧间隔（秒）时重置状态
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        super().__init__(max_gap)
+
+    def _init_state(self, capacity):
+        self.x_hat = np.zeros((capacity, 3))
+        self.dx_hat = np.zeros((capacity, 3))
+
+    def _grow_state(self, grow):
+        self.x_hat = np.vstack([self.x_hat, np.zeros((grow, 3))])
+        self.dx_hat = np.vstack([self.dx_hat, np.zeros((grow, 3))])
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2.0 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, names, positions, timestamp):
+        """滤波一帧
+
+        Args:
+            names: 被试名称列表
+            positions: (N, 3) 原始位置
+            timestamp: 帧时间戳（秒）
+        Returns:
+            (N, 3) 滤波后位置
+        """
+        rows = self._rows(names)
+        x = np.asarray(positions, dtype=np.float64)
+        dt, reset = self._intervals(rows, timestamp)
+        dt = dt[:, None]
+
+        x_prev = self.x_hat[rows]
+        dx = (x - x_prev) / dt
+        dx_hat = self.dx_hat[rows] + self._alpha(self.d_cutoff, dt) * (dx - self.dx_hat[rows])
+
+        cutoff = self.min_cutoff + self.beta * np.linalg.norm(dx_hat, axis=1, keepdims=True)
+        x_hat = x_prev + self._alpha(cutoff, dt) * (x - x_prev)
+
+        # 重置的被试直接采用当前测量
+        x_hat[reset] = x[reset]
+        dx_hat[reset] = 0.0
+
+        self.x_hat[rows] = x_hat
+        self.dx_hat[rows] = dx_hat
+        return x_hat
+
+
+class KalmanFilterBank(_FilterBank):
+    """向量化匀速模型卡尔曼滤波器组"""
+
+    def __init__(self, process_noise=2.0, measurement_noise=0.002, max_gap=0.25):
+        """
+        Args:
+            process_noise: 加速度噪声标准差（米/秒²）
+            measurement_noise: 位置测量噪声标准差（米）
+            max_gap: 超过该帧间隔（秒）时重置状态
+        """
+        self.q = process_noise ** 2
+        self.r = measurement_noise ** 2
+        super().__init__(max_gap)
+
+    def _init_state(self, capacity):
+        self.p = np.zeros((capacity, 3))     # 位置
+        self.v = np.zeros((capacity, 3))     # 速度
+        self.cov = np.zeros((capacity, 3, 3))  # 每轴协方差 [P_pp, P_pv, P_vv]
+
+    def _grow_state(self, grow):
+        self.p = np.vstack([self.p, np.zeros((grow, 3))])
+        self.v = np.vstack([self.v, np.zeros((grow, 3))])
+        self.cov = np.concatenate([self.cov, np.zeros((grow, 3, 3))])
+
+    def update(self, names, positions, timestamp):
+        """滤波一帧（参数与返回值同OneEuroFilterBank.update）"""
+        rows = self._rows(names)
+        z = np.asarray(positions, dtype=np.float64)
+        dt, reset = self._intervals(rows, timestamp)
+        dt = dt[:, None]
+
+        p, v = self.p[rows], self.v[rows]
+        pp, pv, vv = self.cov[rows, :, 0], self.cov[rows, :, 1], self.cov[rows, :, 2]
+
+        # 预测：x = F x，P = F P F' + Q（离散白噪声加速度模型）
+        p = p + v * dt
+        dt2 = dt * dt
+        pp = pp + 2.0 * dt * pv + dt2 * vv + self.q * dt2 * dt2 / 4.0
+        pv = pv + dt * vv + self.q * dt2 * dt / 2.0
+        vv = vv + self.q * dt2
+
+        # 更新：仅观测位置
+        s = pp + self.r
+        k_p = pp / s
+        k_v = pv / s
+        innovation = z - p
+        p = p + k_p * innovation
+        v = v + k_v * innovation
+        pp, pv, vv = (1.0 - k_p) * pp, (1.0 - k_p) * pv, vv - k_v * pv
+
+        # 重置的被试：位置取测量值，速度未知
+        p[reset] = z[reset]
+        v[reset] = 0.0
+        pp[reset] = self.r
+        pv[reset] = 0.0
+        vv[reset] = 1.0
+
+        self.p[rows], self.v[rows] = p, v
+        self.cov[rows, :, 0], self.cov[rows, :, 1], self.cov[rows, :, 2] = pp, pv, vv
+        return p
+
+
+def create_filter_bank(filter_type=FILTER_ONE_EURO, **params):
+    """按类型创建滤波器组"""
+    if filter_type == FILTER_ONE_EURO:
+        return OneEuroFilterBank(**params)
+    if filter_type == FILTER_KALMAN:
+        return KalmanFilterBank(**params)
+    raise ValueError(f"未知滤波器类型: {filter_type}")
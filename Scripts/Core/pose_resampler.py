@@ -0,0 +1,185 @@
+"""
+等间隔位置重采样器 (V3.4)
+将不规则到达的NatNet位置在精确的等间隔网格（默认120Hz）上插值输出到LSL，
+流声明真实的nominal_srate，下游（XDF、fNIRS/EEG工具箱）可走规则采样的快速路径
+
+- 网格时间戳 t_k = t_0 + k / rate（LSL时钟），样本以显式时间戳推送
+- 输出延迟delay：等待网格点之后的帧到达再插值，延迟内的抖动不影响输出
+- 插值：网格点前后两帧间隔不超过max_gap时线性插值，Gap通道=0；
+  否则保持最后一帧位置，Gap通道=1（包括NatNet中断期间，网格输出不中断）
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+
+try:
+    from pylsl import StreamInfo, StreamOutlet, local_clock
+except ImportError:
+    StreamInfo = StreamOutlet = None
+    local_clock = time.time
+
+
+class PoseResampler:
+    """等间隔位置重采样器（每个被试一个输出流）"""
+
+    def __init__(self, rate=120.0, delay=None, max_gap=None, history_size=64):
+        """
+        Args:
+            rate: 输出采样率（Hz）
+            delay: 输出相对实时的延迟（秒），默认2个采样间隔
+            max_gap: 允许插值的最大帧间隔（秒），默认2.5个采样间隔
+            history_size: 每个被试保留的历史帧数
+        """
+        self.logger = logging.getLogger('PoseResampler')
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.delay = delay if delay is not None else 2.0 * self.period
+        self.max_gap = max_gap if max_gap is not None else 2.5 * self.period
+
+        self.history_size = history_size
+        self.histories = {}  # {subject: deque[(lsl_time, x, y, z)]}
+        self.outlets = {}    # {subject: StreamOutlet}
+        self.lock = threading.Lock()
+
+        self.grid_start = None
+        self.tick_index = 0
+        self.thread = None
+        self.running = False
+
+        # 统计
+        self.sample_count = 0
+        self.gap_count = 0
+
+    def create_outlets(self, sub_ids, stream_prefix=""):
+        """为每个被试创建等间隔位置流（4通道：X, Y, Z, Gap）"""
+        if not StreamInfo or not StreamOutlet:
+            self.logger.error("LSL不可用，无法创建重采样位置流")
+            return False
+
+        rate_label = f"{self.rate:g}Hz"
+        for sub_id in sub_ids:
+            subject = f"Sub{sub_id}"
+            stream_name = f"{stream_prefix}{subject}_Position_{rate_label}"
+
+            info = StreamInfo(
+                name=stream_name,
+                type='MoCap',
+                channel_count=4,
+                nominal_srate=self.rate,  # 规则采样
+                channel_format='float32',
+                source_id=f'{stream_prefix}optitrack_sub{sub_id}_{rate_label.lower()}'
+            )
+
+            channels = info.desc().append_child("channels")
+            for axis in ['X', 'Y', 'Z']:
+                ch = channels.append_child("channel")
+                ch.append_child_value("label", f"Position_{axis}")
+                ch.append_child_value("unit", "meters")
+                ch.append_child_value("type", "Position")
+                ch.append_child_value("coordinate_system", "Motive_World")
+            ch = channels.append_child("channel")
+            ch.append_child_value("label", "Gap")
+            ch.append_child_value("unit", "")
+            ch.append_child_value("type", "Flag")
+
+            resampling = info.desc().append_child("resampling")
+            resampling.append_child_value("method", "linear")
+            resampling.append_child_value("delay_seconds", f"{self.delay:.6f}")
+            resampling.append_child_value("max_gap_seconds", f"{self.max_gap:.6f}")
+
+            acquisition = info.desc().append_child("acquisition")
+            acquisition.append_child_value("manufacturer", "OptiTrack")
+            acquisition.append_child_value("system", "Motive")
+            acquisition.append_child_value("protocol", "NatNet")
+            acquisition.append_child_value("subject_id", subject)
+
+            self.outlets[subject] = StreamOutlet(info)
+            self.histories[subject] = deque(maxlen=self.history_size)
+            print(f"  ✅ 已创建: {stream_name} (4通道: X, Y, Z, Gap, {self.rate:g}Hz)")
+
+        return True
+
+    def add_sample(self, subject, x, y, z, lsl_time=None):
+        """(接收线程) 加入一帧位置"""
+        history = self.histories.get(subject)
+        if history is None:
+            return
+        with self.lock:
+            history.append((lsl_time if lsl_time is not None else local_clock(), x, y, z))
+
+    def _interpolate(self, history, t):
+        """在网格点t处插值，返回 (x, y, z, gap) 或 None（尚无数据）"""
+        after = None
+        for sample in reversed(history):
+            if sample[0] <= t:
+                if after is not None and after[0] - sample[0] <= self.max_gap:
+                    w = (t - sample[0]) / (after[0] - sample[0]) if after[0] > sample[0] else 0.0
+                    return (
+                        sample[1] + w * (after[1] - sample[1]),
+                        sample[2] + w * (after[2] - sample[2]),
+                        sample[3] + w * (after[3] - sample[3]),
+                        0.0
+                    )
+                # 网格点之后尚无帧或间隔过大：保持最后位置
+                return sample[1], sample[2], sample[3], 1.0
+            after = sample
+
+        return None
+
+    def _emit_tick(self, t):
+        """输出一个网格点的所有被试样本"""
+        with self.lock:
+            samples = {subject: self._interpolate(history, t) for subject, history in self.histories.items()}
+
+        for subject, sample in samples.items():
+            if sample is None:
+                continue
+            try:
+                self.outlets[subject].push_sample(list(sample), t)
+                self.sample_count += 1
+                if sample[3]:
+                    self.gap_count += 1
+            except Exception as e:
+                self.logger.warning(f"重采样位置推送失败 {subject}: {e}")
+
+    def _run(self):
+        """(独立线程) 按网格时间输出"""
+        self.grid_start = local_clock()
+        self.tick_index = 0
+
+        while self.running:
+            tick_time = self.grid_start + self.tick_index * self.period
+            wait = tick_time + self.delay - local_clock()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+
+            # 追赶所有已到期的网格点（休眠超时后不丢点）
+            self._emit_tick(tick_time)
+            self.tick_index += 1
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='PoseResampler', daemon=True)
+        self.thread.start()
+        print(f"✅ 等间隔重采样已启动: {self.rate:g}Hz（延迟 {self.delay * 1000.0:.1f}ms）")
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        self.outlets.clear()
+
+    def get_stats(self):
+        return {
+            'rate': self.rate,
+            'ticks': self.tick_index,
+            'samples': self.sample_count,
+            'gap_samples': self.gap_count,
+            'gap_ratio': self.gap_count / self.sample_count if self.sample_count else 0.0
+        }
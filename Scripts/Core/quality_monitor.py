@@ -0,0 +1,262 @@
+"""
+标记质量监测器 (V3.4)
+逐帧增量统计每个被试Markerset的追踪质量，试次中质量下降时立即告警，
+而不是在实验结束后从Optitrack_Marker.csv中才发现
+
+- 全标记帧比例：本帧可见标记数 == Markerset标记总数 的帧占比
+- 逐标记遮挡率：每个标记点被遮挡（全零坐标或labeled marker遮挡标志）的帧占比
+- 质心离散度：可见标记到质心的均方根距离（米），标记错配/漂移时会突变
+- 残差：与labeled marker按坐标匹配后的重建残差均值
+- 每帧每个被试的更新为 O(标记数)，与运行时长无关；滚动统计复用telemetry.RollingStat，
+  另有按试次累计的计数（set_trial_context时清零）
+"""
+
+import threading
+import time
+import logging
+
+from .telemetry import RollingStat
+
+try:
+    from pylsl import local_clock
+except ImportError:
+    local_clock = time.time
+
+
+# ========== 质量阈值常量 ==========
+WARN_ALL_MARKERS_FRACTION = 0.8   # 全标记帧比例低于该值时告警
+REARM_ALL_MARKERS_FRACTION = 0.85  # 恢复到该值以上后重新允许告警（滞回）
+WARN_MIN_FRAMES = 120              # 至少累计的帧数（避免刚出现时误报）
+
+# LabeledMarker.param 标志位（NatNet SDK）
+MARKER_PARAM_OCCLUDED = 0x01
+
+
+def marker_position_key(pos):
+    """坐标匹配键（Markerset与LabeledMarker中同一标记的坐标完全一致）"""
+    return (round(pos[0], 5), round(pos[1], 5), round(pos[2], 5))
+
+
+def index_labeled_markers(labeled_marker_list):
+    """将labeled marker按坐标建立索引 {坐标键: (residual, param)}"""
+    index = {}
+    for marker in labeled_marker_list or []:
+        pos = getattr(marker, 'pos', None)
+        if pos and len(pos) >= 3 and (pos[0] or pos[1] or pos[2]):
+            index[marker_position_key(pos)] = (getattr(marker, 'residual', 0.0) or 0.0,
+                                              getattr(marker, 'param', 0) or 0)
+    return index
+
+
+class SubjectQuality:
+    """单个被试的质量统计"""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.marker_count = 0
+        self.all_markers = RollingStat(alpha)   # 0/1序列的滑动均值即全标记帧比例
+        self.visible_ratio = RollingStat(alpha)
+        self.spread = RollingStat(alpha)
+        self.residual = RollingStat(alpha)
+        self.occlusion = []                     # 每个标记一个RollingStat
+
+        # 当前试次累计
+        self.trial_frames = 0
+        self.trial_full_frames = 0
+        self.trial_occluded = []
+
+        self.warning_active = False
+
+    def _ensure_markers(self, count):
+        if count > self.marker_count:
+            grow = count - self.marker_count
+            self.occlusion.extend(RollingStat(self.alpha) for _ in range(grow))
+            self.trial_occluded.extend([0] * grow)
+            self.marker_count = count
+
+    def reset_trial(self):
+        self.trial_frames = 0
+        self.trial_full_frames = 0
+        self.trial_occluded = [0] * self.marker_count
+        self.warning_active = False
+
+    def snapshot(self):
+        trial_frames = self.trial_frames
+        return {
+            'marker_count': self.marker_count,
+            'frames': self.all_markers.count,
+            'all_markers_fraction': self.all_markers.mean,
+            'visible_ratio': self.visible_ratio.mean,
+            'centroid_spread': self.spread.mean,
+            'centroid_spread_max': self.spread.max,
+            'residual': self.residual.mean,
+            'marker_occlusion': [stat.mean for stat in self.occlusion],
+            'trial_frames': trial_frames,
+            'trial_all_markers_fraction': (self.trial_full_frames / trial_frames) if trial_frames else None,
+            'trial_marker_occlusion': [count / trial_frames for count in self.trial_occluded] if trial_frames else [],
+            'warning_active': self.warning_active
+        }
+
+
+class MarkerQualityMonitor:
+    """逐被试标记质量监测"""
+
+    def __init__(self, alpha=0.02, warn_fraction=WARN_ALL_MARKERS_FRACTION,
+                 rearm_fraction=REARM_ALL_MARKERS_FRACTION, min_frames=WARN_MIN_FRAMES,
+                 on_warning=None):
+        """
+        Args:
+            alpha: 滚动统计平滑系数（0.02约等于最近100帧）
+            warn_fraction: 试次中全标记帧比例低于该值时告警
+            rearm_fraction: 恢复到该值以上后重新允许告警
+            min_frames: 告警前至少累计的帧数
+            on_warning: 告警回调 fn(warning)，在帧处理线程中调用
+        """
+        self.logger = logging.getLogger('MarkerQualityMonitor')
+        self.alpha = alpha
+        self.warn_fraction = warn_fraction
+        self.rearm_fraction = rearm_fraction
+        self.min_frames = min_frames
+        self.on_warning = on_warning
+
+        self.subjects = {}
+        self.warnings = []
+        self.trial = None
+        self.phase = None
+        self.lock = threading.Lock()
+
+    def set_trial_context(self, trial=None, phase=None):
+        """设置当前试次（新试次开始时清零试次累计；trial为None表示试次外，不告警，保留上一试次累计）"""
+        with self.lock:
+            self.trial = trial
+            self.phase = phase
+            if trial is not None:
+                for quality in self.subjects.values():
+                    quality.reset_trial()
+
+    def update(self, marker_set_list, labeled_marker_list=None, frame_number=None):
+        """加入一帧
+
+        Args:
+            marker_set_list: NatNet marker_data_list
+            labeled_marker_list: NatNet labeled_marker_list（用于残差与遮挡标志，可选）
+            frame_number: 帧号（告警记录用）
+        """
+        labeled = index_labeled_markers(labeled_marker_list)
+
+        with self.lock:
+            for marker_set in marker_set_list or []:
+                model_name = getattr(marker_set, 'model_name', None)
+                if isinstance(model_name, bytes):
+                    model_name = model_name.decode('utf-8', errors='replace')
+                if not model_name or model_name.lower() == 'all':
+                    continue
+
+                positions = getattr(marker_set, 'marker_pos_list', [])
+                if not positions:
+                    continue
+
+                quality = self.subjects.get(model_name)
+                if quality is None:
+                    quality = self.subjects[model_name] = SubjectQuality(self.alpha)
+                quality._ensure_markers(len(positions))
+
+                self._update_subject(model_name, quality, positions, labeled, frame_number)
+
+    def _update_subject(self, model_name, quality, positions, labeled, frame_number):
+        """(持锁) 更新单个被试"""
+        visible = []
+        residual_sum = 0.0
+        residual_count = 0
+
+        for i, pos in enumerate(positions):
+            occluded = not (pos and len(pos) >= 3 and (pos[0] or pos[1] or pos[2]))
+            if not occluded:
+                match = labeled.get(marker_position_key(pos))
+                if match is not None:
+                    residual, param = match
+                    if param & MARKER_PARAM_OCCLUDED:
+                        occluded = True
+                    else:
+                        residual_sum += residual
+                        residual_count += 1
+
+            quality.occlusion[i].update(1.0 if occluded else 0.0)
+            if occluded:
+                quality.trial_occluded[i] += 1
+            else:
+                visible.append(pos)
+
+        full = len(visible) == quality.marker_count
+        quality.all_markers.update(1.0 if full else 0.0)
+        quality.visible_ratio.update(len(visible) / quality.marker_count)
+        quality.trial_frames += 1
+        if full:
+            quality.trial_full_frames += 1
+
+        if visible:
+            n = len(visible)
+            cx = sum(p[0] for p in visible) / n
+            cy = sum(p[1] for p in visible) / n
+            cz = sum(p[2] for p in visible) / n
+            mean_sq = sum((p[0] - cx) ** 2 + (p[1] - cy) ** 2 + (p[2] - cz) ** 2 for p in visible) / n
+            quality.spread.update(mean_sq ** 0.5)
+
+        if residual_count:
+            quality.residual.update(residual_sum / residual_count)
+
+        self._check_warning(model_name, quality, frame_number)
+
+    def _check_warning(self, model_name, quality, frame_number):
+        """(持锁) 试次中全标记帧比例低于阈值时告警一次，恢复后重新允许"""
+        fraction = quality.all_markers.mean
+        if quality.warning_active:
+            if fraction >= self.rearm_fraction:
+                quality.warning_active = False
+            return
+
+        if self.trial is None or quality.all_markers.count < self.min_frames:
+            return
+        if fraction >= self.warn_fraction:
+            return
+
+        quality.warning_active = True
+        occlusion = [stat.mean for stat in quality.occlusion]
+        worst = max(range(len(occlusion)), key=occlusion.__getitem__) if occlusion else None
+        warning = {
+            'timestamp': local_clock(),
+            'frame_number': frame_number,
+            'subject': model_name,
+            'trial': self.trial,
+            'phase': self.phase,
+            'all_markers_fraction': fraction,
+            'worst_marker': worst,
+            'worst_marker_occlusion': occlusion[worst] if worst is not None else None
+        }
+        self.warnings.append(warning)
+
+        message = (f"{model_name} 标记质量下降 (Trial {self.trial}): 全标记帧比例 {fraction:.0%}"
+                   + (f"，M{worst} 遮挡率 {occlusion[worst]:.0%}" if worst is not None else ""))
+        self.logger.warning(message)
+        print(f"⚠️  {message}")
+
+        if self.on_warning:
+            try:
+                self.on_warning(warning)
+            except Exception as e:
+                self.logger.error(f"质量告警回调错误: {e}")
+
+    def get_stats(self):
+        """获取各被试质量统计"""
+        with self.lock:
+            return {
+                'trial': self.trial,
+                'phase': self.phase,
+                'subjects': {name: quality.snapshot() for name, quality in self.subjects.items()},
+                'warnings': list(self.warnings[-20:]),
+                'warning_count': len(self.warnings)
+            }
+
+    def get_all_markers_fractions(self):
+        """{被试: 全标记帧比例}（遥测gauge用）"""
+        return {name: quality.all_markers.mean for name, quality in list(self.subjects.items())}
@@ -0,0 +1,282 @@
+"""
+保留模式场景层 (V3.4)
+Phase 0（地图学习）与Phase 1（导航测量）共用的场景：所有刺激在setup时一次性创建，
+每个元素记录当前显示状态，只有状态真正改变时才写入PsychoPy属性，稳态帧只调用draw()
+
+- 墙面标记：normal / highlight（当前前往的标记）
+- 隐藏目标：normal / searching / found（仅当前高亮目标显示搜索/找到样式，其余为灰色轮廓）
+- 光点：位置变化时才写入pos
+- 文本：TextStim只创建一次，文字改变时才重新排版
+- 静态背景：边框、常态的墙面标记与隐藏目标、文本预先渲染为一张BufferImageStim纹理，
+  仅在高亮/目标状态/文字改变时重新渲染（约数十毫秒，发生在到达/找到等事件帧）；
+  每帧只绘制背景纹理 + 高亮元素 + 光点，约50次draw调用降为数次
+- 背景渲染失败（如OpenGL不支持）时退回逐元素绘制
+"""
+
+import logging
+
+from psychopy import visual
+
+
+# ========== 样式常量 ==========
+BORDER_COLOR = [0.5, 0.5, 0.5]
+MARKER_LINE_COLOR = [1, 1, 1]
+MARKER_HIGHLIGHT_COLOR = '#00FFFF'  # 青色高亮
+MARKER_TEXT_COLOR = [1, 1, 1]
+
+# 背景纹理截取区域在场景边框外的余量（像素）
+BACKGROUND_MARGIN = 4
+
+# 隐藏目标样式：状态 -> (边框颜色, 填充颜色, 文字颜色)
+TARGET_STYLES = {
+    'normal': ([0.5, 0.5, 0.5], None, [0.7, 0.7, 0.7]),       # 灰色
+    'searching': ([1, 1, 0], [1, 1, 0, 0.2], [1, 1, 0]),      # 黄色高亮
+    'found': ([0, 1, 0], [0, 1, 0, 0.3], [0, 1, 0]),          # 绿色高亮
+}
+
+
+class SceneLayer:
+    """保留模式场景（脏标记驱动的属性更新）"""
+
+    def __init__(self, win, border_size=1080, marker_highlight_color=MARKER_HIGHLIGHT_COLOR,
+                 use_background=True):
+        """
+        Args:
+            win: PsychoPy窗口
+            border_size: 场景边框边长（像素）
+            marker_highlight_color: 墙面标记高亮颜色
+            use_background: 是否将静态元素预渲染为背景纹理
+        """
+        self.logger = logging.getLogger('SceneLayer')
+        self.win = win
+        self.marker_highlight_color = marker_highlight_color
+
+        self.border = visual.Rect(
+            win,
+            width=border_size,
+            height=border_size,
+            lineColor=BORDER_COLOR,
+            lineWidth=3,
+            fillColor=None
+        )
+
+        # {ID: {'circle', 'text', 'color', 'state'}}
+        self.markers = {}
+        # {ID: {'circle', 'text', 'status', 'state'}}
+        self.targets = {}
+        # {名称: [Circle, 当前位置]}
+        self.dots = {}
+        # {名称: [TextStim, 当前文字]}
+        self.texts = {}
+
+        self.highlight_marker = None
+        self.highlight_target = None
+        self._dirty = set()  # ('marker', ID) / ('target', ID)
+
+        # 静态背景纹理（截取场景正方形区域，norm单位 [左, 上, 右, 下]，含边框线宽余量）
+        self.use_background = use_background
+        self.background = None
+        self._background_stale = True
+        half_w = (border_size / 2.0 + BACKGROUND_MARGIN) / (win.size[0] / 2.0)
+        half_h = (border_size / 2.0 + BACKGROUND_MARGIN) / (win.size[1] / 2.0)
+        self._background_rect = [-min(half_w, 1.0), min(half_h, 1.0), min(half_w, 1.0), -min(half_h, 1.0)]
+
+        self.attribute_updates = 0
+        self.background_renders = 0
+
+    def build(self, wall_markers, hidden_targets):
+        """创建墙面标记与隐藏目标刺激（TransformManager的场景数据）"""
+        for marker_id, marker_data in wall_markers.items():
+            screen_pos = marker_data['screen_pos']
+            self.markers[marker_id] = {
+                'circle': visual.Circle(
+                    self.win,
+                    radius=12,
+                    fillColor=marker_data['color'],
+                    lineColor=MARKER_LINE_COLOR,
+                    lineWidth=2,
+                    pos=screen_pos
+                ),
+                'text': visual.TextStim(
+                    self.win,
+                    text=marker_id,
+                    color=MARKER_TEXT_COLOR,
+                    height=20,
+                    pos=(screen_pos[0], screen_pos[1] - 25)
+                ),
+                'color': marker_data['color'],
+                'state': 'normal'
+            }
+
+        line_color, fill_color, text_color = TARGET_STYLES['normal']
+        for target_id, target_data in hidden_targets.items():
+            screen_pos = target_data['screen_center']
+            self.targets[target_id] = {
+                'circle': visual.Circle(
+                    self.win,
+                    radius=target_data['screen_radius'],
+                    fillColor=fill_color,
+                    lineColor=line_color,
+                    lineWidth=3,
+                    pos=screen_pos
+                ),
+                'text': visual.TextStim(
+                    self.win,
+                    text=target_id,
+                    color=text_color,
+                    height=25,
+                    pos=screen_pos
+                ),
+                'status': 'normal',
+                'state': 'normal'
+            }
+
+        print(f"✅ 场景已创建: {len(self.markers)}个标记, {len(self.targets)}个目标")
+
+    def add_dot(self, name, fill_color, line_color, radius=20):
+        """创建参与者光点"""
+        dot = visual.Circle(
+            self.win,
+            radius=radius,
+            fillColor=fill_color,
+            lineColor=line_color,
+            lineWidth=2,
+            pos=(0, 0)
+        )
+        self.dots[name] = [dot, (0, 0)]
+        return dot
+
+    def add_text(self, name, text, pos, height=25, color=(1, 1, 1)):
+        """创建固定文本（只创建一次）"""
+        stim = visual.TextStim(
+            self.win,
+            text=text,
+            color=list(color),
+            height=height,
+            pos=pos
+        )
+        self.texts[name] = [stim, text]
+        return stim
+
+    def set_text(self, name, text):
+        """修改文本（文字不变时不触发重新排版）"""
+        entry = self.texts[name]
+        if entry[1] != text:
+            entry[0].text = text
+            entry[1] = text
+            self.attribute_updates += 1
+            self._background_stale = True
+
+    def set_dot_pos(self, name, pos):
+        """移动光点（位置不变时不写入）"""
+        entry = self.dots[name]
+        if entry[1] != pos:
+            entry[0].pos = pos
+            entry[1] = pos
+
+    def set_highlight(self, marker=None, target=None):
+        """设置当前高亮的墙面标记/隐藏目标（只标记前后两个元素为脏）"""
+        if marker != self.highlight_marker:
+            self._dirty.update((('marker', self.highlight_marker), ('marker', marker)))
+            self.highlight_marker = marker
+        if target != self.highlight_target:
+            self._dirty.update((('target', self.highlight_target), ('target', target)))
+            self.highlight_target = target
+
+    def set_target_status(self, target_id, status):
+        """设置隐藏目标状态（normal / searching / found）"""
+        entry = self.targets.get(target_id)
+        if entry is not None and entry['status'] != status:
+            entry['status'] = status
+            self._dirty.add(('target', target_id))
+
+    def get_target_status(self, target_id):
+        entry = self.targets.get(target_id)
+        return entry['status'] if entry else None
+
+    def _apply_dirty(self):
+        """将脏元素的状态写入刺激属性"""
+        for kind, element_id in self._dirty:
+            if kind == 'marker':
+                entry = self.markers.get(element_id)
+                if entry is None:
+                    continue
+                state = 'highlight' if element_id == self.highlight_marker else 'normal'
+                if state != entry['state']:
+                    entry['circle'].fillColor = (self.marker_highlight_color if state == 'highlight'
+                                                 else entry['color'])
+                    entry['state'] = state
+                    self.attribute_updates += 1
+                    self._background_stale = True
+            else:
+                entry = self.targets.get(element_id)
+                if entry is None:
+                    continue
+                if element_id != self.highlight_target:
+                    state = 'normal'
+                else:
+                    state = 'found' if entry['status'] == 'found' else 'searching'
+                if state != entry['state']:
+                    line_color, fill_color, text_color = TARGET_STYLES[state]
+                    entry['circle'].lineColor = line_color
+                    entry['circle'].fillColor = fill_color
+                    entry['text'].color = text_color
+                    entry['state'] = state
+                    self.attribute_updates += 1
+                    self._background_stale = True
+        self._dirty.clear()
+
+    def _static_stims(self):
+        """背景包含的刺激：边框、常态元素、文本（非常态元素每帧单独绘制）"""
+        stims = [self.border]
+        for entries in (self.markers.values(), self.targets.values()):
+            for entry in entries:
+                if entry['state'] == 'normal':
+                    stims.extend((entry['circle'], entry['text']))
+        stims.extend(stim for stim, _ in self.texts.values())
+        return stims
+
+    def _render_background(self):
+        """将静态元素渲染为背景纹理（BufferImageStim会清空后缓冲区，须在本帧其他绘制之前调用）"""
+        self._background_stale = False
+        try:
+            self.background = visual.BufferImageStim(self.win, stim=self._static_stims(),
+                                                     rect=self._background_rect)
+            self.background_renders += 1
+        except Exception as e:
+            self.logger.warning(f"背景纹理渲染失败，改为逐元素绘制: {e}")
+            self.background = None
+            self.use_background = False
+
+    def _draw_all(self):
+        """逐元素绘制（无背景纹理时）"""
+        self.border.draw()
+        for entry in self.markers.values():
+            entry['circle'].draw()
+            entry['text'].draw()
+        for entry in self.targets.values():
+            entry['circle'].draw()
+            entry['text'].draw()
+        for stim, _ in self.texts.values():
+            stim.draw()
+
+    def draw(self):
+        """绘制一帧（稳态帧只绘制背景纹理、高亮元素与光点）"""
+        if self._dirty:
+            self._apply_dirty()
+
+        if self.use_background and self._background_stale:
+            self._render_background()
+
+        if self.background is not None:
+            self.background.draw()
+            for entries in (self.markers.values(), self.targets.values()):
+                for entry in entries:
+                    if entry['state'] != 'normal':
+                        entry['circle'].draw()
+                        entry['text'].draw()
+        else:
+            self._draw_all()
+
+        for dot, _ in self.dots.values():
+            dot.draw()
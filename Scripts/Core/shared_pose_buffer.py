@@ -0,0 +1,182 @@
+"""
+共享内存位置缓冲区 (V3.4)
+在独立采集进程与PsychoPy进程之间发布最新的帧一致位置数据
+
+内存布局（小端）：
+- 头部: seq(uint64) | frame_number(uint64) | capture_time(float64) | slot_count(uint32) | names_version(uint32)
+- 槽位: name(32字节) | x, y, z(float64) | timestamp(float64) | 滤波x, y, z(float64) | flags(uint8) | 填充
+  flags: bit0=valid, bit1=含滤波位置
+
+写入端采用序列锁（seqlock）：写入前seq置为奇数，写完后置为偶数。
+读取端复制整块内存后校验seq前后一致且为偶数，无需任何跨进程锁
+"""
+
+import struct
+import logging
+import sys
+from multiprocessing import shared_memory
+
+
+HEADER = struct.Struct('<QQdII')
+SLOT = struct.Struct('<32sdddddddB7x')
+FLAG_VALID = 0x01
+FLAG_FILTERED = 0x02
+NAME_SIZE = 32
+DEFAULT_SLOT_COUNT = 32
+
+
+class SharedPoseBuffer:
+    """共享内存位置缓冲区（单写多读）"""
+
+    def __init__(self, name=None, create=False, slot_count=DEFAULT_SLOT_COUNT):
+        """
+        Args:
+            name: 共享内存块名称（attach时必填，create时可为None由系统生成）
+            create: True=创建新块（写入端/所有者），False=附加到已有块
+            slot_count: 最大对象数（create时有效）
+        """
+        self.logger = logging.getLogger('SharedPoseBuffer')
+        self.owner = create
+
+        if create:
+            size = HEADER.size + SLOT.size * slot_count
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.slot_count = slot_count
+            self.shm.buf[:size] = bytes(size)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0, 0.0, slot_count, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name, create=False)
+            self._untrack()
+            self.slot_count = HEADER.unpack_from(self.shm.buf, 0)[3]
+
+        self.name = self.shm.name
+        self.size = HEADER.size + SLOT.size * self.slot_count
+
+        # 写入端状态
+        self._seq = 0
+        self._slot_index = {}
+        self._names_version = 0
+
+        # 读取端缓存
+        self._cached_seq = None
+        self._cached_snapshot = None
+
+    def _untrack(self):
+        """附加端不参与共享内存回收（避免POSIX下resource_tracker在子进程退出时误删）"""
+        if sys.platform == 'win32':
+            return
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+    # ========== 写入端 ==========
+
+    def publish(self, poses, frame_number=0, capture_time=0.0):
+        """发布一帧位置数据（整帧原子可见）
+
+        Args:
+            poses: {name: (x, y, z, timestamp, valid)} 或
+                   {name: (x, y, z, timestamp, valid, filtered_x, filtered_y, filtered_z)}
+            frame_number: NatNet帧号
+            capture_time: 采集时间戳
+        """
+        buf = self.shm.buf
+
+        # 新对象分配槽位
+        for name in poses:
+            if name not in self._slot_index:
+                if len(self._slot_index) >= self.slot_count:
+                    self.logger.warning(f"共享内存槽位已满，忽略: {name}")
+                    continue
+                self._slot_index[name] = len(self._slot_index)
+                self._names_version += 1
+
+        # seq置为奇数：写入中
+        self._seq += 1
+        struct.pack_into('<Q', buf, 0, self._seq)
+
+        for name, pose in poses.items():
+            index = self._slot_index.get(name)
+            if index is None:
+                continue
+            x, y, z, timestamp, valid = pose[:5]
+            flags = FLAG_VALID if valid else 0
+            if len(pose) >= 8:
+                fx, fy, fz = pose[5:8]
+                flags |= FLAG_FILTERED
+            else:
+                fx, fy, fz = x, y, z
+            SLOT.pack_into(
+                buf, HEADER.size + index * SLOT.size,
+                name.encode('utf-8')[:NAME_SIZE], x, y, z, timestamp, fx, fy, fz, flags
+            )
+
+        # 写入头部，seq置为偶数：写入完成
+        self._seq += 1
+        HEADER.pack_into(buf, 0, self._seq, frame_number, capture_time,
+                         self.slot_count, self._names_version)
+
+    # ========== 读取端 ==========
+
+    def read(self, max_retries=100):
+        """读取最新一帧（seq未变化时返回缓存）
+
+        Returns:
+            dict: {
+                'seq': int, 'frame_number': int, 'capture_time': float,
+                'poses': {name: {'x', 'y', 'z', 'timestamp', 'valid',
+                                 'filtered_x', 'filtered_y', 'filtered_z', 'filtered'}}
+            } 或 None（尚无数据/读取冲突）
+        """
+        buf = self.shm.buf
+
+        for _ in range(max_retries):
+            seq_before = struct.unpack_from('<Q', buf, 0)[0]
+            if seq_before == 0:
+                return None
+            if seq_before & 1:
+                continue
+            if seq_before == self._cached_seq:
+                return self._cached_snapshot
+
+            data = bytes(buf[:self.size])
+            seq_after = struct.unpack_from('<Q', buf, 0)[0]
+            if seq_before != seq_after:
+                continue
+
+            seq, frame_number, capture_time, slot_count, _ = HEADER.unpack_from(data, 0)
+            poses = {}
+            for index in range(slot_count):
+                raw_name, x, y, z, timestamp, fx, fy, fz, flags = SLOT.unpack_from(data, HEADER.size + index * SLOT.size)
+                name = raw_name.rstrip(b'\x00').decode('utf-8', errors='replace')
+                if not name:
+                    break
+                poses[name] = {
+                    'x': x, 'y': y, 'z': z,
+                    'timestamp': timestamp,
+                    'valid': bool(flags & FLAG_VALID),
+                    'filtered_x': fx, 'filtered_y': fy, 'filtered_z': fz,
+                    'filtered': bool(flags & FLAG_FILTERED)
+                }
+
+            self._cached_seq = seq
+            self._cached_snapshot = {
+                'seq': seq,
+                'frame_number': frame_number,
+                'capture_time': capture_time,
+                'poses': poses
+            }
+            return self._cached_snapshot
+
+        return None
+
+    def close(self):
+        """关闭共享内存（所有者同时释放内存块）"""
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception as e:
+            self.logger.warning(f"关闭共享内存错误: {e}")
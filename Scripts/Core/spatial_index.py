@@ -0,0 +1,151 @@
+"""
+区域空间索引 (V3.4)
+在布局加载时对所有区域（墙面标记、隐藏目标、墙面带、多边形）建立均匀网格索引，
+一次向量化查询回答"这N个点分别落在哪些区域内"
+
+- 网格：覆盖所有区域外接矩形的均匀网格，每个格子记录外接矩形与之相交的区域（候选表按最大候选数补齐为二维数组）
+- 查询：点 -> 格子 -> 候选区域 (N, K)，圆形与线段带区域用numpy一次性计算有符号距离，
+  多边形区域仅对落入其候选格的点逐个判断
+- 区域对象与geofence模块一致（signed_distance / bounds）
+"""
+
+import numpy as np
+
+from .geofence import CircleRegion, BandRegion
+
+
+_TYPE_CIRCLE = 0
+_TYPE_BAND = 1
+_TYPE_OTHER = 2
+
+
+class RegionGridIndex:
+    """均匀网格区域索引"""
+
+    def __init__(self, regions, cell_size=0.5, padding=0.0):
+        """
+        Args:
+            regions: 区域对象列表
+            cell_size: 网格边长（米）
+            padding: 外接矩形外扩距离（米），用于围栏滞回等需要边界外候选的场景
+        """
+        self.regions = list(regions)
+        self.region_ids = [region.region_id for region in self.regions]
+        self.cell_size = float(cell_size)
+        self.padding = float(padding)
+
+        count = len(self.regions)
+        self.types = np.full(count, _TYPE_OTHER, dtype=np.int8)
+        # 圆：(cx, cz, r)；线段带：(x0, z0, dx, dz, half_width)
+        self.params = np.zeros((count, 5))
+        for i, region in enumerate(self.regions):
+            if isinstance(region, CircleRegion):
+                self.types[i] = _TYPE_CIRCLE
+                self.params[i, :3] = (region.center[0], region.center[1], region.radius)
+            elif isinstance(region, BandRegion):
+                self.types[i] = _TYPE_BAND
+                self.params[i] = (region.start[0], region.start[1],
+                                  region.end[0] - region.start[0], region.end[1] - region.start[1],
+                                  region.half_width)
+
+        self._build_grid()
+
+    def _build_grid(self):
+        """建立格子 -> 候选区域表"""
+        if not self.regions:
+            self.origin = np.zeros(2)
+            self.shape = (1, 1)
+            self.table = np.full((1, 1), -1, dtype=np.intp)
+            return
+
+        bounds = np.array([region.bounds() for region in self.regions], dtype=np.float64)
+        bounds[:, :2] -= self.padding
+        bounds[:, 2:] += self.padding
+
+        self.origin = bounds[:, :2].min(axis=0)
+        extent = bounds[:, 2:].max(axis=0) - self.origin
+        nx = int(extent[0] // self.cell_size) + 1  # 包含恰好落在最大边界上的点
+        nz = int(extent[1] // self.cell_size) + 1
+        self.shape = (nx, nz)
+
+        cells = [[] for _ in range(nx * nz)]
+        for i, (x0, z0, x1, z1) in enumerate(bounds):
+            ix0, iz0 = self._cell_coords(x0, z0)
+            ix1, iz1 = self._cell_coords(x1, z1)
+            for ix in range(ix0, ix1 + 1):
+                for iz in range(iz0, iz1 + 1):
+                    cells[ix * nz + iz].append(i)
+
+        width = max(1, max(len(cell) for cell in cells))
+        self.table = np.full((nx * nz, width), -1, dtype=np.intp)
+        for c, cell in enumerate(cells):
+            self.table[c, :len(cell)] = cell
+
+    def _cell_coords(self, x, z):
+        ix = int((x - self.origin[0]) // self.cell_size)
+        iz = int((z - self.origin[1]) // self.cell_size)
+        return min(max(ix, 0), self.shape[0] - 1), min(max(iz, 0), self.shape[1] - 1)
+
+    def candidates(self, x, z):
+        """单点的候选区域序号（标量路径，供逐帧围栏评估使用）"""
+        if not self.regions:
+            return self.table[0, :0]
+        ix = int((x - self.origin[0]) // self.cell_size)
+        iz = int((z - self.origin[1]) // self.cell_size)
+        if not (0 <= ix < self.shape[0] and 0 <= iz < self.shape[1]):
+            return self.table[0, :0]
+        row = self.table[ix * self.shape[1] + iz]
+        return row[row >= 0]
+
+    def contains(self, points):
+        """向量化查询
+
+        Args:
+            points: (N, 2) 世界坐标 (x, z)
+        Returns:
+            (N, R) bool 矩阵，[i, j] 表示第i个点在第j个区域内
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = len(points)
+        result = np.zeros((n, len(self.regions)), dtype=bool)
+        if n == 0 or not self.regions:
+            return result
+
+        # 点 -> 格子（网格外的点没有候选）
+        cell = np.floor((points - self.origin) / self.cell_size).astype(np.intp)
+        in_grid = (cell[:, 0] >= 0) & (cell[:, 0] < self.shape[0]) & (cell[:, 1] >= 0) & (cell[:, 1] < self.shape[1])
+        flat = np.where(in_grid, cell[:, 0] * self.shape[1] + cell[:, 1], 0)
+        cand = np.where(in_grid[:, None], self.table[flat], -1)  # (N, K)
+
+        valid = cand >= 0
+        idx = np.where(valid, cand, 0)
+        types = self.types[idx]
+        p = self.params[idx]  # (N, K, 5)
+        x = points[:, 0:1]
+        z = points[:, 1:2]
+
+        # 圆形
+        circle_dist = np.hypot(x - p[..., 0], z - p[..., 1]) - p[..., 2]
+
+        # 线段带
+        px, pz = x - p[..., 0], z - p[..., 1]
+        length_sq = p[..., 2] ** 2 + p[..., 3] ** 2
+        t = np.clip((px * p[..., 2] + pz * p[..., 3]) / np.where(length_sq > 0, length_sq, 1.0), 0.0, 1.0)
+        band_dist = np.hypot(px - t * p[..., 2], pz - t * p[..., 3]) - p[..., 4]
+
+        inside = valid & (((types == _TYPE_CIRCLE) & (circle_dist <= 0.0)) |
+                          ((types == _TYPE_BAND) & (band_dist <= 0.0)))
+
+        # 其他区域（多边形）逐个判断
+        for i, k in zip(*np.nonzero(valid & (types == _TYPE_OTHER))):
+            region = self.regions[cand[i, k]]
+            inside[i, k] = region.signed_distance(points[i, 0], points[i, 1]) <= 0.0
+
+        rows, cols = np.nonzero(inside)
+        result[rows, cand[rows, cols]] = True
+        return result
+
+    def query(self, points):
+        """向量化查询，返回每个点所在区域ID列表"""
+        mask = self.contains(points)
+        return [[self.region_ids[j] for j in np.flatnonzero(row)] for row in mask]
@@ -0,0 +1,237 @@
+"""
+双人运动同步指标 (V3.4)
+在采集线程上逐帧增量维护两名被试的滑动窗口同步指标，并以低采样率输出到LSL用于实时反馈
+（离线分析仍以Position.csv为准）
+
+- 人际距离：两人质心的水平距离（X-Z平面，米），取自位置缓存；窗口均值由滚动和维护
+- 速度相关：窗口内两人水平速度的Pearson相关（X、Z两轴分别计算后取均值），
+  由环形缓冲区 + 滚动和（Σa, Σb, Σa², Σb², Σab）维护，每帧 O(1)
+- 相对朝向：两人yaw之差展开到[-π, π)（弧度），需要朝向数据（刚体或骨骼根关节）
+- 滚动和每满一个窗口按缓冲区重新精确求和一次，消除浮点累积误差（均摊仍为O(1)）
+- 帧间隔超过max_gap（任一被试丢失）时清空窗口
+"""
+
+import math
+import time
+import logging
+
+try:
+    from pylsl import StreamInfo, StreamOutlet, local_clock
+except ImportError:
+    StreamInfo = StreamOutlet = None
+    local_clock = time.time
+
+
+# 窗口通道：速度X/Z轴各一对 (a, b)
+_AXES = 2
+
+
+class SynchronyTracker:
+    """两名被试的滑动窗口同步指标"""
+
+    CHANNELS = ['Distance', 'DistanceMean', 'VelocityCorr', 'RelativeHeading', 'Valid']
+
+    def __init__(self, subject_a, subject_b, window=2.0, frame_rate=120.0,
+                 publish_rate=10.0, max_gap=0.25):
+        """
+        Args:
+            subject_a, subject_b: 被试名称（如Sub001, Sub002）
+            window: 滑动窗口长度（秒）
+            frame_rate: NatNet帧率（决定窗口帧数）
+            publish_rate: LSL输出采样率（Hz）
+            max_gap: 超过该帧间隔（秒）时清空窗口
+        """
+        self.logger = logging.getLogger('SynchronyTracker')
+        self.subject_a = subject_a
+        self.subject_b = subject_b
+        self.window = window
+        self.size = max(2, int(round(window * frame_rate)))
+        self.publish_interval = 1.0 / publish_rate
+        self.publish_rate = publish_rate
+        self.max_gap = max_gap
+
+        self.outlet = None
+        self.last_publish = None
+        self.sample_count = 0
+
+        self.latest = None
+        self._reset()
+
+    def _reset(self):
+        """清空窗口"""
+        self.ring = [None] * self.size  # [(distance, (va_x, va_z), (vb_x, vb_z))]
+        self.head = 0
+        self.count = 0
+        self.updates_since_resum = 0
+        self.sum_distance = 0.0
+        self.sums = [[0.0] * 5 for _ in range(_AXES)]  # 每轴 [Σa, Σb, Σa², Σb², Σab]
+        self.prev = None  # (time, ax, az, bx, bz)
+
+    def create_outlet(self, stream_prefix=""):
+        """创建同步指标流（5通道）"""
+        if not StreamInfo or not StreamOutlet:
+            self.logger.error("LSL不可用，无法创建同步指标流")
+            return False
+
+        stream_name = f"{stream_prefix}Dyad_Synchrony"
+        info = StreamInfo(
+            name=stream_name,
+            type='MoCap',
+            channel_count=len(self.CHANNELS),
+            nominal_srate=0,  # 不规则采样（按帧到达约publish_rate输出）
+            channel_format='float32',
+            source_id=f'{stream_prefix}optitrack_dyad_synchrony'
+        )
+
+        channels = info.desc().append_child("channels")
+        for label, unit, channel_type in [('Distance', 'meters', 'Distance'),
+                                          ('DistanceMean', 'meters', 'Distance'),
+                                          ('VelocityCorr', '', 'Correlation'),
+                                          ('RelativeHeading', 'radians', 'Orientation'),
+                                          ('Valid', '', 'Flag')]:
+            ch = channels.append_child("channel")
+            ch.append_child_value("label", label)
+            ch.append_child_value("unit", unit)
+            ch.append_child_value("type", channel_type)
+
+        synchrony = info.desc().append_child("synchrony")
+        synchrony.append_child_value("subject_a", self.subject_a)
+        synchrony.append_child_value("subject_b", self.subject_b)
+        synchrony.append_child_value("window_seconds", f"{self.window:g}")
+        synchrony.append_child_value("publish_rate", f"{self.publish_rate:g}")
+
+        self.outlet = StreamOutlet(info)
+        print(f"  ✅ 已创建: {stream_name} ({len(self.CHANNELS)}通道: {', '.join(self.CHANNELS)})")
+        return True
+
+    def update(self, lsl_time, pos_a, pos_b, yaw_a=None, yaw_b=None):
+        """(采集线程) 加入一帧两人位置
+
+        Args:
+            lsl_time: 帧LSL时间戳
+            pos_a, pos_b: (x, y, z) 位置（Y轴向上）
+            yaw_a, yaw_b: 朝向（弧度），不可用时为None
+        """
+        ax, az = pos_a[0], pos_a[2]
+        bx, bz = pos_b[0], pos_b[2]
+        distance = math.hypot(ax - bx, az - bz)
+
+        prev = self.prev
+        if prev is not None and not (0.0 < lsl_time - prev[0] <= self.max_gap):
+            self._reset()
+            prev = None
+        self.prev = (lsl_time, ax, az, bx, bz)
+
+        if prev is not None:
+            dt = lsl_time - prev[0]
+            va = ((ax - prev[1]) / dt, (az - prev[2]) / dt)
+            vb = ((bx - prev[3]) / dt, (bz - prev[4]) / dt)
+            self._push(distance, va, vb)
+
+        relative_heading = None
+        if yaw_a is not None and yaw_b is not None:
+            relative_heading = (yaw_a - yaw_b + math.pi) % (2.0 * math.pi) - math.pi
+
+        self.latest = {
+            'timestamp': lsl_time,
+            'distance': distance,
+            'distance_mean': self.sum_distance / self.count if self.count else distance,
+            'velocity_corr': self._velocity_corr(),
+            'relative_heading': relative_heading,
+            'valid': self.count >= self.size // 2
+        }
+
+        if self.outlet and (self.last_publish is None or lsl_time - self.last_publish >= self.publish_interval):
+            self.last_publish = lsl_time
+            self._publish(self.latest)
+
+    def _push(self, distance, va, vb):
+        """环形缓冲区入队并更新滚动和"""
+        old = self.ring[self.head]
+        self.ring[self.head] = (distance, va, vb)
+        self.head = (self.head + 1) % self.size
+
+        self.sum_distance += distance
+        for axis in range(_AXES):
+            a, b = va[axis], vb[axis]
+            s = self.sums[axis]
+            s[0] += a
+            s[1] += b
+            s[2] += a * a
+            s[3] += b * b
+            s[4] += a * b
+
+        if old is None:
+            self.count += 1
+        else:
+            self.sum_distance -= old[0]
+            for axis in range(_AXES):
+                a, b = old[1][axis], old[2][axis]
+                s = self.sums[axis]
+                s[0] -= a
+                s[1] -= b
+                s[2] -= a * a
+                s[3] -= b * b
+                s[4] -= a * b
+
+        self.updates_since_resum += 1
+        if self.updates_since_resum >= self.size:
+            self._resum()
+
+    def _resum(self):
+        """按缓冲区重新精确求和"""
+        self.updates_since_resum = 0
+        self.sum_distance = 0.0
+        self.sums = [[0.0] * 5 for _ in range(_AXES)]
+        for entry in self.ring:
+            if entry is None:
+                continue
+            self.sum_distance += entry[0]
+            for axis in range(_AXES):
+                a, b = entry[1][axis], entry[2][axis]
+                s = self.sums[axis]
+                s[0] += a
+                s[1] += b
+                s[2] += a * a
+                s[3] += b * b
+                s[4] += a * b
+
+    def _velocity_corr(self):
+        """各轴Pearson相关的均值（窗口不足或静止时为None）"""
+        n = self.count
+        if n < 3:
+            return None
+
+        values = []
+        for s in self.sums:
+            var_a = n * s[2] - s[0] * s[0]
+            var_b = n * s[3] - s[1] * s[1]
+            if var_a <= 1e-12 or var_b <= 1e-12:
+                continue
+            values.append((n * s[4] - s[0] * s[1]) / math.sqrt(var_a * var_b))
+
+        return sum(values) / len(values) if values else None
+
+    def _publish(self, latest):
+        nan = float('nan')
+        sample = [
+            latest['distance'],
+            latest['distance_mean'],
+            latest['velocity_corr'] if latest['velocity_corr'] is not None else nan,
+            latest['relative_heading'] if latest['relative_heading'] is not None else nan,
+            1.0 if latest['valid'] else 0.0
+        ]
+        try:
+            self.outlet.push_sample(sample, latest['timestamp'])
+            self.sample_count += 1
+        except Exception as e:
+            self.logger.warning(f"同步指标推送失败: {e}")
+
+    def get_stats(self):
+        return {
+            'subjects': [self.subject_a, self.subject_b],
+            'window_frames': self.size,
+            'filled': self.count,
+            'samples': self.sample_count,
+            'latest': self.latest
+        }
@@ -0,0 +1,312 @@
+"""
+运行时遥测 (V3.4)
+O(1)增量滚动统计 + 本地指标端点 + 周期性JSON快照
+
+- RollingStat: 指数加权滑动均值/标准差，记录最近值与最大值，每次更新O(1)
+- RateEstimator: 基于到达间隔的帧率与抖动估计
+- TelemetryRegistry: 统一注册统计量与即时指标（gauge）
+- TelemetryServer: 仅监听127.0.0.1的HTTP端点
+    GET /metrics  -> Prometheus文本格式
+    GET /snapshot -> JSON
+  同时周期性写入Logs/下的JSON快照，可在另一个终端查看正在运行的实验
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+# ========== 路径配置常量 ==========
+LOGS_DIR = Path(__file__).parent.parent.parent / 'Logs'
+
+
+class RollingStat:
+    """指数加权滑动统计（O(1)更新）"""
+
+    def __init__(self, alpha=0.05):
+        """
+        Args:
+            alpha: 平滑系数，等效窗口约为 2/alpha 个样本
+        """
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def update(self, value):
+        """加入一个样本"""
+        self.count += 1
+        self.last = value
+        if self.count == 1:
+            self.mean = value
+            self.var = 0.0
+            self.max = value
+            return
+
+        # West增量EWMA均值/方差
+        delta = value - self.mean
+        increment = self.alpha * delta
+        self.mean += increment
+        self.var = (1.0 - self.alpha) * (self.var + delta * increment)
+        if value > self.max:
+            self.max = value
+
+    @property
+    def std(self):
+        return math.sqrt(self.var) if self.var > 0 else 0.0
+
+    def reset_max(self):
+        """重置最大值（如每个Trial开始时）"""
+        self.max = self.last
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.std,
+            'last': self.last,
+            'max': self.max
+        }
+
+
+class RateEstimator:
+    """到达率与间隔抖动估计（O(1)更新）"""
+
+    def __init__(self, alpha=0.02):
+        self.interval = RollingStat(alpha)
+        self.last_time = None
+
+    def tick(self, timestamp):
+        """记录一次到达"""
+        if self.last_time is not None:
+            self.interval.update(timestamp - self.last_time)
+        self.last_time = timestamp
+
+    @property
+    def rate(self):
+        return 1.0 / self.interval.mean if self.interval.mean > 0 else 0.0
+
+    @property
+    def jitter(self):
+        return self.interval.std
+
+    def snapshot(self):
+        return {
+            'rate': self.rate,
+            'jitter': self.jitter,
+            'mean_interval': self.interval.mean,
+            'max_interval': self.interval.max,
+            'count': self.interval.count,
+            'last_time': self.last_time
+        }
+
+
+class TelemetryRegistry:
+    """遥测指标注册表"""
+
+    def __init__(self, namespace='psycholsl'):
+        self.namespace = namespace
+        self.stats = {}
+        self.rates = {}
+        self.gauges = {}
+        self.help = {}
+
+    def stat(self, name, help_text='', alpha=0.05):
+        """获取或创建滚动统计量"""
+        if name not in self.stats:
+            self.stats[name] = RollingStat(alpha)
+            self.help[name] = help_text
+        return self.stats[name]
+
+    def rate(self, name, help_text='', alpha=0.02):
+        """获取或创建到达率估计器"""
+        if name not in self.rates:
+            self.rates[name] = RateEstimator(alpha)
+            self.help[name] = help_text
+        return self.rates[name]
+
+    def gauge(self, name, fn, help_text=''):
+        """注册即时指标，fn()返回数值或 {标签值: 数值}"""
+        self.gauges[name] = fn
+        self.help[name] = help_text
+
+    def snapshot(self):
+        """生成JSON可序列化的快照"""
+        gauges = {}
+        for name, fn in self.gauges.items():
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                gauges[name] = f'error: {e}'
+
+        return {
+            'time': time.time(),
+            'stats': {name: stat.snapshot() for name, stat in self.stats.items()},
+            'rates': {name: rate.snapshot() for name, rate in self.rates.items()},
+            'gauges': gauges
+        }
+
+    def to_prometheus(self):
+        """生成Prometheus文本格式"""
+        lines = []
+
+        def emit(metric, value, help_text, labels=None):
+            full_name = f'{self.namespace}_{metric}'
+            if help_text:
+                lines.append(f'# HELP {full_name} {help_text}')
+            lines.append(f'# TYPE {full_name} gauge')
+            if isinstance(value, dict):
+                for label_value, v in value.items():
+                    lines.append(f'{full_name}{{{labels or "label"}="{label_value}"}} {float(v)}')
+            else:
+                lines.append(f'{full_name} {float(value)}')
+
+        for name, stat in self.stats.items():
+            emit(name, {'mean': stat.mean, 'std': stat.std, 'last': stat.last, 'max': stat.max},
+                 self.help.get(name), labels='stat')
+            emit(f'{name}_count', stat.count, '')
+
+        for name, rate in self.rates.items():
+            emit(f'{name}_rate', rate.rate, self.help.get(name))
+            emit(f'{name}_jitter', rate.jitter, '')
+            emit(f'{name}_count', rate.interval.count, '')
+
+        for name, fn in self.gauges.items():
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            emit(name, value, self.help.get(name))
+
+        return '\n'.join(lines) + '\n'
+
+
+class TelemetryServer:
+    """本地遥测端点与周期性JSON快照"""
+
+    def __init__(self, registry, port=9109, snapshot_interval=5.0, snapshot_name='Telemetry'):
+        """
+        Args:
+            registry: TelemetryRegistry
+            port: HTTP端口（仅绑定127.0.0.1），None表示不启动HTTP端点
+            snapshot_interval: JSON快照间隔（秒），None表示不写快照
+            snapshot_name: 快照文件名前缀
+        """
+        self.logger = logging.getLogger('TelemetryServer')
+        self.registry = registry
+        self.port = port
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_path = LOGS_DIR / f'{snapshot_name}_{datetime.now().strftime("%Y%m%d-%H%M")}.json'
+
+        self.http_server = None
+        self.http_thread = None
+        self.snapshot_thread = None
+        self.running = False
+        self.stop_event = threading.Event()
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics'):
+                    body = registry.to_prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path.startswith('/snapshot'):
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False, default=str).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 不打印访问日志，避免干扰实验控制台
+                pass
+
+        return Handler
+
+    def _snapshot_loop(self):
+        """(独立线程) 周期性写入JSON快照"""
+        while not self.stop_event.wait(self.snapshot_interval):
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        """写入JSON快照（先写临时文件再替换，读取端不会读到半个文件）"""
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.snapshot_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.snapshot(), f, indent=2, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            self.logger.warning(f"写入遥测快照失败: {e}")
+
+    def start(self):
+        """启动HTTP端点和快照线程"""
+        if self.running:
+            return True
+
+        self.running = True
+        self.stop_event.clear()
+
+        if self.port is not None:
+            try:
+                self.http_server = ThreadingHTTPServer(('127.0.0.1', self.port), self._make_handler())
+                self.http_server.daemon_threads = True
+                self.http_thread = threading.Thread(
+                    target=self.http_server.serve_forever,
+                    name='TelemetryHTTP',
+                    daemon=True
+                )
+                self.http_thread.start()
+                print(f"✅ 遥测端点已启动: http://127.0.0.1:{self.port}/metrics")
+            except OSError as e:
+                self.http_server = None
+                self.logger.warning(f"遥测端点启动失败（端口{self.port}）: {e}")
+                print(f"⚠️  遥测端点启动失败，仅写入JSON快照: {e}")
+
+        if self.snapshot_interval:
+            self.snapshot_thread = threading.Thread(
+                target=self._snapshot_loop,
+                name='TelemetrySnapshot',
+                daemon=True
+            )
+            self.snapshot_thread.start()
+            print(f"✅ 遥测快照: {self.snapshot_path}")
+
+        return True
+
+    def stop(self):
+        """停止端点并写入最终快照"""
+        if not self.running:
+            return
+
+        self.running = False
+        self.stop_event.set()
+
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+        if self.snapshot_thread and self.snapshot_thread.is_alive():
+            self.snapshot_thread.join(timeout=1.0)
+
+        if self.snapshot_interval:
+            self.write_snapshot()
@@ -8,13 +8,25 @@
 - PsychoPy屏幕范围：X, Y ∈ [-540, +540]像素 (1080px × 1080px)
 - 固定缩放因子：S = 180.0 像素/米
 - Z轴翻转：Motive Z → PsychoPy Y
+
+仿射映射 (V3.4)：
+- 内部统一表示为 2×4 矩阵 M：[x_screen, y_screen] = M · [x, y, z, 1]，默认由缩放因子与Z轴翻转构成
+- 布局transform_params可给出完整矩阵 'affine'（2×4，或作用于(x, z)的2×3），
+  或 'rotation_deg' / 'scale_xz' / 'offset' 组合（旋转、各向异性缩放、平移）
+- *_batch 版本接受NumPy点数组，一次转换任意数量的点（轨迹、离线分析、渲染）
 """
 
 import json
-import random
+import math
 from pathlib import Path
 import logging
 
+import numpy as np
+
+from .geofence import CircleRegion, BandRegion
+from .spatial_index import RegionGridIndex
+from .layout_generator import generate_target_layout, LayoutLibrary
+
 
 class TransformManager:
     """坐标系转换与场景标记管理器 (V3.0 固定线性映射版)"""
@@ -42,6 +54,13 @@ class TransformManager:
         # 隐藏目标配置
         self.hidden_targets = {}
         
+        # 区域空间索引（布局加载时建立）
+        self.region_index = None
+        
+        # 仿射映射矩阵（默认由scale_factor/z_flip生成）
+        self.affine_params = None
+        self.set_affine()
+        
         # 颜色配置 (RGBA格式，适用于PsychoPy)
         self.wall_colors = {
             'A': [-1, -1, 1],      # 蓝色
@@ -72,8 +91,53 @@ class TransformManager:
             self.logger.error(f"验证线性映射错误: {e}")
             return False
     
+    def set_affine(self, params=None):
+        """设置仿射映射
+        
+        Args:
+            params: None表示默认映射（scale_factor与z_flip）；否则为包含以下任一形式的字典：
+                - 'affine': 2×4矩阵（作用于[x, y, z, 1]）或2×3矩阵（作用于[x, z, 1]）
+                - 'rotation_deg'（屏幕平面内旋转，度）、'scale_xz'（[sx, sz] 像素/米）、'offset'（[ox, oy] 像素）
+        """
+        if params and params.get('affine') is not None:
+            matrix = np.asarray(params['affine'], dtype=np.float64)
+            if matrix.shape == (2, 3):
+                matrix = np.insert(matrix, 1, 0.0, axis=1)  # 补Y列（水平面映射与高度无关）
+            if matrix.shape != (2, 4):
+                raise ValueError(f"仿射矩阵形状应为2×4或2×3: {matrix.shape}")
+        elif params:
+            sx, sz = params.get('scale_xz', [self.scale_factor, self.scale_factor])
+            theta = math.radians(params.get('rotation_deg', 0.0))
+            ox, oy = params.get('offset', [0.0, 0.0])
+            rotation = np.array([[math.cos(theta), -math.sin(theta)],
+                                 [math.sin(theta), math.cos(theta)]])
+            linear = rotation @ np.diag([sx, sz * self.z_flip])
+            matrix = np.zeros((2, 4))
+            matrix[:, 0] = linear[:, 0]
+            matrix[:, 2] = linear[:, 1]
+            matrix[:, 3] = (ox, oy)
+        else:
+            matrix = np.array([[self.scale_factor, 0.0, 0.0, 0.0],
+                               [0.0, 0.0, self.scale_factor * self.z_flip, 0.0]])
+        
+        linear_xz = matrix[:, [0, 2]]
+        if abs(np.linalg.det(linear_xz)) < 1e-12:
+            raise ValueError("仿射矩阵在水平面上不可逆")
+        
+        self.affine_params = params or None
+        self.affine = matrix
+        self.affine_inverse = np.linalg.inv(linear_xz)
+        self.pixel_scale = math.sqrt(abs(np.linalg.det(linear_xz)))  # 等效各向同性缩放（像素/米）
+        
+        # 标量路径缓存（避免逐点索引NumPy数组）
+        self._forward = tuple(float(v) for v in (matrix[0, 0], matrix[0, 2], matrix[0, 3],
+                                                 matrix[1, 0], matrix[1, 2], matrix[1, 3]))
+        inv = self.affine_inverse
+        self._inverse = tuple(float(v) for v in (inv[0, 0], inv[0, 1], inv[1, 0], inv[1, 1],
+                                                 matrix[0, 3], matrix[1, 3]))
+    
     def real_to_screen(self, x_real, z_real):
-        """Motive世界坐标 → PsychoPy屏幕坐标 (固定线性映射)
+        """Motive世界坐标 → PsychoPy屏幕坐标 (仿射映射，默认为固定线性映射)
         
         Args:
             x_real: Motive X坐标 (米)
@@ -82,14 +146,14 @@ class TransformManager:
         Returns:
             tuple: (x_screen, y_screen) PsychoPy屏幕像素坐标
         """
-        # 固定线性映射公式
-        x_screen = self.scale_factor * x_real
-        y_screen = self.scale_factor * z_real * self.z_flip  # Z轴翻转
+        a, b, c, d, e, f = self._forward
+        x_screen = a * x_real + b * z_real + c
+        y_screen = d * x_real + e * z_real + f  # 默认映射下 e = S * z_flip（Z轴翻转）
         
         return x_screen, y_screen
     
     def screen_to_real(self, x_screen, y_screen):
-        """PsychoPy屏幕坐标 → Motive世界坐标 (固定线性逆映射)
+        """PsychoPy屏幕坐标 → Motive世界坐标 (仿射逆映射)
         
         Args:
             x_screen: PsychoPy X坐标 (像素)
@@ -98,12 +162,39 @@ class TransformManager:
         Returns:
             tuple: (x_real, z_real) Motive世界坐标 (米)
         """
-        # 固定线性逆映射公式
-        x_real = x_screen / self.scale_factor
-        z_real = (y_screen * self.z_flip) / self.scale_factor  # Z轴翻转
+        a, b, c, d, ox, oy = self._inverse
+        dx, dy = x_screen - ox, y_screen - oy
+        x_real = a * dx + b * dy
+        z_real = c * dx + d * dy
         
         return x_real, z_real
     
+    def real_to_screen_batch(self, points):
+        """批量世界坐标 → 屏幕坐标
+        
+        Args:
+            points: (N, 2) [x, z] 或 (N, 3) [x, y, z] 世界坐标（米）
+            
+        Returns:
+            np.ndarray: (N, 2) 屏幕像素坐标
+        """
+        p = np.asarray(points, dtype=np.float64)
+        if p.shape[-1] == 2:
+            return p @ self.affine[:, [0, 2]].T + self.affine[:, 3]
+        return p @ self.affine[:, :3].T + self.affine[:, 3]
+    
+    def screen_to_real_batch(self, points):
+        """批量屏幕坐标 → 世界坐标
+        
+        Args:
+            points: (N, 2) 屏幕像素坐标
+            
+        Returns:
+            np.ndarray: (N, 2) [x, z] 世界坐标（米）
+        """
+        p = np.asarray(points, dtype=np.float64)
+        return (p - self.affine[:, 3]) @ self.affine_inverse.T
+    
     def generate_wall_markers(self):
         """生成墙面标记点 (A1-D5)"""
         print("📍 正在生成墙面标记...")
@@ -136,18 +227,19 @@ class TransformManager:
                     x = -3.0
                     z = 3.0 - i * marker_spacing
                 
-                # 转换到屏幕坐标
-                screen_x, screen_y = self.real_to_screen(x, z)
-                
                 self.wall_markers[marker_id] = {
                     'id': marker_id,
                     'wall': wall_id,
                     'position': wall_pos,
                     'real_pos': (x, z),
-                    'screen_pos': (screen_x, screen_y),
                     'color': self.wall_colors[wall_id]
                 }
         
+        # 一次性转换到屏幕坐标
+        real_positions = [marker['real_pos'] for marker in self.wall_markers.values()]
+        for marker, screen_pos in zip(self.wall_markers.values(), self.real_to_screen_batch(real_positions)):
+            marker['screen_pos'] = (float(screen_pos[0]), float(screen_pos[1]))
+        
         print(f"✅ 已生成 {len(self.wall_markers)} 个墙面标记")
         return self.wall_markers
     
@@ -156,58 +248,64 @@ class TransformManager:
         生成隐藏目标区域 (P1-P3)
         num_targets: 目标数量
         min_distance: 目标间最小距离
+        
+        泊松圆盘采样（V3.4），约束可满足时总能生成完整布局，不可满足时抛出ValueError
         """
         print("🎯 正在生成隐藏目标...")
         
         target_radius = 0.4  # 隐藏区域半径（米）
         edge_margin = 1.0    # 距离边缘的最小距离
         
-        attempts = 0
-        max_attempts = 100
+        centers = generate_target_layout(num_targets, min_distance, edge_margin,
+                                         room_size=(self.room_width, self.room_height))
         
-        targets = []
+        self.set_hidden_targets(centers, target_radius)
         
-        while len(targets) < num_targets and attempts < max_attempts:
-            attempts += 1
-            
-            # 随机生成位置（世界坐标）
-            x = random.uniform(-3.0 + edge_margin, 3.0 - edge_margin)
-            z = random.uniform(-3.0 + edge_margin, 3.0 - edge_margin)
-            
-            # 检查与已有目标的距离
-            valid = True
-            for existing_target in targets:
-                ex, ez = existing_target['center']
-                distance = ((x - ex)**2 + (z - ez)**2) ** 0.5
-                if distance < min_distance:
-                    valid = False
-                    break
-            
-            if valid:
-                target_id = f"P{len(targets) + 1}"
-                
-                # 转换到屏幕坐标
-                screen_x, screen_y = self.real_to_screen(x, z)
-                screen_radius = target_radius * self.scale_factor
-                
-                targets.append({
-                    'id': target_id,
-                    'center': (x, z),
-                    'radius': target_radius,
-                    'screen_center': (screen_x, screen_y),
-                    'screen_radius': screen_radius
-                })
+        print(f"✅ 已生成 {len(self.hidden_targets)} 个隐藏目标")
+        return self.hidden_targets
+    
+    def set_hidden_targets(self, centers, target_radius=0.4):
+        """按目标中心列表设置隐藏目标（P1, P2, ...），一次性转换屏幕坐标"""
+        self.hidden_targets = {}
+        if len(centers) == 0:
+            return self.hidden_targets
         
-        if len(targets) < num_targets:
-            print(f"⚠️  仅生成了 {len(targets)}/{num_targets} 个目标")
+        screen_centers = self.real_to_screen_batch(centers)
+        screen_radius = target_radius * self.pixel_scale
         
-        # 转换为字典
-        for target in targets:
-            self.hidden_targets[target['id']] = target
+        for i, (center, screen_center) in enumerate(zip(centers, screen_centers)):
+            target_id = f"P{i + 1}"
+            self.hidden_targets[target_id] = {
+                'id': target_id,
+                'center': (float(center[0]), float(center[1])),
+                'radius': target_radius,
+                'screen_center': (float(screen_center[0]), float(screen_center[1])),
+                'screen_radius': screen_radius
+            }
         
-        print(f"✅ 已生成 {len(self.hidden_targets)} 个隐藏目标")
         return self.hidden_targets
     
+    def load_layout_from_library(self, dyad_id, session_id, library=None,
+                                 num_targets=3, min_distance=2.0, edge_margin=1.0):
+        """从预计算布局库中取该dyad/session的隐藏目标布局
+        
+        库不存在，或所取布局与当前房间尺寸/目标数/最小间距/边距不符时返回False（由调用方重新生成）
+        """
+        library = library or LayoutLibrary.load()
+        if library is None:
+            return False
+        
+        layout = library.lookup(dyad_id, session_id, room_size=(self.room_width, self.room_height),
+                                num_targets=num_targets, min_distance=min_distance,
+                                edge_margin=edge_margin)
+        if layout is None:
+            print("⚠️  布局库中的布局与当前约束不符，将重新生成")
+            return False
+        
+        self.set_hidden_targets(layout['centers'], layout['radius'])
+        print(f"✅ 已从布局库取得布局 #{layout['index']}（分层 {layout['stratum']}, 评分 {layout['score']:.2f}）")
+        return True
+    
     def load_scene_layout(self, dyad_id, session_id):
         """加载场景布局配置，如不存在则生成默认布局"""
         try:
@@ -216,10 +314,12 @@ class TransformManager:
             
             if not input_file.exists():
                 print(f"ℹ️  场景布局文件不存在，将生成默认布局: {input_file}")
-                # 生成默认布局
+                # 生成默认布局（优先使用预计算布局库，O(1)查表）
                 self.generate_wall_markers()
-                self.generate_hidden_targets()
+                if not self.load_layout_from_library(dyad_id, session_id):
+                    self.generate_hidden_targets()
                 self.save_scene_layout(dyad_id, session_id)
+                self.build_region_index()
                 return True
             
             with open(input_file, 'r', encoding='utf-8') as f:
@@ -232,6 +332,7 @@ class TransformManager:
                 self.z_flip = params.get('z_flip', -1)
                 self.world_range = params.get('world_range', 6.0)
                 self.screen_range = params.get('screen_range', 1080)
+                self.set_affine(params.get('affine_params'))
             
             self.room_width, self.room_height = layout_data.get('room_size', [6.0, 6.0])
             self.wall_markers = layout_data.get('wall_markers', {})
@@ -241,6 +342,7 @@ class TransformManager:
             print(f"   墙面标记: {len(self.wall_markers)} 个")
             print(f"   隐藏目标: {len(self.hidden_targets)} 个")
             
+            self.build_region_index()
             return True
             
         except Exception as e:
@@ -263,7 +365,8 @@ class TransformManager:
                     'scale_factor': self.scale_factor,
                     'z_flip': self.z_flip,
                     'world_range': self.world_range,
-                    'screen_range': self.screen_range
+                    'screen_range': self.screen_range,
+                    'affine_params': self.affine_params
                 },
                 'wall_markers': self.wall_markers,
                 'hidden_targets': self.hidden_targets
@@ -331,15 +434,15 @@ class TransformManager:
     
     def check_point_in_circle(self, point, center, radius):
         """检查点是否在圆内（碰撞检测）
-        使用屏幕坐标进行计算，确保精度
+        世界坐标在世界坐标中计算，屏幕坐标在屏幕坐标中计算
         """
         # 将点和中心都转换为屏幕坐标进行计算
         if len(point) == 2 and len(center) == 2:
-            # 如果是世界坐标，转换为屏幕坐标
+            # 世界坐标：直接在世界坐标中计算（仿射映射可能含各向异性缩放）
             if abs(point[0]) <= 5 and abs(point[1]) <= 5:  # 判断是否为世界坐标范围
-                screen_point = self.real_to_screen(point[0], point[1])
-                screen_center = self.real_to_screen(center[0], center[1])
-                screen_radius = radius * self.scale_factor
+                screen_point = point
+                screen_center = center
+                screen_radius = radius
             else:
                 # 已经是屏幕坐标
                 screen_point = point
@@ -355,7 +458,7 @@ class TransformManager:
     
     def check_point_near_marker(self, point, marker_id, threshold=1.0):
         """检查点是否靠近墙面标记
-        使用屏幕坐标进行计算，确保精度
+        世界坐标在世界坐标中计算，屏幕坐标在屏幕坐标中计算
         """
         if marker_id not in self.wall_markers:
             return False
@@ -364,14 +467,15 @@ class TransformManager:
         
         # 转换为屏幕坐标进行距离计算
         if len(point) == 2:
-            # 如果是世界坐标，转换为屏幕坐标
+            # 世界坐标：直接在世界坐标中计算（仿射映射可能含各向异性缩放）
             if abs(point[0]) <= 5 and abs(point[1]) <= 5:
-                screen_point = self.real_to_screen(point[0], point[1])
+                screen_point = point
+                screen_marker = marker_pos
+                screen_threshold = threshold
             else:
                 screen_point = point
-            
-            screen_marker = self.real_to_screen(marker_pos[0], marker_pos[1])
-            screen_threshold = threshold * self.scale_factor
+                screen_marker = self.real_to_screen(marker_pos[0], marker_pos[1])
+                screen_threshold = threshold * self.pixel_scale
             
             px, py = screen_point
             mx, my = screen_marker
@@ -379,4 +483,56 @@ class TransformManager:
             distance = ((px - mx)**2 + (py - my)**2) ** 0.5
             return distance <= screen_threshold
         
-        return False
\ No newline at end of file
+        return False
+    
+    def build_geofence_regions(self, marker_threshold=1.0, wall_band_width=0.5):
+        """根据当前布局生成围栏区域（世界坐标，供采集线程逐帧评估）
+        
+        Args:
+            marker_threshold: 墙面标记到达半径（米），与check_point_near_marker的threshold一致
+            wall_band_width: 墙面带宽度（米），每面墙一个BandRegion，ID为Wall_A等
+            
+        Returns:
+            dict: {区域ID: 区域对象}
+        """
+        regions = {}
+        
+        for marker_id, marker in self.wall_markers.items():
+            regions[marker_id] = CircleRegion(marker_id, marker['real_pos'], marker_threshold)
+        
+        for target_id, target in self.hidden_targets.items():
+            regions[target_id] = CircleRegion(target_id, target['center'], target['radius'])
+        
+        # 墙面带：沿墙内侧，宽wall_band_width
+        half_x, half_z = self.room_width / 2.0, self.room_height / 2.0
+        inset = wall_band_width / 2.0
+        walls = {
+            'A': ((-half_x, -half_z + inset), (half_x, -half_z + inset)),  # 下墙
+            'B': ((half_x - inset, -half_z), (half_x - inset, half_z)),    # 右墙
+            'C': ((half_x, half_z - inset), (-half_x, half_z - inset)),    # 上墙
+            'D': ((-half_x + inset, half_z), (-half_x + inset, -half_z))   # 左墙
+        }
+        for wall_id, (start, end) in walls.items():
+            region_id = f"Wall_{wall_id}"
+            regions[region_id] = BandRegion(region_id, start, end, inset)
+        
+        return regions
+    
+    def build_region_index(self, cell_size=0.5, marker_threshold=1.0):
+        """对当前布局的所有区域建立均匀网格索引（布局变化后需重新调用）"""
+        regions = self.build_geofence_regions(marker_threshold=marker_threshold)
+        self.region_index = RegionGridIndex(regions.values(), cell_size=cell_size)
+        return self.region_index
+    
+    def find_regions(self, points):
+        """一次查询多个点所在的区域
+        
+        Args:
+            points: [(x, z), ...] 世界坐标（米），如多名被试的当前位置
+            
+        Returns:
+            list: 每个点所在区域ID列表（墙面标记邻域、隐藏目标、Wall_A等墙面带）
+        """
+        if self.region_index is None:
+            self.build_region_index()
+        return self.region_index.query(points)
@@ -0,0 +1,82 @@
+"""
+试次状态机 (V3.4)
+地图学习与导航测量共用的非阻塞试次流程：整个Block由一个帧循环驱动，
+每帧调用 step() 执行当前状态的处理函数，计时状态使用截止时刻而非 time.sleep，
+渲染、按键处理和位置记录在所有状态下都保持满帧率
+
+状态流转：
+    go_cue -> navigating -> arrived -> searching -> found_hold -> iti -> go_cue ... -> done
+    navigating超时直接进入searching；searching超时直接结束试次进入iti
+"""
+
+import time
+import logging
+
+
+# ========== 状态常量 ==========
+STATE_IDLE = 'idle'
+STATE_GO_CUE = 'go_cue'            # 播放前往墙面标记指令（一帧）
+STATE_NAVIGATING = 'navigating'    # 前往墙面标记（超时截止）
+STATE_ARRIVED = 'arrived'          # 已到达墙面标记
+STATE_SEARCHING = 'searching'      # 搜索隐藏目标（超时截止）
+STATE_FOUND_HOLD = 'found_hold'    # 找到目标后保持高亮
+STATE_ITI = 'iti'                  # 试次间隔
+STATE_DONE = 'done'
+
+# ========== 时长常量（秒） ==========
+GO_CUE_DURATION = 0.0
+NAVIGATE_TIMEOUT = 30.0
+ARRIVED_HOLD = 0.0
+SEARCH_TIMEOUT = 45.0
+FOUND_HOLD = 2.0
+ITI_DURATION = 3.0
+
+
+class TrialStateMachine:
+    """基于截止时刻的试次状态机"""
+
+    def __init__(self, handlers, clock=time.perf_counter):
+        """
+        Args:
+            handlers: {状态: 处理函数}，每帧调用当前状态的处理函数（无处理函数的状态不做任何事）
+            clock: 单调时钟（秒）
+        """
+        self.logger = logging.getLogger('TrialStateMachine')
+        self.handlers = handlers
+        self.clock = clock
+
+        self.state = STATE_IDLE
+        self.entered_at = None
+        self.deadline = None
+        self.transitions = 0
+
+    @property
+    def done(self):
+        return self.state == STATE_DONE
+
+    def enter(self, state, duration=None):
+        """进入状态
+
+        Args:
+            duration: 状态时长/超时（秒），None表示无截止时刻
+        """
+        now = self.clock()
+        self.logger.debug(f"{self.state} -> {state}")
+        self.state = state
+        self.entered_at = now
+        self.deadline = now + duration if duration is not None else None
+        self.transitions += 1
+
+    def expired(self):
+        """当前状态是否已到截止时刻"""
+        return self.deadline is not None and self.clock() >= self.deadline
+
+    def elapsed(self):
+        """进入当前状态后经过的时间（秒）"""
+        return self.clock() - self.entered_at if self.entered_at is not None else 0.0
+
+    def step(self):
+        """执行当前状态的处理函数（每帧调用一次）"""
+        handler = self.handlers.get(self.state)
+        if handler:
+            handler()
@@ -13,9 +13,17 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from psychopy import visual, core, event, gui
 from Core.lsl_manager import LSLManager
+from Core.ingest_service import IngestServiceClient
 from Core.transform_manager import TransformManager
+from Core.geofence import EVENT_ENTER
+from Core.scene_layer import SceneLayer
+from Core.trial_state import (TrialStateMachine, STATE_GO_CUE, STATE_NAVIGATING, STATE_ARRIVED,
+                              STATE_SEARCHING, STATE_FOUND_HOLD, STATE_ITI, STATE_DONE,
+                              GO_CUE_DURATION, NAVIGATE_TIMEOUT, ARRIVED_HOLD, SEARCH_TIMEOUT,
+                              FOUND_HOLD, ITI_DURATION)
 from Core.audio_manager import AudioManager
 from Utils.data_logger import DataLogger
+from Utils.frame_timing import FrameTimingRecorder
 import json
 import random
 import time
@@ -27,6 +35,18 @@ from pathlib import Path
 BEHAVIOR_DIR = str(Path(__file__).parent.parent.parent / 'Data' / 'Behavior')
 LOGS_DIR = str(Path(__file__).parent.parent.parent / 'Logs')
 
+# ========== 运行模式常量 ==========
+# True: NatNet接收/LSL广播/CSV保存运行在独立采集进程，位置通过共享内存读取
+USE_INGEST_PROCESS = False
+# 位置滤波器（'one_euro'/'kalman'/None）；启用后位置判定使用滤波位置，LSL位置流附带滤波通道
+POSE_FILTER = None
+# 帧节拍模式：每帧先等待新位置（采集线程通知）或翻转截止时刻，无新位置时不重新读取位置
+FRAME_PACING = False
+PACING_DRAW_MARGIN = 0.004       # 翻转截止前预留的绘制时间（秒）
+DEFAULT_REFRESH_INTERVAL = 1.0 / 60.0  # 未测得刷新率时的帧间隔（秒）
+# Position.csv按NatNet帧率在采集线程记录（采集在独立进程时自动退回渲染循环按帧记录）
+NATIVE_POSITION_LOG = True
+
 # 配置日志
 log_dir = Path(LOGS_DIR)
 log_dir.mkdir(exist_ok=True)
@@ -56,10 +76,11 @@ class MapLearningSystem:
         self.trial_num = 20  # 默认试次数
         
         # 初始化模块
-        self.lsl_manager = LSLManager()
+        self.lsl_manager = IngestServiceClient() if USE_INGEST_PROCESS else LSLManager()
         self.transform_manager = TransformManager()
         self.audio_manager = AudioManager()
         self.data_logger = None
+        self.frame_timer = FrameTimingRecorder()  # 逐帧翻转时序（每试次汇总）
         
         # 窗口配置
         self.win = None
@@ -69,19 +90,40 @@ class MapLearningSystem:
         # 标记和目标
         self.wall_markers = {}
         self.hidden_targets = {}
+        self.geofence_regions = {}  # {区域ID: 围栏区域}，采集线程逐帧评估到达
+        
+        # 可视化对象（保留模式场景层，刺激只创建一次）
+        self.scene = None
         
-        # 可视化对象
-        self.marker_stims = {}
-        self.target_stims = {}
-        self.participant_dot = None
+        # 窗口与场景的创建函数（无界面运行时替换为空窗口/空场景，见Tools/headless_runner.py）
+        self.window_factory = visual.Window
+        self.scene_factory = SceneLayer
         
         # 实验时钟
         self.exp_clock = None
         
+        # 试次流程（非阻塞状态机，见Core/trial_state.py）
+        self.trial_flow = None
+        self.current_trial = 0
+        self.wall_marker = None
+        self.hidden_target = None
+        self.wall_marker_list = []
+        self.target_list = []
+        self.trial_data = {}
+        self.trial_start_time = None
+        self.marker_success = False
+        self.target_success = False
+        
         # 鲁棒性处理
         self.last_valid_position = None
         self.position_lost_time = None
         self.max_position_loss = 2.0  # 最大位置丢失时间（秒）
+        
+        # 位置去重与帧节拍
+        self.logged_pose_time = None  # 已记录位置的采集时间戳（同一位置只记录一次）
+        self.native_position_log = False  # Position.csv由采集线程记录（渲染循环不再记录位置）
+        self.pose_sequence = 0  # 已读取的位置更新序号
+        self.last_flip_time = None
     
     def collect_info(self):
         """收集实验信息（单人GUI）"""
@@ -131,7 +173,8 @@ class MapLearningSystem:
         
         # 启动LSL/NatNet服务（启用OptiTrack位置LSL广播）
         print("\n🚀 启动LSL/NatNet服务...")
-        if not self.lsl_manager.start_services(enable_position_broadcast=True, sub_ids=['001', '002']):
+        if not self.lsl_manager.start_services(enable_position_broadcast=True, sub_ids=['001', '002'],
+                                                 pose_filter=POSE_FILTER):
             print("❌ LSL/NatNet服务启动失败")
             return False
         
@@ -155,6 +198,7 @@ class MapLearningSystem:
         # 获取场景数据
         self.wall_markers = self.transform_manager.wall_markers
         self.hidden_targets = self.transform_manager.hidden_targets
+        self.geofence_regions = self.transform_manager.build_geofence_regions(marker_threshold=1.0)
         
         # 初始化数据记录器
         print(f"\n📊 初始化数据记录器...")
@@ -165,6 +209,18 @@ class MapLearningSystem:
             print("❌ 数据记录器初始化失败")
             return False
         
+        # 位置按NatNet帧率记录（每帧、采集时间戳、Motive帧号）
+        if NATIVE_POSITION_LOG:
+            self.native_position_log = self.data_logger.start_native_position_logging([{
+                'names': [f"Sub{self.sub_id}", f"Skeleton_{self.dyad_id}", f"Skeleton_{int(self.sub_id)}"],
+                'sub_id': self.sub_id,
+                'sub_role': self.sub_role,
+                'phase': 0,
+                'session': self.session_id,
+                'block': 1,
+                'is_navigation': 1  # Phase 0时恒为1
+            }], self.transform_manager.real_to_screen, screen_limit=540)
+        
         # 加载音频
         print(f"\n🔊 加载音频文件...")
         if not self.audio_manager.load_all_audios():
@@ -172,7 +228,7 @@ class MapLearningSystem:
         
         # 创建PsychoPy窗口
         print(f"\n🖥️  创建显示窗口...")
-        self.win = visual.Window(
+        self.win = self.window_factory(
             size=self.window_size,
             units='pix',
             fullscr=False,
@@ -182,16 +238,6 @@ class MapLearningSystem:
             useFBO=True
         )
         
-        # 预创建场景元素（性能优化：避免每帧创建）
-        self.scene_border = visual.Rect(
-            self.win,
-            width=1080,
-            height=1080,
-            lineColor=[0.5, 0.5, 0.5],
-            lineWidth=3,
-            fillColor=None
-        )
-        
         # 隐藏鼠标指针
         self.win.mouseVisible = False
         
@@ -201,82 +247,26 @@ class MapLearningSystem:
         # 创建可视化对象
         self.create_visual_objects()
         
+        # 帧时序记录（与Behavior.csv同目录）
+        frame_rate = self.win.getActualFrameRate(nIdentical=30, nMaxFrames=120, nWarmUpFrames=10)
+        self.frame_timer.open(self.data_logger.file_prefix,
+                              refresh_interval=1.0 / frame_rate if frame_rate else None)
+        
         print("✅ 系统初始化完成")
         return True
     
     def create_visual_objects(self):
-        """创建可视化对象"""
+        """创建可视化对象（场景元素、光点、文本均只创建一次）"""
         try:
-            # 创建参与者光点（单人模拟人）
-            self.participant_dot = visual.Circle(
-                self.win,
-                radius=20,
-                fillColor='#FF69B4',  # 亮粉色
-                lineColor=[0, 0, 0],
-                lineWidth=2,
-                pos=(0, 0)
-            )
+            self.scene = self.scene_factory(self.win)
+            self.scene.build(self.wall_markers, self.hidden_targets)
             
-            # 创建墙面标记
-            for marker_id, marker_data in self.wall_markers.items():
-                screen_pos = marker_data['screen_pos']
-                color = marker_data['color']
-                
-                marker_circle = visual.Circle(
-                    self.win,
-                    radius=12,
-                    fillColor=color,
-                    lineColor=[1, 1, 1],
-                    lineWidth=2,
-                    pos=screen_pos
-                )
-                
-                marker_text = visual.TextStim(
-                    self.win,
-                    text=marker_id,
-                    color=[1, 1, 1],
-                    height=20,
-                    pos=(screen_pos[0], screen_pos[1] - 25)
-                )
-                
-                self.marker_stims[marker_id] = {
-                    'circle': marker_circle,
-                    'text': marker_text,
-                    'data': marker_data
-                }
-            
-            # 创建隐藏目标区域（可见圆圈）
-            for target_id, target_data in self.hidden_targets.items():
-                screen_pos = target_data['screen_center']
-                screen_radius = target_data['screen_radius']
-                
-                # 创建目标圆圈
-                target_circle = visual.Circle(
-                    self.win,
-                    radius=screen_radius,
-                    fillColor=None,
-                    lineColor=[1, 1, 1],  # 灰色边框
-                    lineWidth=3,
-                    pos=screen_pos
-                )
-                
-                # 创建目标标签
-                target_text = visual.TextStim(
-                    self.win,
-                    text=target_id,
-                    color=[0.7, 0.7, 0.7],
-                    height=25,
-                    pos=screen_pos
-                )
-                
-                self.target_stims[target_id] = {
-                    'circle': target_circle,
-                    'text': target_text,
-                    'data': target_data,
-                    'status': 'normal'  # normal, searching, found
-                }
+            # 创建参与者光点（单人模拟人）
+            self.scene.add_dot('participant', fill_color='#FF69B4', line_color=[0, 0, 0])  # 亮粉色
             
-            print(f"✅ 可视化对象已创建: {len(self.marker_stims)}个标记, {len(self.target_stims)}个目标")
+            # 信息文本
+            self.scene.add_text('info', f"Phase 0 - 认知地图学习\n参与者: {self.sub_id} ({self.sub_role})",
+                                pos=(0, 450))
             
         except Exception as e:
             self.logger.error(f"创建可视化对象错误: {e}")
@@ -294,7 +284,7 @@ class MapLearningSystem:
             
             skeleton_data = None
             for skeleton_name in skeleton_names:
-                skeleton_data = self.lsl_manager.get_latest_skeleton_data(skeleton_name)
+                skeleton_data = self.lsl_manager.get_latest_skeleton_data(skeleton_name, filtered=POSE_FILTER is not None)
                 if skeleton_data and skeleton_data['valid']:
                     break
             
@@ -310,7 +300,7 @@ class MapLearningSystem:
                 y_screen = max(-540, min(540, y_screen))
                 
                 # 更新光点位置
-                self.participant_dot.pos = (x_screen, y_screen)
+                self.scene.set_dot_pos('participant', (x_screen, y_screen))
                 
                 # 保存有效位置
                 self.last_valid_position = {
@@ -322,19 +312,21 @@ class MapLearningSystem:
                 }
                 self.position_lost_time = None
                 
-                # 记录位置数据
-                self.data_logger.log_position({
-                    'sub_id': self.sub_id,
-                    'sub_role': self.sub_role,
-                    'phase': 0,
-                    'session': self.session_id,
-                    'block': 1,
-                    'is_navigation': 1,  # Phase 0时恒为1
-                    'raw_x': x_real,
-                    'raw_y': z_real,
-                    'pos_x': x_screen,
-                    'pos_y': y_screen
-                })
+                # 记录位置数据（未由采集线程记录时；同一采集帧只记录一次）
+                if not self.native_position_log and skeleton_data['timestamp'] != self.logged_pose_time:
+                    self.logged_pose_time = skeleton_data['timestamp']
+                    self.data_logger.log_position({
+                        'sub_id': self.sub_id,
+                        'sub_role': self.sub_role,
+                        'phase': 0,
+                        'session': self.session_id,
+                        'block': 1,
+                        'is_navigation': 1,  # Phase 0时恒为1
+                        'raw_x': x_real,
+                        'raw_y': z_real,
+                        'pos_x': x_screen,
+                        'pos_y': y_screen
+                    })
                 
                 return True
                 
@@ -347,10 +339,10 @@ class MapLearningSystem:
                 if current_time - self.position_lost_time > self.max_position_loss:
                     # 长时间丢失：光点保持静止在最后有效位置
                     if self.last_valid_position:
-                        self.participant_dot.pos = (
+                        self.scene.set_dot_pos('participant', (
                             self.last_valid_position['x_screen'],
                             self.last_valid_position['y_screen']
-                        )
+                        ))
                 
                 return False
                 
@@ -359,65 +351,16 @@ class MapLearningSystem:
             return False
     
     def draw_scene(self, highlight_marker=None, highlight_target=None):
-        """绘制场景"""
+        """绘制场景（仅高亮/状态改变时更新刺激属性）"""
         try:
-            # 绘制边框（使用预创建的对象）
-            if hasattr(self, 'scene_border'):
-                self.scene_border.draw()
-            
-            # 绘制墙面标记
-            for marker_id, marker_stim in self.marker_stims.items():
-                if marker_id == highlight_marker:
-                    # 高亮显示
-                    marker_stim['circle'].fillColor = '#00FFFF'  # 青色高亮
-                else:
-                    # 正常颜色
-                    marker_stim['circle'].fillColor = marker_stim['data']['color']
-                
-                marker_stim['circle'].draw()
-                marker_stim['text'].draw()
-            
-            # 绘制隐藏目标区域
-            for target_id, target_stim in self.target_stims.items():
-                if target_id == highlight_target:
-                    if target_stim['status'] == 'found':
-                        # 找到时：绿色高亮
-                        target_stim['circle'].lineColor = [0, 1, 0]  # 绿色边框
-                        target_stim['circle'].fillColor = [0, 1, 0, 0.3]  # 半透明绿色填充
-                        target_stim['text'].color = [0, 1, 0]
-                    else:
-                        # 搜索时：黄色高亮
-                        target_stim['circle'].lineColor = [1, 1, 0]  # 黄色边框
-                        target_stim['circle'].fillColor = [1, 1, 0, 0.2]  # 半透明黄色填充
-                        target_stim['text'].color = [1, 1, 0]
-                else:
-                    # 正常状态：灰色
-                    target_stim['circle'].lineColor = [0.5, 0.5, 0.5]
-                    target_stim['circle'].fillColor = None
-                    target_stim['text'].color = [0.7, 0.7, 0.7]
-                
-                target_stim['circle'].draw()
-                target_stim['text'].draw()
-            
-            # 绘制参与者光点
-            if self.participant_dot:
-                self.participant_dot.draw()
-            
-            # 绘制信息文本
-            info_text = visual.TextStim(
-                self.win,
-                text=f"Phase 0 - 认知地图学习\n参与者: {self.sub_id} ({self.sub_role})",
-                color=[1, 1, 1],
-                height=25,
-                pos=(0, 450)
-            )
-            info_text.draw()
+            self.scene.set_highlight(marker=highlight_marker, target=highlight_target)
+            self.scene.draw()
             
         except Exception as e:
             self.logger.error(f"绘制场景错误: {e}")
     
     def run_learning_phase(self):
-        """运行学习阶段"""
+        """运行学习阶段（单一帧循环驱动试次状态机，所有状态下保持渲染与位置记录）"""
         print(f"\n" + "=" * 60)
         print(f"开始学习阶段 - 参与者{self.sub_role}")
         print("=" * 60)
@@ -429,27 +372,44 @@ class MapLearningSystem:
         self.data_logger.log_marker(1, "Trial开始", phase="0")
         
         # 获取墙面标记和隐藏目标列表
-        wall_marker_list = list(self.wall_markers.keys())
-        target_list = list(self.hidden_targets.keys())
+        self.wall_marker_list = list(self.wall_markers.keys())
+        self.target_list = list(self.hidden_targets.keys())
         
         # 随机化顺序
-        random.shuffle(wall_marker_list)
-        random.shuffle(target_list)
-        
-        for trial in range(1, self.trial_num + 1):
-            print(f"\n--- Trial {trial}/{self.trial_num} ---")
-            
-            # 选择墙面标记和隐藏目标
-            wall_marker = wall_marker_list[(trial - 1) % len(wall_marker_list)]
-            hidden_target = target_list[(trial - 1) % len(target_list)]
+        random.shuffle(self.wall_marker_list)
+        random.shuffle(self.target_list)
+        
+        self.trial_flow = TrialStateMachine({
+            STATE_GO_CUE: self.step_go_cue,
+            STATE_NAVIGATING: self.step_navigating,
+            STATE_ARRIVED: self.step_arrived,
+            STATE_SEARCHING: self.step_searching,
+            STATE_FOUND_HOLD: self.step_found_hold,
+            STATE_ITI: self.step_iti,
+        }, clock=self.exp_clock.getTime)
+        self.current_trial = 0
+        self.start_trial()
+        
+        while not self.trial_flow.done:
+            # 更新参与者位置（帧节拍模式下先等待新位置或翻转截止时刻，无新位置时跳过）
+            new_pose = self.wait_for_frame() if FRAME_PACING else True
+            self.frame_timer.frame_start()
+            if new_pose:
+                self.update_participant_position()
+            self.frame_timer.position_read()
+            
+            # 推进试次状态
+            self.step_trial()
             
-            trial_success = self.run_trial(trial, wall_marker, hidden_target)
-            
-            if not trial_success:
-                print(f"⚠️  Trial {trial} 未完成")
+            # 绘制场景
+            self.draw_scene(**self.current_highlight())
+            self.frame_timer.drawn()
+            self.win.flip()
+            self.last_flip_time = time.perf_counter()
+            self.frame_timer.flipped()
             
-            # Trial间隔
-            time.sleep(3.0)
+            # 检查ESC退出
+            self.check_escape()
         
         # 播放结束提示
         self.audio_manager.play_common('end')
@@ -459,175 +419,208 @@ class MapLearningSystem:
         
         print(f"\n✅ 参与者{self.sub_role} 学习完成")
     
-    def run_trial(self, trial_num, wall_marker, hidden_target):
-        """运行单个试次"""
+    def wait_for_frame(self):
+        """(帧节拍模式) 等待新位置或本帧翻转截止时刻（期间线程挂起，不空转）
+        
+        Returns:
+            bool: 是否有新位置
+        """
+        timeout = (self.frame_timer.refresh_interval or DEFAULT_REFRESH_INTERVAL) - PACING_DRAW_MARGIN
+        if self.last_flip_time is not None:
+            timeout -= time.perf_counter() - self.last_flip_time
+        sequence = self.lsl_manager.wait_for_pose(self.pose_sequence, timeout)
+        new_pose = sequence != self.pose_sequence
+        self.pose_sequence = sequence
+        return new_pose
+    
+    def step_trial(self):
+        """执行当前状态（出错时结束该试次，进入试次间隔）"""
         try:
-            print(f"   墙面标记: {wall_marker}")
-            print(f"   隐藏目标: {hidden_target}")
-            
-            trial_start_time = self.exp_clock.getTime()
-            
-            # 记录Trial数据
-            trial_data = {
-                'sub_id': self.sub_id,
-                'sub_role': self.sub_role,
-                'phase': 0,
-                'session': self.session_id,
-                'block': 1,
-                'is_navigation': 1,
-                'trial': trial_num,
-                'wall_marker': wall_marker,
-                'target': hidden_target
-            }
-            
-            # 记录任务开始时间
-            trial_data['Time_Wall_go'] = trial_start_time  # 开始前往墙标的时间
-            
-            # 第一阶段：导航到墙面标记
-            marker_success = self.navigate_to_wall_marker(wall_marker, trial_num)
-            if marker_success:
-                trial_data['Time_Wall_arrive'] = self.exp_clock.getTime()  # 修正字段名
-                trial_data['RT_WallMarker'] = trial_data['Time_Wall_arrive'] - trial_start_time  # 修正字段名
-            
-            # 记录开始搜索目标的时间
-            if marker_success:
-                trial_data['Time_Target_go'] = self.exp_clock.getTime()  # 开始寻找目标的时间
-                trial_data['Target_position'] = f"{self.hidden_targets[hidden_target]['real_pos'][0]:.3f},{self.hidden_targets[hidden_target]['real_pos'][1]:.3f}"  # 目标位置
-            
-            # 第二阶段：搜索隐藏目标
-            target_success = self.search_hidden_target(hidden_target, trial_num)
-            if target_success:
-                trial_data['Time_Target_arrive'] = self.exp_clock.getTime()  # 修正字段名
-                trial_data['RT_Target'] = trial_data['Time_Target_arrive'] - trial_data.get('Time_Target_go', trial_start_time)  # 修正字段名
-            
-            # 记录行为数据
-            self.data_logger.log_behavior(trial_data)
-            
-            success = marker_success and target_success
-            print(f"   结果: {'成功' if success else '失败'}")
-            
-            return success
-            
+            self.trial_flow.step()
         except Exception as e:
-            self.logger.error(f"Trial {trial_num} 执行错误: {e}")
-            return False
+            self.logger.error(f"Trial {self.current_trial} 执行错误: {e}")
+            self.lsl_manager.clear_geofences()
+            self.frame_timer.end_trial()
+            self.lsl_manager.set_trial_context(None, phase="0")
+            self.trial_flow.enter(STATE_ITI, ITI_DURATION)
     
-    def navigate_to_wall_marker(self, marker_id, trial_num):
-        """导航到墙面标记"""
-        print(f"   → 前往墙面标记: {marker_id}")
-        
-        # 播放音频
-        self.audio_manager.play_wallmarker_go(marker_id)
-        
-        # 获取标记信息
-        marker_data = self.wall_markers[marker_id]
-        marker_pos = marker_data['real_pos']
-        
-        # 等待到达
-        arrived = False
-        timeout = 30.0
-        start_time = time.time()
-        
-        while not arrived and (time.time() - start_time < timeout):
-            # 更新参与者位置
-            position_valid = self.update_participant_position()
+    def current_highlight(self):
+        """当前状态下的高亮元素"""
+        state = self.trial_flow.state
+        if state in (STATE_GO_CUE, STATE_NAVIGATING, STATE_ARRIVED):
+            return {'highlight_marker': self.wall_marker}
+        if state in (STATE_SEARCHING, STATE_FOUND_HOLD):
+            return {'highlight_target': self.hidden_target}
+        return {}
+    
+    def start_trial(self):
+        """开始下一个试次（已完成全部试次时结束）"""
+        self.current_trial += 1
+        trial_num = self.current_trial
+        if trial_num > self.trial_num:
+            self.trial_flow.enter(STATE_DONE)
+            return
+        
+        print(f"\n--- Trial {trial_num}/{self.trial_num} ---")
+        
+        # 选择墙面标记和隐藏目标
+        self.wall_marker = self.wall_marker_list[(trial_num - 1) % len(self.wall_marker_list)]
+        self.hidden_target = self.target_list[(trial_num - 1) % len(self.target_list)]
+        print(f"   墙面标记: {self.wall_marker}")
+        print(f"   隐藏目标: {self.hidden_target}")
+        
+        # 标记质量监测与帧时序按试次统计
+        self.lsl_manager.set_trial_context(trial_num, phase="0")
+        self.frame_timer.begin_trial(trial_num, 0)
+        
+        self.trial_start_time = self.exp_clock.getTime()
+        self.marker_success = False
+        self.target_success = False
+        
+        # 记录Trial数据
+        self.trial_data = {
+            'sub_id': self.sub_id,
+            'sub_role': self.sub_role,
+            'phase': 0,
+            'session': self.session_id,
+            'block': 1,
+            'is_navigation': 1,
+            'trial': trial_num,
+            'wall_marker': self.wall_marker,
+            'target': self.hidden_target,
+            'time_wall_go': self.trial_start_time  # 开始前往墙标的时间
+        }
+        
+        # 前往墙面标记指令（到达判定由采集线程逐帧评估围栏）
+        print(f"   → 前往墙面标记: {self.wall_marker}")
+        self.audio_manager.play_wallmarker_go(self.wall_marker)
+        self.arm_geofence(self.wall_marker)
+        self.trial_flow.enter(STATE_GO_CUE, GO_CUE_DURATION)
+    
+    def step_go_cue(self):
+        if self.trial_flow.expired():
+            self.trial_flow.enter(STATE_NAVIGATING, NAVIGATE_TIMEOUT)
+    
+    def step_navigating(self):
+        """检测是否到达墙面标记"""
+        geo_event = self.poll_geofence_entry(self.wall_marker)
+        if geo_event:
+            print(f"   ✅ 到达墙面标记: {self.wall_marker}")
             
-            if position_valid and self.last_valid_position:
-                # 检测是否到达标记
-                current_pos = (self.last_valid_position['x_real'], self.last_valid_position['z_real'])
-                if self.transform_manager.check_point_near_marker(current_pos, marker_id, threshold=1.0):
-                    arrived = True
-                    print(f"   ✅ 到达墙面标记: {marker_id}")
-                    
-                    # 播放到达音频
-                    self.audio_manager.play_wallmarker_arrive(marker_id)
-                    
-                    # 发送LSL Marker
-                    self.data_logger.log_marker(2, "到达墙面标记", trial=str(trial_num), phase="0")
+            # 播放到达音频
+            self.audio_manager.play_wallmarker_arrive(self.wall_marker)
             
-            # 绘制场景
-            self.draw_scene(highlight_marker=marker_id)
-            self.win.flip()
+            # 发送LSL Marker（时间戳为屏幕翻转时刻，Event_Timestamp为越界帧的采集时刻）
+            self.data_logger.log_marker_on_flip(self.win, 2, "到达墙面标记", trial=str(self.current_trial),
+                                                phase="0", event_time=geo_event['timestamp'])
             
-            # 检查ESC退出
-            keys = event.getKeys(['escape'])
-            if 'escape' in keys:
-                print("\n⚠️  用户按ESC键，立即退出程序...")
-                self.cleanup()
-                import sys
-                sys.exit(0)
-        
-        if not arrived:
-            print(f"   ⏱️  超时，未到达墙面标记")
+            self.marker_success = True
+            self.trial_data['time_wall_arrive'] = self.exp_clock.getTime()
+            self.trial_data['rt_wallmarker'] = self.trial_data['time_wall_arrive'] - self.trial_start_time
+            self.trial_flow.enter(STATE_ARRIVED, ARRIVED_HOLD)
         
-        return arrived
+        elif self.trial_flow.expired():
+            print(f"   ⏱️  超时，未到达墙面标记")
+            self.start_search()
     
-    def search_hidden_target(self, target_id, trial_num):
-        """搜索隐藏目标"""
+    def step_arrived(self):
+        if self.trial_flow.expired():
+            self.start_search()
+    
+    def start_search(self):
+        """开始搜索隐藏目标"""
+        target_id = self.hidden_target
         print(f"   → 搜索隐藏目标: {target_id}")
         
+        # 记录开始搜索目标的时间
+        if self.marker_success:
+            target_center = self.hidden_targets[target_id]['center']
+            self.trial_data['time_target_go'] = self.exp_clock.getTime()
+            self.trial_data['target_position'] = f"{target_center[0]:.3f},{target_center[1]:.3f}"
+        
         # 设置目标状态为搜索中
-        if target_id in self.target_stims:
-            self.target_stims[target_id]['status'] = 'searching'
+        self.scene.set_target_status(target_id, 'searching')
         
-        # 播放音频
+        # 播放音频（进入判定由采集线程逐帧评估围栏）
         self.audio_manager.play_target_go(target_id)
-        
-        # 获取目标信息
-        target_data = self.hidden_targets[target_id]
-        target_center = target_data['center']
-        target_radius = target_data['radius']
-        
-        # 等待找到
-        found = False
-        timeout = 45.0
-        start_time = time.time()
-        
-        while not found and (time.time() - start_time < timeout):
-            # 更新参与者位置
-            position_valid = self.update_participant_position()
+        self.arm_geofence(target_id)
+        self.trial_flow.enter(STATE_SEARCHING, SEARCH_TIMEOUT)
+    
+    def step_searching(self):
+        """检测是否进入目标区域"""
+        target_id = self.hidden_target
+        geo_event = self.poll_geofence_entry(target_id)
+        if geo_event:
+            # 更新目标状态为已找到
+            self.scene.set_target_status(target_id, 'found')
             
-            if position_valid and self.last_valid_position:
-                # 检测是否进入目标区域
-                current_pos = (self.last_valid_position['x_real'], self.last_valid_position['z_real'])
-                if self.transform_manager.check_point_in_circle(current_pos, target_center, target_radius):
-                    found = True
-                    
-                    # 更新目标状态为已找到
-                    if target_id in self.target_stims:
-                        self.target_stims[target_id]['status'] = 'found'
-                    
-                    print(f"   ✅ 找到隐藏目标: {target_id} - 目标区域高亮为绿色！")
-                    
-                    # 播放找到音频
-                    self.audio_manager.play_target_arrive(target_id)
-                    
-                    # 发送LSL Marker
-                    self.data_logger.log_marker(4, "找到隐藏目标", trial=str(trial_num), phase="0")
-                    
-                    # 等待2秒后再继续下一个指令（给予反应时间）
-                    print(f"   ⏳ 等待2秒后继续...")
-                    time.sleep(2.0)
+            print(f"   ✅ 找到隐藏目标: {target_id} - 目标区域高亮为绿色！")
             
-            # 绘制场景（高亮当前搜索的目标）
-            self.draw_scene(highlight_target=target_id)
-            self.win.flip()
+            # 播放找到音频
+            self.audio_manager.play_target_arrive(target_id)
             
-            # 检查ESC退出
-            keys = event.getKeys(['escape'])
-            if 'escape' in keys:
-                print("\n⚠️  用户按ESC键，立即退出程序...")
-                self.cleanup()
-                import sys
-                sys.exit(0)
-        
-        if not found:
+            # 发送LSL Marker（时间戳为屏幕翻转时刻，Event_Timestamp为越界帧的采集时刻）
+            self.data_logger.log_marker_on_flip(self.win, 4, "找到隐藏目标", trial=str(self.current_trial),
+                                                phase="0", event_time=geo_event['timestamp'])
+            
+            self.target_success = True
+            self.trial_data['time_target_arrive'] = self.exp_clock.getTime()
+            self.trial_data['rt_target'] = self.trial_data['time_target_arrive'] - self.trial_data.get('time_target_go', self.trial_start_time)
+            
+            # 保持高亮后再继续下一个指令（给予反应时间，期间照常渲染和记录）
+            print(f"   ⏳ 等待{FOUND_HOLD:g}秒后继续...")
+            self.trial_flow.enter(STATE_FOUND_HOLD, FOUND_HOLD)
+        
+        elif self.trial_flow.expired():
             print(f"   ⏱️  超时，未找到隐藏目标")
             # 重置目标状态
-            if target_id in self.target_stims:
-                self.target_stims[target_id]['status'] = 'normal'
+            self.scene.set_target_status(target_id, 'normal')
+            self.finish_trial()
+    
+    def step_found_hold(self):
+        if self.trial_flow.expired():
+            self.finish_trial()
+    
+    def finish_trial(self):
+        """记录行为数据并进入试次间隔"""
+        self.lsl_manager.clear_geofences()
+        
+        # 记录行为数据
+        self.data_logger.log_behavior(self.trial_data)
+        
+        success = self.marker_success and self.target_success
+        print(f"   结果: {'成功' if success else '失败'}")
+        if not success:
+            print(f"⚠️  Trial {self.current_trial} 未完成")
+        
+        self.frame_timer.end_trial()
+        self.data_logger.flush(fsync=True)  # 试次边界落盘（由写入线程执行）
+        self.lsl_manager.set_trial_context(None, phase="0")
         
-        return found
+        # Trial间隔
+        self.trial_flow.enter(STATE_ITI, ITI_DURATION)
+    
+    def step_iti(self):
+        if self.trial_flow.expired():
+            self.start_trial()
+    
+    def check_escape(self):
+        """检查ESC退出"""
+        if 'escape' in event.getKeys(['escape']):
+            print("\n⚠️  用户按ESC键，立即退出程序...")
+            self.cleanup()
+            sys.exit(0)
+    
+    def arm_geofence(self, region_id):
+        """设置导航者的当前围栏区域（采集线程逐帧评估，清空未读事件）"""
+        self.lsl_manager.set_geofences([self.geofence_regions[region_id]], [f"Sub{self.sub_id}"])
+    
+    def poll_geofence_entry(self, region_id):
+        """返回导航者进入区域的围栏事件（无则None）"""
+        for geo_event in self.lsl_manager.poll_geofence_events():
+            if geo_event['type'] == EVENT_ENTER and geo_event['region'] == region_id:
+                return geo_event
+        return None
     
     def cleanup(self):
         """清理资源"""
@@ -641,6 +634,7 @@ class MapLearningSystem:
             # 关闭数据记录器
             if self.data_logger:
                 self.data_logger.close()
+            self.frame_timer.close()
             
             # 清理LSL管理器
             self.lsl_manager.cleanup()
@@ -13,10 +13,23 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from psychopy import visual, core, event, gui
 from Core.lsl_manager import LSLManager
+from Core.ingest_service import IngestServiceClient
 from Core.transform_manager import TransformManager
+from Core.geofence import EVENT_ENTER
+from Core.scene_layer import SceneLayer
+from Core.trial_state import (TrialStateMachine, STATE_GO_CUE, STATE_NAVIGATING, STATE_ARRIVED,
+                              STATE_SEARCHING, STATE_FOUND_HOLD, STATE_ITI, STATE_DONE,
+                              GO_CUE_DURATION, NAVIGATE_TIMEOUT, ARRIVED_HOLD, SEARCH_TIMEOUT,
+                              FOUND_HOLD, ITI_DURATION)
 from Core.audio_manager import AudioManager
+from Core.keyboard_capture import KeyboardCapture
 from Utils.data_logger import DataLogger
+from Utils.frame_timing import FrameTimingRecorder
 import json
+try:
+    from pylsl import local_clock
+except ImportError:
+    local_clock = None
 import random
 import time
 from datetime import datetime
@@ -27,6 +40,20 @@ from pathlib import Path
 BEHAVIOR_DIR = str(Path(__file__).parent.parent.parent / 'Data' / 'Behavior')
 LOGS_DIR = str(Path(__file__).parent.parent.parent / 'Logs')
 
+# ========== 运行模式常量 ==========
+# True: NatNet接收/LSL广播/CSV保存运行在独立采集进程，位置通过共享内存读取
+USE_INGEST_PROCESS = False
+# 位置滤波器（'one_euro'/'kalman'/None）；启用后位置判定使用滤波位置，LSL位置流附带滤波通道
+POSE_FILTER = None
+# 双人同步指标LSL流（人际距离、速度相关、相对朝向，约10Hz，用于实时反馈）
+ENABLE_SYNCHRONY_STREAM = True
+# 帧节拍模式：每帧先等待新位置（采集线程通知）或翻转截止时刻，无新位置时不重新读取位置
+FRAME_PACING = False
+PACING_DRAW_MARGIN = 0.004       # 翻转截止前预留的绘制时间（秒）
+DEFAULT_REFRESH_INTERVAL = 1.0 / 60.0  # 未测得刷新率时的帧间隔（秒）
+# Position.csv按NatNet帧率在采集线程记录（采集在独立进程时自动退回渲染循环按帧记录）
+NATIVE_POSITION_LOG = True
+
 # 配置日志
 log_dir = Path(LOGS_DIR)
 log_dir.mkdir(exist_ok=True)
@@ -58,10 +85,12 @@ class NavigationSystem:
         self.trial_num = 20    # 默认试次数
         
         # 初始化模块
-        self.lsl_manager = LSLManager()
+        self.lsl_manager = IngestServiceClient() if USE_INGEST_PROCESS else LSLManager()
         self.transform_manager = TransformManager()
         self.audio_manager = AudioManager()
         self.data_logger = None
+        self.frame_timer = FrameTimingRecorder()  # 逐帧翻转时序（每试次汇总）
+        self.keyboard_capture = KeyboardCapture(key_list=['space'])  # 观察者按键（按下时刻，LSL时钟）
         
         # 窗口配置
         self.win = None
@@ -71,12 +100,14 @@ class NavigationSystem:
         # 标记和目标
         self.wall_markers = {}
         self.hidden_targets = {}
+        self.geofence_regions = {}  # {区域ID: 围栏区域}，采集线程逐帧评估到达
+        
+        # 可视化对象（保留模式场景层，刺激只创建一次）
+        self.scene = None
         
-        # 可视化对象
-        self.marker_stims = {}
-        self.target_stims = {}
-        self.navigator_dot = None
-        self.observer_dot = None
+        # 窗口与场景的创建函数（无界面运行时替换为空窗口/空场景，见Tools/headless_runner.py）
+        self.window_factory = visual.Window
+        self.scene_factory = SceneLayer
         
         # 实验时钟
         self.exp_clock = None
@@ -85,11 +116,30 @@ class NavigationSystem:
         self.trial_data = []
         self.key_presses = []
         
+        # 试次流程（非阻塞状态机，见Core/trial_state.py）
+        self.trial_flow = None
+        self.current_trial = 0
+        self.wall_marker = None
+        self.hidden_target = None
+        self.wall_marker_list = []
+        self.target_list = []
+        self.navigator_data = {}
+        self.observer_data = {}
+        self.trial_start_time = None
+        self.marker_success = False
+        self.target_success = False
+        
         # 鲁棒性处理
         self.last_valid_positions = {'A': None, 'B': None}
         self.position_lost_times = {'A': None, 'B': None}
         self.max_position_loss = 2.0  # 最大位置丢失时间（秒）
         
+        # 位置去重与帧节拍
+        self.logged_pose_times = {'A': None, 'B': None}  # 已记录位置的采集时间戳（同一位置只记录一次）
+        self.native_position_log = False  # Position.csv由采集线程记录（渲染循环不再记录位置）
+        self.pose_sequence = 0  # 已读取的位置更新序号
+        self.last_flip_time = None
+        
     def collect_info(self):
         """收集实验信息（双人GUI）"""
         print("\n" + "=" * 60)
@@ -142,7 +192,9 @@ class NavigationSystem:
         
         # 启动LSL/NatNet服务（启用OptiTrack位置LSL广播）
         print("\n🚀 启动LSL/NatNet服务...")
-        if not self.lsl_manager.start_services(enable_position_broadcast=True, sub_ids=['001', '002']):
+        if not self.lsl_manager.start_services(enable_position_broadcast=True, sub_ids=['001', '002'],
+                                                 pose_filter=POSE_FILTER,
+                                                 enable_synchrony_stream=ENABLE_SYNCHRONY_STREAM):
             print("❌ LSL/NatNet服务启动失败")
             return False
         
@@ -166,6 +218,7 @@ class NavigationSystem:
         # 获取场景数据
         self.wall_markers = self.transform_manager.wall_markers
         self.hidden_targets = self.transform_manager.hidden_targets
+        self.geofence_regions = self.transform_manager.build_geofence_regions(marker_threshold=1.0)
         
         # 初始化数据记录器
         print(f"\n📊 初始化数据记录器...")
@@ -177,6 +230,21 @@ class NavigationSystem:
             print("❌ 数据记录器初始化失败")
             return False
         
+        # 位置按NatNet帧率记录（每帧、采集时间戳、Motive帧号）
+        if NATIVE_POSITION_LOG:
+            self.native_position_log = self.data_logger.start_native_position_logging([
+                {
+                    'names': [f"Sub{sub_id}", f"Skeleton_{sub_id}", f"Skeleton_{int(sub_id)}"],
+                    'sub_id': sub_id,
+                    'sub_role': role,
+                    'phase': 1,
+                    'session': self.session_id,
+                    'block': self.block_id,
+                    'is_navigation': 1 if self.navigator == role else 0
+                }
+                for role, sub_id in (('A', self.sub_a_id), ('B', self.sub_b_id))
+            ], self.transform_manager.real_to_screen, screen_limit=540)
+        
         # 加载音频
         print(f"\n🔊 加载音频文件...")
         if not self.audio_manager.load_all_audios():
@@ -184,7 +252,7 @@ class NavigationSystem:
         
         # 创建PsychoPy窗口
         print(f"\n🖥️  创建显示窗口...")
-        self.win = visual.Window(
+        self.win = self.window_factory(
             size=self.window_size,
             units='pix',
             fullscr=False,
@@ -194,16 +262,6 @@ class NavigationSystem:
             useFBO=True
         )
         
-        # 预创建场景元素（性能优化：避免每帧创建）
-        self.scene_border = visual.Rect(
-            self.win,
-            width=1080,
-            height=1080,
-            lineColor=[0.5, 0.5, 0.5],
-            lineWidth=3,
-            fillColor=None
-        )
-        
         # 隐藏鼠标指针
         self.win.mouseVisible = False
         
@@ -213,91 +271,37 @@ class NavigationSystem:
         # 创建可视化对象
         self.create_visual_objects()
         
+        # 观察者按键采集（失败时退回逐帧event.getKeys）
+        self.keyboard_capture.start()
+        
+        # 帧时序记录（与Behavior.csv同目录）
+        frame_rate = self.win.getActualFrameRate(nIdentical=30, nMaxFrames=120, nWarmUpFrames=10)
+        self.frame_timer.open(self.data_logger.file_prefix,
+                              refresh_interval=1.0 / frame_rate if frame_rate else None)
+        
         print("✅ 系统初始化完成")
         return True
     
     def create_visual_objects(self):
-        """创建可视化对象"""
+        """创建可视化对象（场景元素、光点、文本均只创建一次）"""
         try:
-            # 创建双人光点
-            self.navigator_dot = visual.Circle(
-                self.win,
-                radius=20,
-                fillColor='#800080',  # 紫色(导航者)
-                lineColor='#FFFFFF',
-                lineWidth=2,
-                pos=(0, 0)
-            )
+            self.scene = self.scene_factory(self.win)
+            self.scene.build(self.wall_markers, self.hidden_targets)
             
-            self.observer_dot = visual.Circle(
-                self.win,
-                radius=20,
-                fillColor='#FFB6C1',  # 粉色 (观察者)
-                lineColor='#FFFFFF',
-                lineWidth=2,
-                pos=(0, 0)
+            # 创建双人光点
+            self.scene.add_dot('navigator', fill_color='#800080', line_color='#FFFFFF')  # 紫色(导航者)
+            self.scene.add_dot('observer', fill_color='#FFB6C1', line_color='#FFFFFF')   # 粉色(观察者)
+            
+            # 信息文本与按键提示
+            self.scene.add_text(
+                'info',
+                f"Phase 1 - 神经同步测量\n"
+                f"导航者: {self.navigator} (紫色) | 观察者: {self.observer} (粉色)\n"
+                f"Block: {self.block_id}",
+                pos=(0, 450)
             )
-            
-            # 创建墙面标记
-            for marker_id, marker_data in self.wall_markers.items():
-                screen_pos = marker_data['screen_pos']
-                color = marker_data['color']
-                
-                marker_circle = visual.Circle(
-                    self.win,
-                    radius=12,
-                    fillColor=color,
-                    lineColor=[1, 1, 1],
-                    lineWidth=2,
-                    pos=screen_pos
-                )
-                
-                marker_text = visual.TextStim(
-                    self.win,
-                    text=marker_id,
-                    color=[1, 1, 1],
-                    height=20,
-                    pos=(screen_pos[0], screen_pos[1] - 25)
-                )
-                
-                self.marker_stims[marker_id] = {
-                    'circle': marker_circle,
-                    'text': marker_text,
-                    'data': marker_data
-                }
-            
-            # 创建隐藏目标区域（可见圆圈）
-            for target_id, target_data in self.hidden_targets.items():
-                screen_pos = target_data['screen_center']
-                screen_radius = target_data['screen_radius']
-                
-                # 创建目标圆圈
-                target_circle = visual.Circle(
-                    self.win,
-                    radius=screen_radius,
-                    fillColor=None,  # 透明填充
-                    lineColor=[0.5, 0.5, 0.5],  # 灰色边框
-                    lineWidth=3,
-                    pos=screen_pos
-                )
-                
-                # 创建目标标签
-                target_text = visual.TextStim(
-                    self.win,
-                    text=target_id,
-                    color=[0.7, 0.7, 0.7],
-                    height=25,
-                    pos=screen_pos
-                )
-                
-                self.target_stims[target_id] = {
-                    'circle': target_circle,
-                    'text': target_text,
-                    'data': target_data,
-                    'status': 'normal'  # normal, searching, found
-                }
-            
-            print(f"✅ 可视化对象已创建: {len(self.marker_stims)}个标记, {len(self.target_stims)}个目标")
+            self.scene.add_text('key_hint', "观察者：按 [空格键] 记录事件",
+                                pos=(0, -450), height=20, color=(1, 1, -1))  # 黄色
             
         except Exception as e:
             self.logger.error(f"创建可视化对象错误: {e}")
@@ -318,7 +322,7 @@ class NavigationSystem:
             
             skeleton_a_data = None
             for skeleton_name in skeleton_a_names:
-                skeleton_a_data = self.lsl_manager.get_latest_skeleton_data(skeleton_name)
+                skeleton_a_data = self.lsl_manager.get_latest_skeleton_data(skeleton_name, filtered=POSE_FILTER is not None)
                 if skeleton_a_data and skeleton_a_data['valid']:
                     break
             
@@ -339,19 +343,21 @@ class NavigationSystem:
                 self.position_lost_times['A'] = None
                 positions_valid['A'] = True
                 
-                # 记录位置数据
-                self.data_logger.log_position({
-                    'sub_id': self.sub_a_id,
-                    'sub_role': 'A',
-                    'phase': 1,
-                    'session': self.session_id,
-                    'block': self.block_id,
-                    'is_navigation': 1 if self.navigator == 'A' else 0,
-                    'raw_x': x_real,
-                    'raw_y': z_real,
-                    'pos_x': x_screen,
-                    'pos_y': y_screen
-                })
+                # 记录位置数据（未由采集线程记录时；同一采集帧只记录一次）
+                if not self.native_position_log and skeleton_a_data['timestamp'] != self.logged_pose_times['A']:
+                    self.logged_pose_times['A'] = skeleton_a_data['timestamp']
+                    self.data_logger.log_position({
+                        'sub_id': self.sub_a_id,
+                        'sub_role': 'A',
+                        'phase': 1,
+                        'session': self.session_id,
+                        'block': self.block_id,
+                        'is_navigation': 1 if self.navigator == 'A' else 0,
+                        'raw_x': x_real,
+                        'raw_y': z_real,
+                        'pos_x': x_screen,
+                        'pos_y': y_screen
+                    })
                 
             else:
                 # 处理A的位置丢失
@@ -367,7 +373,7 @@ class NavigationSystem:
             
             skeleton_b_data = None
             for skeleton_name in skeleton_b_names:
-                skeleton_b_data = self.lsl_manager.get_latest_skeleton_data(skeleton_name)
+                skeleton_b_data = self.lsl_manager.get_latest_skeleton_data(skeleton_name, filtered=POSE_FILTER is not None)
                 if skeleton_b_data and skeleton_b_data['valid']:
                     break
             
@@ -388,19 +394,21 @@ class NavigationSystem:
                 self.position_lost_times['B'] = None
                 positions_valid['B'] = True
                 
-                # 记录位置数据
-                self.data_logger.log_position({
-                    'sub_id': self.sub_b_id,
-                    'sub_role': 'B',
-                    'phase': 1,
-                    'session': self.session_id,
-                    'block': self.block_id,
-                    'is_navigation': 1 if self.navigator == 'B' else 0,
-                    'raw_x': x_real,
-                    'raw_y': z_real,
-                    'pos_x': x_screen,
-                    'pos_y': y_screen
-                })
+                # 记录位置数据（未由采集线程记录时；同一采集帧只记录一次）
+                if not self.native_position_log and skeleton_b_data['timestamp'] != self.logged_pose_times['B']:
+                    self.logged_pose_times['B'] = skeleton_b_data['timestamp']
+                    self.data_logger.log_position({
+                        'sub_id': self.sub_b_id,
+                        'sub_role': 'B',
+                        'phase': 1,
+                        'session': self.session_id,
+                        'block': self.block_id,
+                        'is_navigation': 1 if self.navigator == 'B' else 0,
+                        'raw_x': x_real,
+                        'raw_y': z_real,
+                        'pos_x': x_screen,
+                        'pos_y': y_screen
+                    })
                 
             else:
                 # 处理B的位置丢失
@@ -409,36 +417,15 @@ class NavigationSystem:
             
             # 更新光点位置（鲁棒性处理）
             for role in ['A', 'B']:
+                dot_name = 'navigator' if role == self.navigator else 'observer'
+                pos = self.last_valid_positions[role]
                 if positions_valid[role]:
                     # 有效位置：更新光点
-                    pos = self.last_valid_positions[role]
-                    if role == 'A':
-                        if self.navigator == 'A':
-                            self.navigator_dot.pos = (pos['x_screen'], pos['y_screen'])
-                        else:
-                            self.observer_dot.pos = (pos['x_screen'], pos['y_screen'])
-                    else:
-                        if self.navigator == 'B':
-                            self.navigator_dot.pos = (pos['x_screen'], pos['y_screen'])
-                        else:
-                            self.observer_dot.pos = (pos['x_screen'], pos['y_screen'])
-                
-                else:
+                    self.scene.set_dot_pos(dot_name, (pos['x_screen'], pos['y_screen']))
+                elif (pos and self.position_lost_times[role] and
+                      current_time - self.position_lost_times[role] > self.max_position_loss):
                     # 位置丢失：保持静止在最后有效位置
-                    if (self.position_lost_times[role] and 
-                        current_time - self.position_lost_times[role] > self.max_position_loss):
-                        if self.last_valid_positions[role]:
-                            pos = self.last_valid_positions[role]
-                            if role == 'A':
-                                if self.navigator == 'A':
-                                    self.navigator_dot.pos = (pos['x_screen'], pos['y_screen'])
-                                else:
-                                    self.observer_dot.pos = (pos['x_screen'], pos['y_screen'])
-                            else:
-                                if self.navigator == 'B':
-                                    self.navigator_dot.pos = (pos['x_screen'], pos['y_screen'])
-                                else:
-                                    self.observer_dot.pos = (pos['x_screen'], pos['y_screen'])
+                    self.scene.set_dot_pos(dot_name, (pos['x_screen'], pos['y_screen']))
             
             return positions_valid
             
@@ -447,79 +434,16 @@ class NavigationSystem:
             return {'A': False, 'B': False}
     
     def draw_scene(self, highlight_marker=None, highlight_target=None):
-        """绘制场景"""
+        """绘制场景（仅高亮/状态改变时更新刺激属性）"""
         try:
-            # 绘制边框（使用预创建的对象）
-            if hasattr(self, 'scene_border'):
-                self.scene_border.draw()
-            
-            # 绘制墙面标记
-            for marker_id, marker_stim in self.marker_stims.items():
-                if marker_id == highlight_marker:
-                    # 高亮显示
-                    marker_stim['circle'].fillColor = [0, 255, 255]  # 青色高亮
-                else:
-                    # 正常颜色
-                    marker_stim['circle'].fillColor = marker_stim['data']['color']
-                
-                marker_stim['circle'].draw()
-                marker_stim['text'].draw()
-            
-            # 绘制隐藏目标区域
-            for target_id, target_stim in self.target_stims.items():
-                if target_id == highlight_target:
-                    if target_stim['status'] == 'found':
-                        # 找到时：绿色高亮
-                        target_stim['circle'].lineColor = [0, 1, 0]  # 绿色边框
-                        target_stim['circle'].fillColor = [0, 1, 0, 0.3]  # 半透明绿色填充
-                        target_stim['text'].color = [0, 1, 0]
-                    else:
-                        # 搜索时：黄色高亮
-                        target_stim['circle'].lineColor = [1, 1, 0]  # 黄色边框
-                        target_stim['circle'].fillColor = [1, 1, 0, 0.2]  # 半透明黄色填充
-                        target_stim['text'].color = [1, 1, 0]
-                else:
-                    # 正常状态：灰色
-                    target_stim['circle'].lineColor = [0.5, 0.5, 0.5]
-                    target_stim['circle'].fillColor = None
-                    target_stim['text'].color = [0.7, 0.7, 0.7]
-                
-                target_stim['circle'].draw()
-                target_stim['text'].draw()
-            
-            # 绘制双人光点
-            if self.navigator_dot:
-                self.navigator_dot.draw()
-            if self.observer_dot:
-                self.observer_dot.draw()
-            
-            # 绘制信息文本
-            info_text = visual.TextStim(
-                self.win,
-                text=f"Phase 1 - 神经同步测量\n"
-                     f"导航者: {self.navigator} (紫色) | 观察者: {self.observer} (粉色)\n"
-                     f"Block: {self.block_id}",
-                color=[1, 1, 1],
-                height=25,
-                pos=(0, 450)
-            )
-            info_text.draw()
-            
-            # 绘制按键提示
-            key_hint = visual.TextStim(
-                self.win,
-                text="观察者：按 [空格键] 记录事件",
-                color=[1, 1, -1],  # 黄色
-                height=20,
-                pos=(0, -450)
-            )
-            key_hint.draw()
+            self.scene.set_highlight(marker=highlight_marker, target=highlight_target)
+            self.scene.draw()
             
         except Exception as e:
             self.logger.error(f"绘制场景错误: {e}")
     
     def run_navigation_task(self):
-        """运行导航任务"""
+        """运行导航任务（单一帧循环驱动试次状态机，所有状态下保持渲染、按键处理与位置记录）"""
         print(f"\n" + "=" * 60)
         print(f"开始导航任务 - Block {self.block_id}")
         print(f"导航者: {self.navigator}, 观察者: {self.observer}")
@@ -532,27 +456,54 @@ class NavigationSystem:
         self.data_logger.log_marker(1, "Trial开始", phase="1")
         
         # 获取墙面标记和隐藏目标列表
-        wall_marker_list = list(self.wall_markers.keys())
-        target_list = list(self.hidden_targets.keys())
+        self.wall_marker_list = list(self.wall_markers.keys())
+        self.target_list = list(self.hidden_targets.keys())
         
         # 随机化顺序
-        random.shuffle(wall_marker_list)
-        random.shuffle(target_list)
+        random.shuffle(self.wall_marker_list)
+        random.shuffle(self.target_list)
+        
+        self.trial_flow = TrialStateMachine({
+            STATE_GO_CUE: self.step_go_cue,
+            STATE_NAVIGATING: self.step_navigating,
+            STATE_ARRIVED: self.step_arrived,
+            STATE_SEARCHING: self.step_searching,
+            STATE_FOUND_HOLD: self.step_found_hold,
+            STATE_ITI: self.step_iti,
+        }, clock=self.exp_clock.getTime)
+        self.current_trial = 0
+        
+        # 丢弃帧循环开始前的按键（指导语界面开始实验的空格键已被采集线程排队）
+        self.keyboard_capture.clear()
+        self.key_presses = []
+        
+        self.start_trial()
         
-        for trial in range(1, self.trial_num + 1):
-            print(f"\n--- Trial {trial}/{self.trial_num} ---")
+        while not self.trial_flow.done:
+            # 更新参与者位置（帧节拍模式下先等待新位置或翻转截止时刻，无新位置时跳过）
+            new_pose = self.wait_for_frame() if FRAME_PACING else True
+            self.frame_timer.frame_start()
+            if new_pose:
+                self.update_participants_positions()
+            self.frame_timer.position_read()
             
-            # 选择墙面标记和隐藏目标
-            wall_marker = wall_marker_list[(trial - 1) % len(wall_marker_list)]
-            hidden_target = target_list[(trial - 1) % len(target_list)]
+            # 推进试次状态
+            self.step_trial()
             
-            trial_success = self.run_trial(trial, wall_marker, hidden_target)
+            # 处理观察者按键（试次间隔内的按键计入下一试次；最后一个试次后Block已结束）
+            if not self.trial_flow.done:
+                in_iti = self.trial_flow.state == STATE_ITI
+                self.process_observer_keys(self.current_trial + 1 if in_iti else self.current_trial)
             
-            if not trial_success:
-                print(f"⚠️  Trial {trial} 未完成")
+            # 绘制场景
+            self.draw_scene(**self.current_highlight())
+            self.frame_timer.drawn()
+            self.win.flip()
+            self.last_flip_time = time.perf_counter()
+            self.frame_timer.flipped()
             
-            # Trial间隔
-            time.sleep(3.0)
+            # 检查ESC退出
+            self.check_escape()
         
         # 播放结束提示
         self.audio_manager.play_common('end')
@@ -562,213 +513,259 @@ class NavigationSystem:
         
         print(f"\n✅ Block {self.block_id} 完成")
     
-    def run_trial(self, trial_num, wall_marker, hidden_target):
-        """运行单个试次"""
+    def wait_for_frame(self):
+        """(帧节拍模式) 等待新位置或本帧翻转截止时刻（期间线程挂起，不空转）
+        
+        Returns:
+            bool: 是否有新位置
+        """
+        timeout = (self.frame_timer.refresh_interval or DEFAULT_REFRESH_INTERVAL) - PACING_DRAW_MARGIN
+        if self.last_flip_time is not None:
+            timeout -= time.perf_counter() - self.last_flip_time
+        sequence = self.lsl_manager.wait_for_pose(self.pose_sequence, timeout)
+        new_pose = sequence != self.pose_sequence
+        self.pose_sequence = sequence
+        return new_pose
+    
+    def step_trial(self):
+        """执行当前状态（出错时结束该试次，进入试次间隔）"""
         try:
-            print(f"   墙面标记: {wall_marker}")
-            print(f"   隐藏目标: {hidden_target}")
-            
-            trial_start_time = self.exp_clock.getTime()
-            
-            # 初始化Trial数据（为导航者和观察者分别记录）
-            navigator_data = {
-                'sub_id': self.sub_a_id if self.navigator == 'A' else self.sub_b_id,
-                'sub_role': self.navigator,
-                'phase': 1,
+            self.trial_flow.step()
+        except Exception as e:
+            self.logger.error(f"Trial {self.current_trial} 执行错误: {e}")
+            self.lsl_manager.clear_geofences()
+            self.frame_timer.end_trial()
+            self.lsl_manager.set_trial_context(None, phase="1")
+            self.enter_iti()
+    
+    def current_highlight(self):
+        """当前状态下的高亮元素"""
+        state = self.trial_flow.state
+        if state in (STATE_GO_CUE, STATE_NAVIGATING, STATE_ARRIVED):
+            return {'highlight_marker': self.wall_marker}
+        if state in (STATE_SEARCHING, STATE_FOUND_HOLD):
+            return {'highlight_target': self.hidden_target}
+        return {}
+    
+    def start_trial(self):
+        """开始下一个试次（已完成全部试次时结束Block）"""
+        self.current_trial += 1
+        trial_num = self.current_trial
+        if trial_num > self.trial_num:
+            self.trial_flow.enter(STATE_DONE)
+            return
+        
+        print(f"\n--- Trial {trial_num}/{self.trial_num} ---")
+        
+        # 选择墙面标记和隐藏目标
+        self.wall_marker = self.wall_marker_list[(trial_num - 1) % len(self.wall_marker_list)]
+        self.hidden_target = self.target_list[(trial_num - 1) % len(self.target_list)]
+        print(f"   墙面标记: {self.wall_marker}")
+        print(f"   隐藏目标: {self.hidden_target}")
+        
+        # 标记质量监测与帧时序按试次统计
+        self.lsl_manager.set_trial_context(trial_num, phase="1")
+        self.frame_timer.begin_trial(trial_num, 1)
+        
+        self.trial_start_time = self.exp_clock.getTime()
+        self.marker_success = False
+        self.target_success = False
+        
+        # 初始化Trial数据（为导航者和观察者分别记录）
+        self.navigator_data = {
+            'sub_id': self.sub_a_id if self.navigator == 'A' else self.sub_b_id,
+            'sub_role': self.navigator,
+            'phase': 1,
             'session': self.session_id,
             'block': self.block_id,
-                'is_navigation': 1,
+            'is_navigation': 1,
             'trial': trial_num,
-            'wall_marker': wall_marker,
-                'target': hidden_target
-            }
-            
-            observer_data = {
-                'sub_id': self.sub_a_id if self.observer == 'A' else self.sub_b_id,
-                'sub_role': self.observer,
-                'phase': 1,
-                'session': self.session_id,
-                'block': self.block_id,
-                'is_navigation': 0,
+            'wall_marker': self.wall_marker,
+            'target': self.hidden_target
+        }
+        
+        self.observer_data = {
+            'sub_id': self.sub_a_id if self.observer == 'A' else self.sub_b_id,
+            'sub_role': self.observer,
+            'phase': 1,
+            'session': self.session_id,
+            'block': self.block_id,
+            'is_navigation': 0,
             'trial': trial_num,
-                'wall_marker': wall_marker,
-                'target': hidden_target
-            }
-            
-            # 清空按键记录
-            self.key_presses = []
-            
-            # 第一阶段：导航到墙面标记
-            marker_success, marker_arrive_time = self.navigate_to_wall_marker(wall_marker, trial_num)
-            if marker_success:
-                navigator_data['time_wall_arrive'] = marker_arrive_time
-                navigator_data['rt_wallmarker'] = marker_arrive_time - trial_start_time
-            
-            # 第二阶段：搜索隐藏目标
-            target_success, target_arrive_time = self.search_hidden_target(hidden_target, trial_num)
-            if target_success:
-                navigator_data['time_target_arrive'] = target_arrive_time
-                navigator_data['rt_target'] = target_arrive_time - navigator_data.get('time_wall_arrive', trial_start_time)
-            
-            # 处理观察者按键数据
-            if self.key_presses:
-                observer_data['key_number'] = len(self.key_presses)
-                observer_data['key_time'] = ';'.join([str(k['time']) for k in self.key_presses])
-                observer_data['key_navigation_position'] = ';'.join([k['position'] for k in self.key_presses])
-                
-                # 计算准确率（简化实现：假设所有按键都有效）
-                observer_data['acc_number'] = len(self.key_presses)
-                observer_data['per_acc'] = 1.0 if self.key_presses else 0.0
-            
-            # 记录行为数据
-            self.data_logger.log_behavior(navigator_data)
-            self.data_logger.log_behavior(observer_data)
-            
-            success = marker_success and target_success
-            print(f"   结果: {'成功' if success else '失败'}")
-            print(f"   观察者按键: {len(self.key_presses)} 次")
-            
-            return success
-            
-        except Exception as e:
-            self.logger.error(f"Trial {trial_num} 执行错误: {e}")
-            return False
+            'wall_marker': self.wall_marker,
+            'target': self.hidden_target
+        }
+        
+        # 前往墙面标记指令（到达判定由采集线程逐帧评估围栏）
+        print(f"   → 前往墙面标记: {self.wall_marker}")
+        self.audio_manager.play_wallmarker_go(self.wall_marker)
+        self.arm_geofence(self.wall_marker)
+        self.trial_flow.enter(STATE_GO_CUE, GO_CUE_DURATION)
     
-    def navigate_to_wall_marker(self, marker_id, trial_num):
-        """导航到墙面标记"""
-        print(f"   → 前往墙面标记: {marker_id}")
-        
-        # 播放音频
-        self.audio_manager.play_wallmarker_go(marker_id)
-        
-        # 获取标记信息
-        marker_data = self.wall_markers[marker_id]
-        marker_pos = marker_data['real_pos']
-        
-        # 等待到达
-        arrived = False
-        timeout = 30.0
-        start_time = time.time()
-        arrive_time = None
-        
-        while not arrived and (time.time() - start_time < timeout):
-            # 更新参与者位置
-            positions_valid = self.update_participants_positions()
-            
-            # 检测导航者是否到达标记
-            navigator_pos = self.last_valid_positions.get(self.navigator)
-            if navigator_pos and positions_valid[self.navigator]:
-                current_pos = (navigator_pos['x_real'], navigator_pos['z_real'])
-                if self.transform_manager.check_point_near_marker(current_pos, marker_id, threshold=1.0):
-                    arrived = True
-                    arrive_time = self.exp_clock.getTime()
-                    print(f"   ✅ 到达墙面标记: {marker_id}")
-                    
-                    # 播放到达音频
-                    self.audio_manager.play_wallmarker_arrive(marker_id)
-                    
-                    # 发送LSL Marker
-                    self.data_logger.log_marker(2, "到达墙面标记", trial=str(trial_num), phase="1")
-            
-            # 处理观察者按键
-            self.process_observer_keys(trial_num)
-            
-            # 绘制场景
-            self.draw_scene(highlight_marker=marker_id)
-            self.win.flip()
-            
-            # 检查ESC退出
-            keys = event.getKeys(['escape'])
-            if 'escape' in keys:
-                print("\n⚠️  用户按ESC键，立即退出程序...")
-                self.cleanup()
-                import sys
-                sys.exit(0)
-        
-        if not arrived:
+    def step_go_cue(self):
+        if self.trial_flow.expired():
+            self.trial_flow.enter(STATE_NAVIGATING, NAVIGATE_TIMEOUT)
+    
+    def step_navigating(self):
+        """检测导航者是否到达墙面标记"""
+        geo_event = self.poll_geofence_entry(self.wall_marker)
+        if geo_event:
+            arrive_time = self.lsl_to_exp_time(geo_event['timestamp'])
+            print(f"   ✅ 到达墙面标记: {self.wall_marker}")
+            
+            # 播放到达音频
+            self.audio_manager.play_wallmarker_arrive(self.wall_marker)
+            
+            # 发送LSL Marker（时间戳为屏幕翻转时刻，Event_Timestamp为越界帧的采集时刻）
+            self.data_logger.log_marker_on_flip(self.win, 2, "到达墙面标记", trial=str(self.current_trial),
+                                                phase="1", event_time=geo_event['timestamp'])
+            
+            self.marker_success = True
+            self.navigator_data['time_wall_arrive'] = arrive_time
+            self.navigator_data['rt_wallmarker'] = arrive_time - self.trial_start_time
+            self.trial_flow.enter(STATE_ARRIVED, ARRIVED_HOLD)
+        
+        elif self.trial_flow.expired():
             print(f"   ⏱️  超时，未到达墙面标记")
-        
-        return arrived, arrive_time
+            self.start_search()
+    
+    def step_arrived(self):
+        if self.trial_flow.expired():
+            self.start_search()
     
-    def search_hidden_target(self, target_id, trial_num):
-        """搜索隐藏目标"""
+    def start_search(self):
+        """开始搜索隐藏目标"""
+        target_id = self.hidden_target
         print(f"   → 搜索隐藏目标: {target_id}")
         
         # 设置目标状态为搜索中
-        if target_id in self.target_stims:
-            self.target_stims[target_id]['status'] = 'searching'
+        self.scene.set_target_status(target_id, 'searching')
         
-        # 播放音频
+        # 播放音频（进入判定由采集线程逐帧评估围栏）
         self.audio_manager.play_target_go(target_id)
-        
-        # 获取目标信息
-        target_data = self.hidden_targets[target_id]
-        target_center = target_data['center']
-        target_radius = target_data['radius']
-        
-        # 等待找到
-        found = False
-        timeout = 45.0
-        start_time = time.time()
-        find_time = None
-        
-        while not found and (time.time() - start_time < timeout):
-            # 更新参与者位置
-            positions_valid = self.update_participants_positions()
-            
-            # 检测导航者是否进入目标区域
-            navigator_pos = self.last_valid_positions.get(self.navigator)
-            if navigator_pos and positions_valid[self.navigator]:
-                current_pos = (navigator_pos['x_real'], navigator_pos['z_real'])
-                if self.transform_manager.check_point_in_circle(current_pos, target_center, target_radius):
-                    found = True
-                    find_time = self.exp_clock.getTime()
-                    
-                    # 更新目标状态为已找到
-                    if target_id in self.target_stims:
-                        self.target_stims[target_id]['status'] = 'found'
-                    
-                    print(f"   ✅ 找到隐藏目标: {target_id} - 目标区域高亮为绿色！")
-                    
-                    # 播放找到音频
-                    self.audio_manager.play_target_arrive(target_id)
-                    
-                    # 发送LSL Marker
-                    self.data_logger.log_marker(4, "找到隐藏目标", trial=str(trial_num), phase="1")
-                    
-                    # 等待2秒后再继续下一个指令（给予反应时间）
-                    print(f"   ⏳ 等待2秒后继续...")
-                    time.sleep(2.0)
+        self.arm_geofence(target_id)
+        self.trial_flow.enter(STATE_SEARCHING, SEARCH_TIMEOUT)
+    
+    def step_searching(self):
+        """检测导航者是否进入目标区域"""
+        target_id = self.hidden_target
+        geo_event = self.poll_geofence_entry(target_id)
+        if geo_event:
+            find_time = self.lsl_to_exp_time(geo_event['timestamp'])
             
-            # 处理观察者按键
-            self.process_observer_keys(trial_num)
+            # 更新目标状态为已找到
+            self.scene.set_target_status(target_id, 'found')
             
-            # 绘制场景（高亮当前搜索的目标）
-            self.draw_scene(highlight_target=target_id)
-            self.win.flip()
+            print(f"   ✅ 找到隐藏目标: {target_id} - 目标区域高亮为绿色！")
             
-            # 检查ESC退出
-            keys = event.getKeys(['escape'])
-            if 'escape' in keys:
-                print("\n⚠️  用户按ESC键，立即退出程序...")
-                self.cleanup()
-                import sys
-                sys.exit(0)
-        
-        if not found:
+            # 播放找到音频
+            self.audio_manager.play_target_arrive(target_id)
+            
+            # 发送LSL Marker（时间戳为屏幕翻转时刻，Event_Timestamp为越界帧的采集时刻）
+            self.data_logger.log_marker_on_flip(self.win, 4, "找到隐藏目标", trial=str(self.current_trial),
+                                                phase="1", event_time=geo_event['timestamp'])
+            
+            self.target_success = True
+            self.navigator_data['time_target_arrive'] = find_time
+            self.navigator_data['rt_target'] = find_time - self.navigator_data.get('time_wall_arrive', self.trial_start_time)
+            
+            # 保持高亮后再继续下一个指令（给予反应时间，期间照常渲染和记录）
+            print(f"   ⏳ 等待{FOUND_HOLD:g}秒后继续...")
+            self.trial_flow.enter(STATE_FOUND_HOLD, FOUND_HOLD)
+        
+        elif self.trial_flow.expired():
             print(f"   ⏱️  超时，未找到隐藏目标")
             # 重置目标状态
-            if target_id in self.target_stims:
-                self.target_stims[target_id]['status'] = 'normal'
+            self.scene.set_target_status(target_id, 'normal')
+            self.finish_trial()
+    
+    def step_found_hold(self):
+        if self.trial_flow.expired():
+            self.finish_trial()
+    
+    def finish_trial(self):
+        """记录行为数据并进入试次间隔"""
+        self.lsl_manager.clear_geofences()
+        
+        # 收集试次结束前已排队的按键（计入本试次）
+        self.process_observer_keys(self.current_trial)
+        
+        # 处理观察者按键数据
+        if self.key_presses:
+            self.observer_data['key_number'] = len(self.key_presses)
+            self.observer_data['key_time'] = ';'.join([str(k['time']) for k in self.key_presses])
+            self.observer_data['key_navigation_position'] = ';'.join([k['position'] for k in self.key_presses])
+            
+            # 计算准确率（简化实现：假设所有按键都有效）
+            self.observer_data['acc_number'] = len(self.key_presses)
+            self.observer_data['per_acc'] = 1.0 if self.key_presses else 0.0
+        
+        # 记录行为数据
+        self.data_logger.log_behavior(self.navigator_data)
+        self.data_logger.log_behavior(self.observer_data)
         
-        return found, find_time
+        success = self.marker_success and self.target_success
+        print(f"   结果: {'成功' if success else '失败'}")
+        print(f"   观察者按键: {len(self.key_presses)} 次")
+        
+        # 本试次按键已写入，之后（试次间隔内）的按键计入下一试次
+        self.key_presses = []
+        if not success:
+            print(f"⚠️  Trial {self.current_trial} 未完成")
+        
+        self.frame_timer.end_trial()
+        self.data_logger.flush(fsync=True)  # 试次边界落盘（由写入线程执行）
+        self.lsl_manager.set_trial_context(None, phase="1")
+        
+        # Trial间隔
+        self.enter_iti()
+    
+    def enter_iti(self):
+        """进入试次间隔；最后一个试次后直接结束Block（间隔内的按键已无试次可归属）"""
+        if self.current_trial >= self.trial_num:
+            self.trial_flow.enter(STATE_DONE)
+        else:
+            self.trial_flow.enter(STATE_ITI, ITI_DURATION)
+    
+    def step_iti(self):
+        if self.trial_flow.expired():
+            self.start_trial()
+    
+    def check_escape(self):
+        """检查ESC退出"""
+        if 'escape' in event.getKeys(['escape']):
+            print("\n⚠️  用户按ESC键，立即退出程序...")
+            self.cleanup()
+            sys.exit(0)
+    
+    def arm_geofence(self, region_id):
+        """设置导航者的当前围栏区域（采集线程逐帧评估，清空未读事件）"""
+        self.lsl_manager.set_geofences([self.geofence_regions[region_id]], [f"Sub{self.sub_a_id if self.navigator == 'A' else self.sub_b_id}"])
+    
+    def poll_geofence_entry(self, region_id):
+        """返回导航者进入区域的围栏事件（无则None）"""
+        for geo_event in self.lsl_manager.poll_geofence_events():
+            if geo_event['type'] == EVENT_ENTER and geo_event['region'] == region_id:
+                return geo_event
+        return None
+    
+    def lsl_to_exp_time(self, timestamp):
+        """将LSL时间戳（围栏越界帧、按键按下时刻）换算到实验时钟"""
+        if local_clock is None:
+            return self.exp_clock.getTime()
+        return self.exp_clock.getTime() - (local_clock() - timestamp)
     
     def process_observer_keys(self, trial_num):
-        """处理观察者按键"""
+        """处理观察者按键（时间为按下时刻，LSL Marker使用按下时刻的LSL时间戳）"""
         try:
-            keys = event.getKeys(['space'], timeStamped=self.exp_clock)
+            if self.keyboard_capture.keyboard is not None:
+                keys = [(press['key'], self.lsl_to_exp_time(press['timestamp']), press['timestamp'])
+                        for press in self.keyboard_capture.get_presses()]
+            else:
+                keys = [(key, timestamp, None)
+                        for key, timestamp in event.getKeys(['space'], timeStamped=self.exp_clock)]
             
-            for key, timestamp in keys:
+            for key, timestamp, lsl_timestamp in keys:
                 if key == 'space':
                     # 获取导航者当前位置
                     navigator_pos = self.last_valid_positions.get(self.navigator)
@@ -784,8 +781,9 @@ class NavigationSystem:
                     }
                     self.key_presses.append(key_record)
                     
-                    # 发送LSL Marker
-                    self.data_logger.log_marker(3, "观察者按键", trial=str(trial_num), phase="1")
+                    # 发送LSL Marker（时间戳为按下时刻）
+                    self.data_logger.log_marker(3, "观察者按键", trial=str(trial_num), phase="1",
+                                                timestamp=lsl_timestamp)
                     
                     print(f"   📝 观察者按键: {timestamp:.3f}s, 位置: {position_str}")
                     
@@ -804,6 +802,8 @@ class NavigationSystem:
             # 关闭数据记录器
             if self.data_logger:
                 self.data_logger.close()
+            self.frame_timer.close()
+            self.keyboard_capture.stop()
             
             # 清理LSL管理器
             self.lsl_manager.cleanup()
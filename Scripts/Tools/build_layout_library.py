@@ -0,0 +1,127 @@
+"""
+隐藏目标布局库生成工具（V3.4新增）
+离线预计算数千个满足约束的隐藏目标布局，按平衡评分（距墙距离 + 目标间距离）分层，
+保存为单个带索引的.npz文件；实验运行时TransformManager按dyad/session O(1)查表
+
+使用方法：
+    python build_layout_library.py                       # 默认5000个布局、4层
+    python build_layout_library.py --count 10000 --strata 4 --seed 2024
+    python build_layout_library.py --lookup 12 3         # 查看dyad 12 / session 3 的布局
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# 添加Scripts目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Core.layout_generator import (generate_target_layout, score_layouts, LayoutLibrary,
+                                   LAYOUT_LIBRARY_PATH)
+
+
+def build_layout_library(output, count, strata, num_targets, min_distance, edge_margin,
+                         radius, room_size, seed):
+    """生成并保存布局库"""
+    print("\n" + "=" * 70)
+    print("隐藏目标布局库生成工具")
+    print("=" * 70)
+
+    rng = np.random.default_rng(seed)
+
+    # 1. 生成布局
+    print(f"\n1️⃣  生成 {count} 个布局（{num_targets}个目标，最小间距 {min_distance}m，边距 {edge_margin}m）...")
+    start = time.time()
+    try:
+        layouts = [generate_target_layout(num_targets, min_distance, edge_margin, room_size, rng)
+                   for _ in range(count)]
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+
+    if len(layouts) < strata:
+        print(f"❌ 布局数 {len(layouts)} 少于分层数 {strata}")
+        return False
+    print(f"   ✅ {len(layouts)} 个完整布局（{time.time() - start:.1f}s）")
+
+    # 2. 评分与分层：按评分排序后等分K层，层内随机打乱，层优先顺序存储
+    centers = np.asarray(layouts)
+    scores = score_layouts(centers, room_size)
+    per_stratum = len(centers) // strata
+    order = np.argsort(scores['score'], kind='stable')[:per_stratum * strata].reshape(strata, per_stratum)
+    for row in order:
+        rng.shuffle(row)
+    order = order.reshape(-1)
+
+    print(f"\n2️⃣  分层: {strata} 层 × {per_stratum} 个布局")
+    for k in range(strata):
+        idx = order[k * per_stratum:(k + 1) * per_stratum]
+        print(f"   层{k}: 评分 {scores['score'][idx].mean():.2f}, "
+              f"距墙 {scores['wall_distance'][idx].mean():.2f}m, "
+              f"目标间 {scores['pair_distance'][idx].mean():.2f}m")
+
+    # 3. 保存
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        output,
+        centers=centers[order],
+        radius=np.float64(radius),
+        strata=np.int64(strata),
+        per_stratum=np.int64(per_stratum),
+        room_size=np.asarray(room_size, dtype=np.float64),
+        min_distance=np.float64(min_distance),
+        edge_margin=np.float64(edge_margin),
+        seed=np.int64(seed),
+        wall_distance=scores['wall_distance'][order],
+        pair_distance=scores['pair_distance'][order],
+        score=scores['score'][order]
+    )
+    print(f"\n💾 布局库已保存: {output}")
+    return True
+
+
+def show_lookup(path, dyad_id, session_id):
+    """查看指定dyad/session的布局"""
+    library = LayoutLibrary.load(path)
+    if library is None:
+        print(f"❌ 布局库不存在: {path}")
+        return False
+
+    layout = library.lookup(dyad_id, session_id)
+    print(f"D{int(dyad_id):03d} / S{session_id}: 布局 #{layout['index']}（分层 {layout['stratum']}，评分 {layout['score']:.2f}）")
+    for i, (x, z) in enumerate(layout['centers']):
+        print(f"   P{i + 1}: ({x:+.3f}, {z:+.3f})  半径 {layout['radius']}m")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='隐藏目标布局库生成')
+    parser.add_argument('--output', '-o', default=str(LAYOUT_LIBRARY_PATH), help='输出.npz路径')
+    parser.add_argument('--count', '-n', type=int, default=5000, help='生成布局数')
+    parser.add_argument('--strata', type=int, default=4, help='平衡分层数（建议等于每个dyad的session数）')
+    parser.add_argument('--num-targets', type=int, default=3, help='每个布局的目标数')
+    parser.add_argument('--min-distance', type=float, default=2.0, help='目标间最小距离（米）')
+    parser.add_argument('--edge-margin', type=float, default=1.0, help='目标距墙最小距离（米）')
+    parser.add_argument('--radius', type=float, default=0.4, help='目标半径（米）')
+    parser.add_argument('--room-size', type=float, nargs=2, default=[6.0, 6.0], help='房间尺寸（米）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--lookup', nargs=2, metavar=('DYAD', 'SESSION'), help='查看指定dyad/session的布局')
+    args = parser.parse_args()
+
+    try:
+        if args.lookup:
+            success = show_lookup(args.output, *args.lookup)
+        else:
+            success = build_layout_library(args.output, args.count, args.strata, args.num_targets,
+                                           args.min_distance, args.edge_margin, args.radius,
+                                           tuple(args.room_size), args.seed)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"❌ 布局库生成错误: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,674 @@
+"""
+无界面运行器 (V3.4)
+不打开窗口、不弹出对话框、不连接Motive，端到端运行Phase 0/Phase 1的实验流程，
+用于在普通Linux电脑上测量每试次CPU耗时、数据记录吞吐量与Marker时序
+
+- 空窗口：NullWindow代替PsychoPy窗口，flip()按帧推进模拟时钟，并按 --speed 倍速控制节拍（0为不等待）
+- 空场景：NullScene保持SceneLayer的接口与状态，不创建任何刺激
+- 实验参数来自命令行（跳过GUI对话框与说明界面），音频使用SDL dummy驱动
+- 位置来源（LSLManager Offline Mode，帧与实时采集走相同的帧总线：位置缓存、围栏、CSV保存）：
+  - 模拟被试（默认）：导航者在指令后走向当前墙面标记与隐藏目标，观察者原地站立并随机按键
+  - 原始数据包回放：--replay 指定natnet_capture归档（natnet_replay_server.py record 录制）
+- 试次计时（状态机截止时刻、反应时）使用模拟时钟；Marker时间戳仍为LSL时钟
+
+用法：
+    # Phase 1，4个试次，不等待（尽可能快）
+    python headless_runner.py nav --trials 4 --speed 0
+
+    # Phase 0，实时节拍，回放录制数据
+    python headless_runner.py map --replay roomA.natnet --speed 1
+
+    # 输出基准结果JSON
+    python headless_runner.py nav --trials 20 --speed 0 --report bench.json
+
+注意：数据写入 Data/Behavior/D999（默认Dyad ID）；PsychoPy导入需要显示环境时请用 xvfb-run 运行
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import functools
+from pathlib import Path
+
+# 无音频设备时pygame.mixer使用dummy驱动（须在导入AudioManager之前设置）
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+# 添加Scripts目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from Core.lsl_manager import LSLManager, MoCapData, local_clock
+from Core.natnet_capture import RawPacketReader
+from Core.trial_state import STATE_GO_CUE, STATE_NAVIGATING, STATE_SEARCHING
+
+
+# ========== 模拟参数常量 ==========
+DEFAULT_DYAD_ID = 999           # 无界面运行的数据目录（与真实被试区分）
+MOCAP_RATE = 120.0              # 模拟动捕帧率（Hz）
+WALK_SPEED = 1.0                # 步行速度（米/秒）
+REACTION_TIME = 0.4             # 听到指令到起步的时间（秒）
+MARKER_STOP_DISTANCE = 0.5      # 停在墙面标记前的距离（米，小于到达半径1.0）
+PELVIS_HEIGHT = 1.0             # 骨盆高度（米，Y为Up-axis）
+MARKER_OFFSETS = ((0.12, 0.0, 0.08), (-0.12, 0.0, 0.08), (0.1, 0.05, -0.1), (-0.1, 0.05, -0.1))
+OBSERVER_KEY_RATE = 0.2         # 观察者按键率（次/秒，泊松过程）
+
+
+class SimClock:
+    """模拟时钟（接口同psychopy.core.Clock，由NullWindow.flip按帧推进）"""
+
+    def __init__(self):
+        self.t = 0.0
+
+    def getTime(self):
+        return self.t
+
+    def reset(self, new_t=0.0):
+        self.t = new_t
+
+    def advance(self, dt):
+        self.t += dt
+
+
+class NullWindow:
+    """空窗口：flip()推进模拟时钟并驱动位置来源，不做任何渲染"""
+
+    def __init__(self, clock, frame_rate=60.0, speed=1.0, on_flip=None, size=(1920, 1080), **window_kwargs):
+        """
+        Args:
+            clock: 模拟时钟（每次flip推进一个刷新间隔）
+            frame_rate: 模拟刷新率（Hz）
+            speed: 相对实时的倍速，0表示不等待
+            on_flip: 翻转回调 on_flip(模拟时刻)，在callOnFlip回调之前执行
+            window_kwargs: visual.Window的其他参数（忽略）
+        """
+        self.clock = clock
+        self.frame_rate = frame_rate
+        self.frame_interval = 1.0 / frame_rate
+        self.speed = speed
+        self.on_flip = on_flip
+        self.size = np.array(size)
+        self.mouseVisible = True
+
+        self.frame_count = 0
+        self._frameTime = None
+        self._next_flip = None
+        self._flip_callbacks = []
+
+    def flip(self, clearBuffer=True):
+        """推进一帧（speed>0时等待到该帧的实际时刻）"""
+        if self.speed > 0:
+            now = time.perf_counter()
+            if self._next_flip is None:
+                self._next_flip = now
+            self._next_flip = max(self._next_flip + self.frame_interval / self.speed, now)
+            delay = self._next_flip - now
+            if delay > 0:
+                time.sleep(delay)
+
+        self.clock.advance(self.frame_interval)
+        self.frame_count += 1
+        self._frameTime = time.perf_counter()
+
+        if self.on_flip:
+            self.on_flip(self.clock.getTime())
+
+        callbacks, self._flip_callbacks = self._flip_callbacks, []
+        for function, args, kwargs in callbacks:
+            function(*args, **kwargs)
+        return self._frameTime
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._flip_callbacks.append((function, args, kwargs))
+
+    def getActualFrameRate(self, **kwargs):
+        """按倍速换算的实际翻转频率（不等待时返回None，由帧时序按中位数估计）"""
+        return self.frame_rate * self.speed if self.speed > 0 else None
+
+    def close(self):
+        pass
+
+
+class NullScene:
+    """空场景：接口与SceneLayer一致，只记录状态（不创建刺激）"""
+
+    def __init__(self, win, **kwargs):
+        self.win = win
+        self.markers = {}
+        self.targets = {}  # {ID: 状态}
+        self.dots = {}
+        self.texts = {}
+        self.highlight_marker = None
+        self.highlight_target = None
+        self.draw_count = 0
+
+    def build(self, wall_markers, hidden_targets):
+        self.markers = dict.fromkeys(wall_markers, 'normal')
+        self.targets = dict.fromkeys(hidden_targets, 'normal')
+
+    def add_dot(self, name, fill_color, line_color, radius=20):
+        self.dots[name] = (0, 0)
+
+    def add_text(self, name, text, pos, height=25, color=(1, 1, 1)):
+        self.texts[name] = text
+
+    def set_text(self, name, text):
+        self.texts[name] = text
+
+    def set_dot_pos(self, name, pos):
+        self.dots[name] = pos
+
+    def set_highlight(self, marker=None, target=None):
+        self.highlight_marker = marker
+        self.highlight_target = target
+
+    def set_target_status(self, target_id, status):
+        if target_id in self.targets:
+            self.targets[target_id] = status
+
+    def get_target_status(self, target_id):
+        return self.targets.get(target_id)
+
+    def draw(self):
+        self.draw_count += 1
+
+
+class SimulatedParticipant:
+    """模拟被试（世界坐标X/Z，米）"""
+
+    def __init__(self, name, start, speed=WALK_SPEED, reaction_time=REACTION_TIME, rng=None):
+        self.name = name
+        self.position = np.array(start, dtype=float)
+        self.speed = speed
+        self.reaction_time = reaction_time
+        self.rng = rng or np.random.default_rng()
+
+        self.goal = None
+        self.depart_time = None
+
+    def set_goal(self, goal, now):
+        """设置目标点（目标改变时经过反应时间后起步）"""
+        if goal is None:
+            self.goal = None
+            return
+        goal = (float(goal[0]), float(goal[1]))
+        if goal != self.goal:
+            self.goal = goal
+            self.depart_time = now + self.reaction_time
+
+    def step(self, now, dt):
+        """向目标点移动dt秒"""
+        if self.goal is None or now < self.depart_time:
+            return
+        delta = np.asarray(self.goal) - self.position
+        distance = math.hypot(delta[0], delta[1])
+        if distance > 1e-6:
+            self.position += delta * min(1.0, self.speed * dt / distance)
+
+    def marker_positions(self):
+        """当前帧的标记点（Y为Up-axis，附加毫米级噪声）"""
+        x, z = self.position
+        noise = self.rng.normal(0.0, 0.001, size=(len(MARKER_OFFSETS), 3))
+        return [[x + dx + n[0], PELVIS_HEIGHT + dy + n[1], z + dz + n[2]]
+                for (dx, dy, dz), n in zip(MARKER_OFFSETS, noise)]
+
+
+class ScriptedSource:
+    """模拟被试位置来源：按动捕帧率推进被试，构造MoCapData注入LSLManager"""
+
+    def __init__(self, system, navigator, others=(), mocap_rate=MOCAP_RATE):
+        """
+        Args:
+            system: 实验系统（读取当前试次状态与提示的墙面标记/隐藏目标）
+            navigator: 导航者（SimulatedParticipant）
+            others: 其他被试（原地站立）
+        """
+        self.system = system
+        self.lsl_manager = system.lsl_manager
+        self.navigator = navigator
+        self.participants = [navigator] + list(others)
+        self.frame_interval = 1.0 / mocap_rate
+
+        self.last_time = None
+        self.frame_number = 0
+
+    def _navigator_goal(self):
+        """当前状态下导航者的目标点"""
+        flow = self.system.trial_flow
+        if flow is None:
+            return None
+        transform = self.system.transform_manager
+        if flow.state in (STATE_GO_CUE, STATE_NAVIGATING):
+            marker_x, marker_z = transform.wall_markers[self.system.wall_marker]['real_pos']
+            distance = math.hypot(marker_x, marker_z)
+            scale = max(0.0, distance - MARKER_STOP_DISTANCE) / distance if distance > 0 else 0.0
+            return (marker_x * scale, marker_z * scale)
+        if flow.state == STATE_SEARCHING:
+            return transform.hidden_targets[self.system.hidden_target]['center']
+        return None
+
+    def advance(self, now):
+        """注入 (上次调用, now] 之间的所有动捕帧"""
+        if self.last_time is None:
+            self.last_time = now
+            return
+        self.navigator.set_goal(self._navigator_goal(), self.last_time)
+
+        while self.last_time + self.frame_interval <= now:
+            self.last_time += self.frame_interval
+            for participant in self.participants:
+                participant.step(self.last_time, self.frame_interval)
+            self.frame_number += 1
+            self.lsl_manager.inject_mocap_data(self._build_frame(), self.frame_number)
+
+    def _build_frame(self):
+        """构造一帧Markerset数据（model_name与NatNet解码结果一样为bytes）"""
+        mocap_data = MoCapData.MoCapData()
+        mocap_data.set_prefix_data(MoCapData.FramePrefixData(self.frame_number))
+        marker_set_data = MoCapData.MarkerSetData()
+        for participant in self.participants:
+            marker_data = MoCapData.MarkerData()
+            marker_data.set_model_name(participant.name.encode('utf-8'))
+            for pos in participant.marker_positions():
+                marker_data.add_pos(pos)
+            marker_set_data.add_marker_data(marker_data)
+        mocap_data.set_marker_set_data(marker_set_data)
+        return mocap_data
+
+
+class ReplaySource:
+    """原始数据包回放位置来源：按录制时的到达间隔（模拟时钟）注入LSLManager"""
+
+    def __init__(self, lsl_manager, archive_path, loop=False):
+        self.lsl_manager = lsl_manager
+        self.archive_path = archive_path
+        self.loop = loop
+
+        self.reader = None
+        self.packets = None
+        self.pending = None
+        self.first_timestamp = None
+        self.start_time = None
+        self.injected = 0
+        self._open()
+
+    def _open(self):
+        if self.reader:
+            self.reader.close()
+        self.reader = RawPacketReader(self.archive_path)
+        self.packets = iter(self.reader)
+        self.pending = next(self.packets, None)
+        self.first_timestamp = self.pending[0] if self.pending else None
+
+    def advance(self, now):
+        """注入录制时刻不晚于模拟时刻的所有数据包"""
+        if self.start_time is None:
+            self.start_time = now
+
+        while self.pending is not None:
+            timestamp, _, packet = self.pending
+            if timestamp - self.first_timestamp > now - self.start_time:
+                return
+            self.lsl_manager.inject_packet(packet, self.reader.major, self.reader.minor)
+            self.injected += 1
+            self.pending = next(self.packets, None)
+
+            if self.pending is None and self.loop:
+                self._open()
+                self.start_time = now
+
+    def close(self):
+        if self.reader:
+            self.reader.close()
+            self.reader = None
+
+
+class SimulatedObserverKeys:
+    """模拟观察者按键（接口同KeyboardCapture，泊松过程按空格键）"""
+
+    def __init__(self, rate=OBSERVER_KEY_RATE, rng=None):
+        self.rate = rate
+        self.rng = rng or np.random.default_rng()
+        self.keyboard = self  # 与KeyboardCapture一致：keyboard非None时使用队列
+        self.pending = []
+        self.press_count = 0
+
+    def start(self):
+        print(f"✅ 模拟观察者按键: {self.rate:g}次/秒")
+        return True
+
+    def poll(self, dt):
+        """经过dt秒（模拟时间）后按概率产生按键"""
+        if self.rate > 0 and self.rng.random() < 1.0 - math.exp(-self.rate * dt):
+            self.pending.append({'key': 'space', 'timestamp': local_clock(), 'latency': 0.0})
+            self.press_count += 1
+
+    def get_presses(self):
+        presses, self.pending = self.pending, []
+        return presses
+
+    def clear(self):
+        self.pending = []
+
+    def stop(self):
+        pass
+
+    def get_stats(self):
+        return {'threaded': False, 'presses': self.press_count, 'pending': len(self.pending), 'max_latency': 0.0}
+
+
+class HeadlessBenchmark:
+    """逐试次CPU耗时、数据记录吞吐量与Marker时序统计"""
+
+    def __init__(self):
+        self.system = None
+        self.source = None
+        self.observer_keys = None
+
+        self.trial = 0
+        self.trial_cpu = None
+        self.trial_wall = None
+        self.trial_sim = None
+        self.trial_frames = 0
+        self.last_flip = None
+        self.trials = []
+
+        self.start_cpu = None
+        self.start_wall = None
+        self.frames = 0
+
+        # {方法名: {'calls', 'seconds', 'max'}}
+        self.logger_calls = {}
+        # 事件时刻（越界帧/按下时刻）到写入Markers.csv的延迟（秒）
+        self.marker_delays = []
+
+    def attach(self, system, source, observer_keys=None):
+        self.system = system
+        self.source = source
+        self.observer_keys = observer_keys
+        for name in ('log_position', 'log_marker', 'log_behavior'):
+            setattr(system.data_logger, name, self._timed(name, getattr(system.data_logger, name)))
+
+    def _timed(self, name, function):
+        """包装DataLogger方法，统计调用次数与耗时"""
+        stats = self.logger_calls.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max': 0.0})
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            timestamp = kwargs.get('timestamp')
+            if timestamp is not None:
+                self.marker_delays.append(local_clock() - timestamp)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            duration = time.perf_counter() - start
+            stats['calls'] += 1
+            stats['seconds'] += duration
+            stats['max'] = max(stats['max'], duration)
+            return result
+        return wrapper
+
+    def start(self):
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+
+    def on_flip(self, now):
+        """(NullWindow翻转回调) 推进位置来源与模拟按键，试次切换时结算上一试次"""
+        if self.source:
+            self.source.advance(now)
+        if self.observer_keys and self.last_flip is not None:
+            self.observer_keys.poll(now - self.last_flip)
+        self.last_flip = now
+        self.frames += 1
+
+        if self.system is None or self.start_cpu is None:
+            return
+        if self.system.current_trial != self.trial:
+            self._close_trial(now)
+            self.trial = self.system.current_trial
+            self.trial_cpu = time.process_time()
+            self.trial_wall = time.perf_counter()
+            self.trial_sim = now
+            self.trial_frames = 0
+        self.trial_frames += 1
+
+    def _close_trial(self, now):
+        # current_trial超过试次数时为Block结束（非试次）
+        if not self.trial or self.trial > self.system.trial_num or self.trial_cpu is None:
+            return
+        cpu = time.process_time() - self.trial_cpu
+        self.trials.append({
+            'trial': self.trial,
+            'frames': self.trial_frames,
+            'sim_seconds': now - self.trial_sim,
+            'wall_seconds': time.perf_counter() - self.trial_wall,
+            'cpu_seconds': cpu,
+            'cpu_ms_per_frame': cpu / self.trial_frames * 1000.0 if self.trial_frames else 0.0
+        })
+
+    def finish(self):
+        self._close_trial(self.last_flip or 0.0)
+        self.trial_cpu = None
+
+    def report(self):
+        """汇总结果（字典）"""
+        wall = time.perf_counter() - self.start_wall if self.start_wall else 0.0
+        cpu = time.process_time() - self.start_cpu if self.start_cpu else 0.0
+        lsl_manager = self.system.lsl_manager
+
+        logging_stats = {}
+        for name, stats in self.logger_calls.items():
+            logging_stats[name] = {
+                'calls': stats['calls'],
+                'rows_per_second': stats['calls'] / wall if wall > 0 else 0.0,
+                'mean_us': stats['seconds'] / stats['calls'] * 1e6 if stats['calls'] else 0.0,
+                'max_us': stats['max'] * 1e6
+            }
+
+        delays = np.array(self.marker_delays) * 1000.0
+        marker_latency = lsl_manager.marker_latency.snapshot()
+        writer = self.system.data_logger.get_writer_stats()
+
+        return {
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'frames': self.frames,
+            'natnet_frames': lsl_manager.frame_count,
+            'ingest_callback_mean_us': lsl_manager.callback_time.mean * 1e6,
+            'trials': self.trials,
+            'logging': logging_stats,
+            'marker_event_to_log_ms': {
+                'count': int(len(delays)),
+                'mean': float(delays.mean()) if len(delays) else 0.0,
+                'max': float(delays.max()) if len(delays) else 0.0
+            },
+            'marker_queue_latency_ms': {
+                'count': marker_latency['count'],
+                'mean': marker_latency['mean'] * 1000.0,
+                'max': marker_latency['max'] * 1000.0
+            },
+            'native_position': {
+                'frames': self.system.data_logger.native_frame_count,
+                'rows': self.system.data_logger.native_row_count
+            },
+            'writer': {
+                'records': writer['records_written'],
+                'write_errors': writer['write_errors'],
+                'pending': writer['pending'],
+                'max_queue_depth': writer['max_queue_depth'],
+                'flushes': writer['flushes'],
+                'fsyncs': writer['fsyncs'],
+                'queue_latency_mean_ms': writer['queue_latency_mean'] * 1000.0,
+                'queue_latency_max_ms': writer['queue_latency_max'] * 1000.0
+            },
+            'frame_timing': self.system.frame_timer.summaries
+        }
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print("📊 无界面运行基准结果")
+    print("=" * 60)
+    print(f"   总时长: {report['wall_seconds']:.2f}s, CPU: {report['cpu_seconds']:.2f}s, "
+          f"显示帧: {report['frames']}, 动捕帧: {report['natnet_frames']}, "
+          f"帧回调均值: {report['ingest_callback_mean_us']:.1f}us")
+
+    print("\n   试次      帧数   模拟(s)   实际(s)   CPU(s)   CPU/帧(ms)")
+    for trial in report['trials']:
+        print(f"   {trial['trial']:>4} {trial['frames']:>9} {trial['sim_seconds']:>9.2f} "
+              f"{trial['wall_seconds']:>9.2f} {trial['cpu_seconds']:>8.3f} {trial['cpu_ms_per_frame']:>11.3f}")
+
+    print("\n   数据记录:")
+    for name, stats in report['logging'].items():
+        print(f"   {name:<14} {stats['calls']:>7}次  {stats['rows_per_second']:>9.1f}行/秒  "
+              f"均值 {stats['mean_us']:.1f}us  最大 {stats['max_us']:.1f}us")
+    native = report['native_position']
+    if native['frames']:
+        print(f"   {'采集线程位置':<10} {native['rows']:>7}行  ({native['frames']}个NatNet帧)")
+
+    delays = report['marker_event_to_log_ms']
+    queue = report['marker_queue_latency_ms']
+    print(f"\n   Marker: 事件到记录 {delays['count']}个, 均值 {delays['mean']:.3f}ms, 最大 {delays['max']:.3f}ms; "
+          f"排队到发送 均值 {queue['mean']:.3f}ms, 最大 {queue['max']:.3f}ms")
+
+    writer = report['writer']
+    print(f"   写入线程: {writer['records']}行, flush {writer['flushes']}次, fsync {writer['fsyncs']}次, "
+          f"最大队列 {writer['max_queue_depth']}, 排队延迟 均值 {writer['queue_latency_mean_ms']:.3f}ms, "
+          f"最大 {writer['queue_latency_max_ms']:.3f}ms, 写入失败 {writer['write_errors']}行")
+
+
+def build_system(args):
+    """按命令行参数创建实验系统（代替collect_info的GUI对话框）"""
+    if args.phase == 'nav':
+        from Procedures.navigation_phase import NavigationSystem
+        system = NavigationSystem()
+        system.block_id = args.block
+        system.sub_a_id = f"{args.sub_a:03d}"
+        system.sub_b_id = f"{args.sub_b:03d}"
+        system.navigator = args.navigator
+        system.observer = 'B' if args.navigator == 'A' else 'A'
+    else:
+        from Procedures.map_phase import MapLearningSystem
+        system = MapLearningSystem()
+        system.sub_id = f"{args.sub_a:03d}"
+        system.sub_role = 'A'
+        system.sub_name = 'headless'
+
+    system.dyad_id = args.dyad
+    system.session_id = args.session
+    system.trial_num = args.trials
+    return system
+
+
+def build_scripted_source(system, args, rng):
+    """创建模拟被试（导航者从房间中心出发，观察者站在角落）"""
+    transform = system.transform_manager
+    corner = (-transform.room_width / 2.0 + 0.8, -transform.room_height / 2.0 + 0.8)
+
+    if args.phase == 'nav':
+        navigator_id = system.sub_a_id if system.navigator == 'A' else system.sub_b_id
+        observer_id = system.sub_b_id if system.navigator == 'A' else system.sub_a_id
+        navigator = SimulatedParticipant(f"Sub{navigator_id}", (0.0, 0.0), speed=args.walk_speed, rng=rng)
+        others = [SimulatedParticipant(f"Sub{observer_id}", corner, rng=rng)]
+    else:
+        navigator = SimulatedParticipant(f"Sub{system.sub_id}", (0.0, 0.0), speed=args.walk_speed, rng=rng)
+        others = []
+
+    return ScriptedSource(system, navigator, others, mocap_rate=args.mocap_rate)
+
+
+def run(args):
+    """无界面运行一个Block并输出基准结果"""
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    if MoCapData is None:
+        print("❌ NatNetSDK不可用，无法构造模拟帧")
+        return False
+
+    system = build_system(args)
+    if not isinstance(system.lsl_manager, LSLManager):
+        print("❌ 无界面运行需要进程内LSLManager（请关闭USE_INGEST_PROCESS）")
+        return False
+
+    clock = SimClock()
+    benchmark = HeadlessBenchmark()
+    system.window_factory = functools.partial(NullWindow, clock, frame_rate=args.frame_rate,
+                                              speed=args.speed, on_flip=benchmark.on_flip)
+    system.scene_factory = NullScene
+    system.lsl_manager.offline_mode = True
+
+    observer_keys = None
+    if args.phase == 'nav':
+        observer_keys = SimulatedObserverKeys(rate=args.key_rate, rng=rng)
+        system.keyboard_capture = observer_keys
+
+    source = None
+    report = None
+    try:
+        if not system.setup():
+            return False
+        system.exp_clock = clock
+
+        if args.replay:
+            source = ReplaySource(system.lsl_manager, args.replay, loop=args.loop)
+            print(f"📡 回放原始数据包: {Path(args.replay).name} (NatNet {source.reader.major}.{source.reader.minor})")
+        else:
+            source = build_scripted_source(system, args, rng)
+            print(f"🎯 模拟被试: {', '.join(p.name for p in source.participants)}")
+
+        print(f"🚀 无界面运行: {args.trials}个试次, "
+              f"{'不等待' if args.speed <= 0 else f'{args.speed:g}倍速'}, 刷新率 {args.frame_rate:g}Hz")
+
+        benchmark.attach(system, source, observer_keys)
+        benchmark.start()
+        if args.phase == 'nav':
+            system.run_navigation_task()
+        else:
+            system.run_learning_phase()
+        benchmark.finish()
+        report = benchmark.report()
+
+    finally:
+        if isinstance(source, ReplaySource):
+            source.close()
+        system.cleanup()
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=float)
+        print(f"\n💾 基准结果已保存: {args.report}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='无界面运行实验流程（模拟被试或回放录制数据）')
+    parser.add_argument('phase', choices=['map', 'nav'], help='map: Phase 0地图学习, nav: Phase 1导航测量')
+    parser.add_argument('--dyad', type=int, default=DEFAULT_DYAD_ID, help=f'Dyad ID（默认{DEFAULT_DYAD_ID}）')
+    parser.add_argument('--session', type=int, default=1, choices=[1, 2])
+    parser.add_argument('--block', type=int, default=1, choices=[1, 2, 3, 4], help='Block（仅nav）')
+    parser.add_argument('--sub-a', type=int, default=1, help='参与者A ID（map时为学习者）')
+    parser.add_argument('--sub-b', type=int, default=2, help='参与者B ID（仅nav）')
+    parser.add_argument('--navigator', choices=['A', 'B'], default='A', help='导航者（仅nav）')
+    parser.add_argument('--trials', type=int, default=4, help='试次数量')
+    parser.add_argument('--speed', type=float, default=0.0, help='相对实时的倍速，0为不等待（默认0）')
+    parser.add_argument('--frame-rate', type=float, default=60.0, help='模拟显示刷新率（Hz）')
+    parser.add_argument('--mocap-rate', type=float, default=MOCAP_RATE, help='模拟动捕帧率（Hz）')
+    parser.add_argument('--walk-speed', type=float, default=WALK_SPEED, help='导航者步行速度（米/秒）')
+    parser.add_argument('--key-rate', type=float, default=OBSERVER_KEY_RATE, help='观察者按键率（次/秒，仅nav）')
+    parser.add_argument('--replay', help='回放natnet_capture原始数据包归档（代替模拟被试）')
+    parser.add_argument('--loop', action='store_true', help='回放结束后从头循环')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（试次顺序与模拟被试）')
+    parser.add_argument('--report', help='基准结果JSON输出路径')
+    args = parser.parse_args()
+
+    success = run(args)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+NatNet原始数据包录制与回放服务器 (V3.4)
+用于在单台Linux电脑上测试多服务器聚合：录制真实Motive的原始数据包，
+再在不同回环地址上按原始时序回放，模拟多台Motive（单播模式）
+
+用法：
+    # 录制（连接真实Motive，保存60秒）
+    python natnet_replay_server.py record --server-ip 192.168.3.58 --client-ip 192.168.3.55 -o roomA.natnet -d 60
+
+    # 回放两份录制（127.0.0.2与127.0.0.3各模拟一台Motive）
+    python natnet_replay_server.py replay --source roomA.natnet@127.0.0.2 --source roomB.natnet@127.0.0.3 --loop
+"""
+
+import sys
+import time
+import socket
+import struct
+import argparse
+import threading
+from pathlib import Path
+
+# 添加Scripts目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Core.natnet_capture import RawPacketReader, RawPacketWriter
+
+
+# NatNet消息ID
+NAT_CONNECT = 0
+NAT_SERVERINFO = 1
+NAT_KEEPALIVE = 10
+COMMAND_PORT = 1510
+
+
+def build_server_info(major, minor, app_name='PsychoLSL Replay'):
+    """构造NAT_SERVERINFO应答包（应用名称 + 服务器版本 + NatNet版本）"""
+    payload = app_name.encode('utf-8')[:255].ljust(256, b'\x00')
+    payload += struct.pack('BBBB', major, minor, 0, 0)
+    payload += struct.pack('BBBB', major, minor, 0, 0)
+    return struct.pack('<HH', NAT_SERVERINFO, len(payload)) + payload
+
+
+class ReplayServer:
+    """单个回放服务器（模拟一台单播模式的Motive）"""
+
+    def __init__(self, archive_path, server_ip, command_port=COMMAND_PORT, speed=1.0, loop=False):
+        self.archive_path = archive_path
+        self.server_ip = server_ip
+        self.command_port = command_port
+        self.speed = speed
+        self.loop = loop
+
+        self.socket = None
+        self.client_address = None
+        self.running = False
+        self.sent_count = 0
+
+    def _wait_for_client(self):
+        """等待客户端NAT_CONNECT并应答版本信息"""
+        reader = RawPacketReader(self.archive_path)
+        server_info = build_server_info(reader.major, reader.minor)
+        reader.close()
+
+        while self.running and self.client_address is None:
+            try:
+                data, address = self.socket.recvfrom(65536)
+            except socket.timeout:
+                continue
+
+            message_id = struct.unpack('<H', data[:2])[0] if len(data) >= 2 else None
+            if message_id == NAT_CONNECT:
+                self.socket.sendto(server_info, address)
+                self.client_address = address
+                print(f"🔗 [{self.server_ip}] 客户端已连接: {address[0]}:{address[1]}")
+
+    def _drain_commands(self):
+        """(独立线程) 接收客户端的心跳与请求（回放时忽略）"""
+        while self.running:
+            try:
+                self.socket.recvfrom(65536)
+            except (socket.timeout, OSError):
+                continue
+
+    def run(self):
+        """按录制时序向客户端发送数据包"""
+        self.running = True
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.server_ip, self.command_port))
+        self.socket.settimeout(0.5)
+
+        print(f"📡 [{self.server_ip}:{self.command_port}] 等待客户端: {Path(self.archive_path).name}")
+        self._wait_for_client()
+        threading.Thread(target=self._drain_commands, daemon=True).start()
+
+        while self.running:
+            reader = RawPacketReader(self.archive_path)
+            first_timestamp = None
+            start = time.perf_counter()
+
+            for timestamp, _, packet in reader:
+                if not self.running:
+                    break
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+
+                # 按原始到达间隔发送
+                delay = (timestamp - first_timestamp) / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+                self.socket.sendto(packet, self.client_address)
+                self.sent_count += 1
+
+            reader.close()
+            if not self.loop:
+                break
+
+        print(f"✅ [{self.server_ip}] 回放结束，共发送 {self.sent_count} 个数据包")
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+
+def run_record(args):
+    """录制真实Motive的原始数据包"""
+    from Core.lsl_manager import CapturingNatNetClient
+
+    try:
+        from pylsl import local_clock
+    except ImportError:
+        local_clock = time.time
+
+    if not CapturingNatNetClient:
+        print("❌ NatNetSDK不可用")
+        return False
+
+    client = CapturingNatNetClient()
+    client.set_client_address(args.client_ip)
+    client.set_server_address(args.server_ip)
+    client.set_use_multicast(args.multicast)
+    client.set_print_level(0)
+    client.capture_packets = True
+
+    writer = None
+
+    def on_frame(data_dict):
+        if writer and client.current_packet:
+            writer.write(local_clock(), data_dict.get('frame_number', 0), client.current_packet)
+
+    client.new_frame_with_data_listener = on_frame
+
+    if not client.run('d'):
+        print("❌ NatNet客户端启动失败")
+        return False
+
+    time.sleep(2)
+    if not client.connected():
+        print("❌ 无法连接到Motive")
+        client.shutdown()
+        return False
+
+    writer = RawPacketWriter(args.output, client.get_major(), client.get_minor())
+    print(f"⏺️  录制中: {args.output}（NatNet {client.get_major()}.{client.get_minor()}，{args.duration}秒）")
+
+    try:
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        print("\n⚠️  录制被中断")
+
+    client.shutdown()
+    packets = writer.packet_count
+    writer.close()
+    print(f"✅ 录制完成: {packets} 个数据包")
+    return True
+
+
+def run_replay(args):
+    """在回环地址上回放一份或多份录制"""
+    servers = []
+    for source in args.source:
+        archive_path, _, server_ip = source.partition('@')
+        servers.append(ReplayServer(archive_path, server_ip or '127.0.0.1',
+                                    command_port=args.command_port, speed=args.speed, loop=args.loop))
+
+    threads = [threading.Thread(target=server.run, daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        print("\n⚠️  回放被中断")
+        for server in servers:
+            server.stop()
+
+    return True
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='NatNet原始数据包录制与回放 V3.4')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='录制真实Motive的原始数据包')
+    record_parser.add_argument('--server-ip', default='192.168.3.58', help='Motive服务器IP')
+    record_parser.add_argument('--client-ip', default='192.168.3.55', help='本机IP')
+    record_parser.add_argument('--multicast', action='store_true', help='使用组播模式')
+    record_parser.add_argument('--output', '-o', required=True, help='输出文件（.natnet）')
+    record_parser.add_argument('--duration', '-d', type=float, default=60.0, help='录制时长（秒）')
+
+    replay_parser = subparsers.add_parser('replay', help='在回环地址上回放录制')
+    replay_parser.add_argument('--source', action='append', required=True,
+                               help='录制文件@回放地址，如 roomA.natnet@127.0.0.2（可重复）')
+    replay_parser.add_argument('--command-port', type=int, default=COMMAND_PORT, help='命令端口')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='回放速度倍率')
+    replay_parser.add_argument('--loop', action='store_true', help='循环回放')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'record':
+            success = run_record(args)
+        else:
+            success = run_replay(args)
+        sys.exit(0 if success else 1)
+
+    except Exception as e:
+        print(f"❌ 程序错误: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+多服务器NatNet聚合测试工具（V3.4新增）
+连接两台（回放的）Motive服务器，验证时钟映射、时间顺序合并与质量择优
+
+单机测试步骤：
+    1. python natnet_replay_server.py replay --source roomA.natnet@127.0.0.2 --source roomB.natnet@127.0.0.3 --loop
+    2. python test_natnet_aggregator.py --server 127.0.0.2 --server 127.0.0.3 --client-ip 127.0.0.1
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# 添加Scripts目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Core.natnet_aggregator import NatNetAggregator
+from Core.frame_bus import POLICY_LOSSLESS
+
+
+def test_natnet_aggregator(servers, client_ip, duration, frame_rate):
+    """测试多服务器聚合"""
+    print("\n" + "=" * 70)
+    print("多服务器NatNet聚合测试工具")
+    print("=" * 70)
+
+    aggregator = NatNetAggregator(frame_rate=frame_rate)
+    for index, server_ip in enumerate(servers):
+        aggregator.add_source(f"Server{index + 1}", server_ip, client_ip, use_multicast=False)
+
+    # 检查融合帧时间顺序与各服务器的择优比例
+    check = {'last_time': None, 'out_of_order': 0, 'chosen': {}}
+
+    def on_fused(frame):
+        if check['last_time'] is not None and frame['timestamp'] < check['last_time']:
+            check['out_of_order'] += 1
+        check['last_time'] = frame['timestamp']
+        for pose in frame['poses'].values():
+            check['chosen'][pose['source']] = check['chosen'].get(pose['source'], 0) + 1
+
+    aggregator.frame_bus.subscribe('check', on_fused, policy=POLICY_LOSSLESS, threaded=False)
+
+    print("\n1️⃣  连接服务器...")
+    if not aggregator.start():
+        print("⚠️  部分服务器未连接，继续测试")
+
+    print(f"\n2️⃣  接收 {duration} 秒...")
+    start = time.time()
+    try:
+        while time.time() - start < duration:
+            time.sleep(1.0)
+            stats = aggregator.get_stats()
+            elapsed = time.time() - start
+            print(f"   融合帧: {stats['fused_frames']} ({stats['fused_frames'] / elapsed:.1f} Hz), "
+                  f"迟到: {stats['late_frames']}, 待合并: {stats['pending']}, 被试: {stats['subjects']}")
+    except KeyboardInterrupt:
+        print("\n⚠️  测试被中断")
+
+    stats = aggregator.get_stats()
+    aggregator.cleanup()
+
+    print("\n3️⃣  测试结果:")
+    for name, source in stats['sources'].items():
+        offset = source['clock_offset']
+        offset_text = f"{offset:.6f}s" if offset is not None else "N/A"
+        print(f"   {name}: 帧数={source['frames']}, 时钟偏移={offset_text}")
+    print(f"   融合帧: {stats['fused_frames']}, 时间倒序: {check['out_of_order']}")
+    print(f"   择优来源: {check['chosen']}")
+
+    success = stats['fused_frames'] > 0 and check['out_of_order'] == 0
+    print("✅ 聚合测试通过" if success else "❌ 聚合测试失败")
+    return success
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='多服务器NatNet聚合测试')
+    parser.add_argument('--server', action='append', default=None, help='服务器IP（可重复）')
+    parser.add_argument('--client-ip', default='127.0.0.1', help='本机IP')
+    parser.add_argument('--duration', '-d', type=float, default=10.0, help='测试时长（秒）')
+    parser.add_argument('--frame-rate', type=float, default=240.0, help='服务器帧率')
+    args = parser.parse_args()
+
+    try:
+        success = test_natnet_aggregator(args.server or ['127.0.0.2', '127.0.0.3'],
+                                         args.client_ip, args.duration, args.frame_rate)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"❌ 测试错误: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -5,9 +5,12 @@ Utils模块：辅助工具模块
 
 from .config_manager import ConfigLoader
 from .data_logger import DataLogger, get_marker_meaning
+from .frame_timing import FrameTimingRecorder, load_frame_timing
 
 __all__ = [
     'ConfigLoader',
     'DataLogger',
     'get_marker_meaning',
+    'FrameTimingRecorder',
+    'load_frame_timing',
 ]
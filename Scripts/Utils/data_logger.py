@@ -6,14 +6,43 @@
 数据格式：
 - Behavior.csv: Map阶段和Navigation阶段的行为数据
 - Position.csv: Map阶段（单人骨骼）和Navigation阶段（双人骨骼）PsychoPy位置数据
+  （start_native_position_logging后按NatNet帧率在采集线程记录：Timestamp为采集时刻LSL时钟，
+  Frame为Motive帧号；否则由渲染循环记录，Frame为记录器计数）
 - Markers.csv: 所有LSL Marker的文本含义，便于事后分析
+- FrameTiming.csv/.bin: 渲染循环逐帧翻转时序与每试次汇总（由Utils/frame_timing.py写入，共用file_prefix）
+
+异步写入（V3.4）：
+- log_* 只在调用线程生成行并放入记录队列（SimpleQueue，无Python层锁），不做任何文件IO
+- 后台写入线程成批取出记录写入对应CSV，累计行数或距上次刷新时间达到阈值时flush
+- flush(fsync=True) 在试次边界把已写入的数据落盘；close() 等待队列写完后再关闭文件
+- log_marker 仍在调用线程立即发送LSL Marker，只有Markers.csv的写入进入队列
+- 排队延迟（入队到写入）与队列深度计入统计，写入data_summary.json
+- 按NatNet帧率记录位置时，采集线程每帧只生成本帧所有被试的行并整帧入队一次
 """
 
 import csv
+import os
 from pathlib import Path
+import threading
 import time
 from datetime import datetime
 import logging
+from queue import SimpleQueue, Empty
+
+
+# ========== 异步写入常量 ==========
+RECORD_BEHAVIOR = 'behavior'
+RECORD_POSITION = 'position'
+RECORD_POSITION_ROWS = 'position_rows'  # 一个NatNet帧内所有被试的位置行
+RECORD_MARKER = 'marker'
+RECORD_FLUSH = 'flush'      # 刷新请求（payload: (是否fsync, 完成事件或None)）
+RECORD_STOP = 'stop'        # 写入线程退出
+
+FLUSH_INTERVAL = 0.25       # 距上次刷新超过该时长（秒）时flush
+FLUSH_ROWS = 256            # 累计未刷新行数达到该值时flush
+WRITER_BATCH = 1024         # 写入线程每批最多取出的记录数
+
+NATIVE_POSITION_SUBSCRIBER = 'position_log'  # 帧总线订阅者名称
 
 
 class DataLogger:
@@ -35,6 +64,7 @@ class DataLogger:
         # 会话信息
         self.session_info = None
         self.output_dir = None
+        self.file_prefix = None  # 本会话文件的路径前缀（D001_时间戳），帧时序等附属文件共用
         
         # CSV文件句柄
         self.behavior_file = None
@@ -46,13 +76,39 @@ class DataLogger:
         self.position_writer = None
         self.markers_writer = None
         
-        # 数据缓冲
-        self.position_buffer = []
-        self.buffer_size = 100
+        # 异步写入（记录: (类型, 入队时刻perf_counter, 行或刷新参数)）
+        self.record_queue = SimpleQueue()
+        self.writer_thread = None
+        self.flush_interval = FLUSH_INTERVAL
+        self.flush_rows = FLUSH_ROWS
+        
+        # 写入统计（仅写入线程更新）
+        self.records_written = 0
+        self.write_errors = 0  # 写入失败而丢失的记录数
+        self.flush_count = 0
+        self.fsync_count = 0
+        self.max_queue_depth = 0
+        self.queue_latency_total = 0.0
+        self.queue_latency_max = 0.0
+        
+        # 注册到LSL管理器的遥测（IngestServiceClient无遥测时跳过）
+        telemetry = getattr(lsl_manager, 'telemetry', None)
+        self.queue_latency = None
+        if telemetry is not None:
+            self.queue_latency = telemetry.stat('logger_queue_latency_seconds', '数据记录入队到写入的延迟(s)')
+            telemetry.gauge('logger_queue_size', self.record_queue.qsize, '数据记录待写入队列长度')
         
         # 帧计数
         self.frame_count = 0
         
+        # 按NatNet帧率记录位置（帧总线inline订阅者）
+        self.native_position_logging = False
+        self.native_subjects = []
+        self.to_screen = None
+        self.screen_limit = None
+        self.native_frame_count = 0
+        self.native_row_count = 0
+        
         # LSL时钟基准
         self.lsl_clock_offset = None
     
@@ -78,6 +134,9 @@ class DataLogger:
             # 创建CSV文件
             self._create_csv_files()
             
+            # 启动后台写入线程
+            self._start_writer()
+            
             print(f"✅ 数据会话已创建: {self.output_dir}")
             print(f"   Dyad ID: D{dyad_id:03d}")
             print(f"   Session: S{session_id}")
@@ -134,6 +193,7 @@ class DataLogger:
             session_timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             dyad_id = self.session_info['dyad_id']
             session_id = self.session_info['session_id']
+            self.file_prefix = self.output_dir / f'D{dyad_id:03d}_{session_timestamp}'
             
             # Behavior.csv (V3.0新格式，支持追加模式)
             behavior_filename = f'D{dyad_id:03d}_{session_timestamp}.Behavior.csv'
@@ -166,7 +226,7 @@ class DataLogger:
             # 写入Position表头 (V3.0格式)
             self.position_writer.writerow([
                 'SubID', 'SubRole', 'Phase', 'Session', 'Block', 'IsNavigation',
-                'Timestamp', 'Raw_x', 'Raw_y', 'Pos_x', 'Pos_y', 'Frame'
+                'Timestamp', 'Raw_x', 'Raw_y', 'Pos_x', 'Pos_y', 'Frame', 'Trial'
             ])
             print(f"✅ 创建Position文件: {position_filename}")
             
@@ -178,7 +238,7 @@ class DataLogger:
             
             # 写入Markers表头
             self.markers_writer.writerow([
-                'Timestamp', 'Marker', 'Meaning', 'Trial', 'Phase', 'Additional_Info'
+                'Timestamp', 'Event_Timestamp', 'Marker', 'Meaning', 'Trial', 'Phase', 'Additional_Info'
             ])
             print(f"✅ 创建Markers文件: {markers_filename}")
             
@@ -188,6 +248,141 @@ class DataLogger:
             self.logger.error(f"创建CSV文件错误: {e}")
             return False
     
+    def _start_writer(self):
+        """启动后台写入线程"""
+        if self.writer_thread and self.writer_thread.is_alive():
+            return
+        self.writer_thread = threading.Thread(target=self._writer_loop, name='DataLoggerWriter', daemon=True)
+        self.writer_thread.start()
+    
+    def _enqueue(self, kind, payload):
+        """(调用线程) 放入记录队列"""
+        self.record_queue.put((kind, time.perf_counter(), payload))
+    
+    def _writer_loop(self):
+        """(独立线程) 成批写入记录，按行数/时间策略flush，收到停止记录后写完剩余数据退出"""
+        pending = 0
+        last_flush = time.perf_counter()
+        running = True
+        
+        while running:
+            try:
+                batch = [self.record_queue.get(timeout=self.flush_interval)]
+            except Empty:
+                batch = []
+            
+            # 取出已排队的记录（最多WRITER_BATCH条）
+            while len(batch) < WRITER_BATCH:
+                try:
+                    batch.append(self.record_queue.get_nowait())
+                except Empty:
+                    break
+            
+            now = time.perf_counter()
+            if batch:
+                self.max_queue_depth = max(self.max_queue_depth, len(batch) + self.record_queue.qsize())
+            
+            # 逐条处理：单条记录写入失败不影响同批其余记录，flush/停止记录总会被处理
+            for kind, queued_at, payload in batch:
+                if kind == RECORD_STOP:
+                    running = False
+                elif kind == RECORD_FLUSH:
+                    fsync, done = payload
+                    try:
+                        self._flush_files(fsync)
+                    except Exception as e:
+                        self.logger.error(f"刷新数据文件错误: {e}")
+                    finally:
+                        pending = 0
+                        last_flush = now
+                        if done is not None:
+                            done.set()
+                else:
+                    try:
+                        self._write_record(kind, payload)
+                    except Exception as e:
+                        self.write_errors += 1
+                        self.logger.error(f"写入数据记录错误 ({kind}): {e}")
+                        continue
+                    pending += 1
+                    latency = now - queued_at
+                    self.records_written += 1
+                    self.queue_latency_total += latency
+                    self.queue_latency_max = max(self.queue_latency_max, latency)
+                    if self.queue_latency is not None:
+                        self.queue_latency.update(latency)
+            
+            if pending and (pending >= self.flush_rows or now - last_flush >= self.flush_interval):
+                try:
+                    self._flush_files()
+                except Exception as e:
+                    self.logger.error(f"刷新数据文件错误: {e}")
+                pending = 0
+                last_flush = now
+        
+        try:
+            self._flush_files(fsync=True)
+        except Exception as e:
+            self.logger.error(f"写入线程退出时刷新错误: {e}")
+    
+    def _write_record(self, kind, row):
+        """(写入线程) 写入一行"""
+        if kind == RECORD_POSITION_ROWS:
+            if self.position_writer is not None:
+                self.position_writer.writerows(row)
+            return
+        if kind == RECORD_POSITION:
+            writer = self.position_writer
+        elif kind == RECORD_MARKER:
+            writer = self.markers_writer
+        else:
+            writer = self.behavior_writer
+        if writer is not None:
+            writer.writerow(row)
+    
+    def _flush_files(self, fsync=False):
+        """(写入线程) 刷新所有CSV文件，fsync=True时同时落盘"""
+        for f in (self.behavior_file, self.position_file, self.markers_file):
+            if f is None:
+                continue
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        self.flush_count += 1
+        if fsync:
+            self.fsync_count += 1
+    
+    def flush(self, fsync=False, wait=False, timeout=2.0):
+        """请求写入线程刷新已排队的记录（不阻塞渲染循环）
+        
+        Args:
+            fsync: 是否同时落盘（试次边界使用）
+            wait: 是否等待刷新完成
+            timeout: 等待超时（秒）
+        
+        Returns:
+            bool: wait=True时是否在超时前完成，否则为是否已提交请求
+        """
+        if self.writer_thread is None or not self.writer_thread.is_alive():
+            return False
+        done = threading.Event() if wait else None
+        self._enqueue(RECORD_FLUSH, (fsync, done))
+        return done.wait(timeout) if wait else True
+    
+    def get_writer_stats(self):
+        """异步写入统计（排队延迟为入队到写入，秒）"""
+        written = self.records_written
+        return {
+            'records_written': written,
+            'write_errors': self.write_errors,
+            'pending': self.record_queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'flushes': self.flush_count,
+            'fsyncs': self.fsync_count,
+            'queue_latency_mean': self.queue_latency_total / written if written else 0.0,
+            'queue_latency_max': self.queue_latency_max
+        }
+    
     def log_behavior(self, behavior_data):
         """记录行为数据到Behavior.csv"""
         if self.behavior_writer is None:
@@ -198,8 +393,8 @@ class DataLogger:
             # 获取LSL时间戳
             lsl_timestamp = self._get_lsl_timestamp()
             
-            # 写入行为数据行
-            self.behavior_writer.writerow([
+            # 行为数据行放入写入队列
+            self._enqueue(RECORD_BEHAVIOR, [
                 behavior_data.get('sub_id', ''),           # SubID
                 behavior_data.get('sub_role', ''),         # SubRole: A或B
                 behavior_data.get('phase', ''),            # Phase: 0或1
@@ -223,7 +418,6 @@ class DataLogger:
                 behavior_data.get('per_acc', 0.0)          # PerAcc
             ])
             
-            self.behavior_file.flush()
             return True
             
         except Exception as e:
@@ -231,7 +425,7 @@ class DataLogger:
             return False
     
     def log_position(self, position_data):
-        """记录位置数据到Position.csv（缓冲模式）"""
+        """记录位置数据到Position.csv（异步写入）"""
         if self.position_writer is None:
             self.logger.warning("Position写入器未初始化")
             return False
@@ -242,8 +436,8 @@ class DataLogger:
             # 获取LSL时间戳
             lsl_timestamp = self._get_lsl_timestamp()
             
-            # 添加到缓冲
-            self.position_buffer.append([
+            # 放入写入队列
+            self._enqueue(RECORD_POSITION, [
                 position_data.get('sub_id', ''),           # SubID
                 position_data.get('sub_role', ''),         # SubRole: A或B
                 position_data.get('phase', ''),            # Phase: 0或1
@@ -255,47 +449,143 @@ class DataLogger:
                 position_data.get('raw_y', ''),            # Raw_y (Motive原始坐标)
                 position_data.get('pos_x', ''),            # Pos_x (PsychoPy屏幕坐标)
                 position_data.get('pos_y', ''),            # Pos_y (PsychoPy屏幕坐标)
-                self.frame_count                           # Frame
+                self.frame_count,                          # Frame
+                position_data.get('trial', self._current_trial())  # Trial
             ])
             
-            # 缓冲满时写入
-            if len(self.position_buffer) >= self.buffer_size:
-                self.flush_position_buffer()
-            
             return True
             
         except Exception as e:
             self.logger.error(f"记录位置数据错误: {e}")
             return False
     
+    def start_native_position_logging(self, subjects, to_screen, screen_limit=None):
+        """订阅LSL管理器帧总线，在采集线程按NatNet帧率记录位置（V3.4）
+        
+        每个NatNet帧记录本帧有更新的被试（未滤波位置），Timestamp为采集时刻（LSL时钟），
+        Frame为Motive帧号，Trial取自LSLManager.set_trial_context，与渲染帧率无关
+        
+        Args:
+            subjects: [{'names': 骨骼名称候选列表, 'sub_id', 'sub_role', 'phase', 'session',
+                        'block', 'is_navigation'}]
+            to_screen: 坐标转换函数 (x_real, z_real) -> (x_screen, y_screen)
+            screen_limit: 屏幕坐标限制范围（±像素，与渲染循环的场景范围一致），None表示不限制
+        
+        Returns:
+            bool: 是否已订阅（采集在独立进程时无帧总线，调用方应继续在渲染循环中调用log_position）
+        """
+        frame_bus = getattr(self.lsl_manager, 'frame_bus', None)
+        if frame_bus is None:
+            print("⚠️  位置采集不在本进程，Position.csv仍按渲染帧记录")
+            return False
+        if self.position_writer is None:
+            self.logger.warning("Position写入器未初始化")
+            return False
+        
+        try:
+            self.native_subjects = [dict(subject, names=list(subject['names'])) for subject in subjects]
+            self.to_screen = to_screen
+            self.screen_limit = screen_limit
+            frame_bus.subscribe(NATIVE_POSITION_SUBSCRIBER, self._log_native_positions, threaded=False)
+            self.native_position_logging = True
+            
+            print(f"✅ Position.csv按NatNet帧率记录: "
+                  f"{', '.join(str(subject['sub_id']) for subject in self.native_subjects)}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"订阅帧总线错误: {e}")
+            return False
+    
+    def stop_native_position_logging(self):
+        """取消帧总线订阅"""
+        if not self.native_position_logging:
+            return
+        try:
+            self.lsl_manager.frame_bus.unsubscribe(NATIVE_POSITION_SUBSCRIBER)
+        except Exception as e:
+            self.logger.error(f"取消帧总线订阅错误: {e}")
+        self.native_position_logging = False
+    
+    def _log_native_positions(self, data_dict):
+        """(帧总线inline订阅者，接收线程) 本帧有更新的被试位置整帧入队"""
+        recv_time = data_dict['recv_time']
+        frame_number = data_dict.get('frame_number')
+        if frame_number is None:
+            frame_number = data_dict['local_frame_number']
+        trial = self._current_trial()
+        
+        rows = []
+        for subject in self.native_subjects:
+            for name in subject['names']:
+                pose = self.lsl_manager.get_latest_skeleton_data(name)
+                if pose and pose['timestamp'] == recv_time:
+                    break
+            else:
+                continue
+            
+            x_screen, y_screen = self.to_screen(pose['x'], pose['z'])
+            if self.screen_limit is not None:
+                x_screen = max(-self.screen_limit, min(self.screen_limit, x_screen))
+                y_screen = max(-self.screen_limit, min(self.screen_limit, y_screen))
+            rows.append([
+                subject['sub_id'],          # SubID
+                subject['sub_role'],        # SubRole
+                subject['phase'],           # Phase
+                subject['session'],         # Session
+                subject['block'],           # Block
+                subject['is_navigation'],   # IsNavigation
+                data_dict['lsl_time'],      # Timestamp (采集时刻LSL时钟)
+                pose['x'],                  # Raw_x
+                pose['z'],                  # Raw_y
+                x_screen,                   # Pos_x
+                y_screen,                   # Pos_y
+                frame_number,               # Frame (Motive帧号)
+                trial                       # Trial
+            ])
+        
+        if rows:
+            self.native_frame_count += 1
+            self.native_row_count += len(rows)
+            self._enqueue(RECORD_POSITION_ROWS, rows)
+    
+    def _current_trial(self):
+        """当前试次（LSLManager.set_trial_context设置，试次外为空）"""
+        trial_context = getattr(self.lsl_manager, 'trial_context', None)
+        if trial_context and trial_context[0] is not None:
+            return trial_context[0]
+        return ''
+    
     def flush_position_buffer(self):
-        """刷新位置数据缓冲到文件"""
-        if self.position_writer and self.position_buffer:
-            try:
-                self.position_writer.writerows(self.position_buffer)
-                self.position_file.flush()
-                self.position_buffer.clear()
-                
-            except Exception as e:
-                self.logger.error(f"刷新位置缓冲错误: {e}")
+        """刷新位置数据到文件（兼容旧接口，由写入线程执行）"""
+        return self.flush()
     
-    def log_marker(self, marker_code, meaning="", trial="", phase="", additional_info=""):
-        """记录LSL Marker的文本含义到Markers.csv"""
+    def log_marker(self, marker_code, meaning="", trial="", phase="", additional_info="",
+                   timestamp=None, event_time=None):
+        """记录LSL Marker的文本含义到Markers.csv
+        
+        Args:
+            timestamp: Marker时间戳（LSL时钟），None表示当前时刻
+            event_time: 原始事件时刻（LSL时钟），写入Event_Timestamp列，None时与timestamp相同
+        """
         if self.markers_writer is None:
             self.logger.warning("Markers写入器未初始化")
             return False
         
         try:
             # 获取LSL时间戳
-            lsl_timestamp = self._get_lsl_timestamp()
+            lsl_timestamp = timestamp if timestamp is not None else self._get_lsl_timestamp()
+            if event_time is None:
+                event_time = lsl_timestamp
             
             # 如果没有提供含义，查找预定义含义
             if not meaning:
                 meaning = get_marker_meaning(marker_code)
             
-            # 写入标记数据
-            self.markers_writer.writerow([
+            # 标记数据行放入写入队列
+            self._enqueue(RECORD_MARKER, [
                 lsl_timestamp,      # Timestamp (LSL时钟)
+                event_time,         # Event_Timestamp (原始事件时刻)
                 marker_code,        # Marker (TTL代码)
                 meaning,            # Meaning (文本含义)
                 trial,              # Trial
@@ -303,12 +593,10 @@ class DataLogger:
                 additional_info     # Additional_Info
             ])
             
-            self.markers_file.flush()
-            
             # 同步发送到LSL流（V3.3修复：确保内部记录和LSL流同步）
             if hasattr(self, 'lsl_manager') and self.lsl_manager:
                 try:
-                    success = self.lsl_manager.send_marker(marker_code, meaning)
+                    success = self.lsl_manager.send_marker(marker_code, meaning, timestamp=timestamp)
                     if success:
                         self.logger.debug(f"LSL Marker已同步发送: {marker_code} ({meaning})")
                     else:
@@ -324,6 +612,53 @@ class DataLogger:
             self.logger.error(f"记录标记错误: {e}")
             return False
     
+    def log_marker_on_flip(self, win, marker_code, meaning="", trial="", phase="",
+                           additional_info="", event_time=None):
+        """在下一次win.flip()时记录Marker（视觉事件对齐屏幕翻转时刻）
+        
+        通过PsychoPy的callOnFlip注册回调，Marker时间戳为翻转时刻（映射到LSL时钟），
+        调用时刻（或传入的event_time）作为原始事件时刻写入Event_Timestamp列
+        
+        Args:
+            win: PsychoPy窗口
+            event_time: 原始事件时刻（LSL时钟），None表示当前时刻
+        """
+        if event_time is None:
+            event_time = self._get_lsl_timestamp()
+        
+        try:
+            win.callOnFlip(self._log_flip_marker, win, marker_code, meaning,
+                           trial, phase, additional_info, event_time)
+            return True
+        except Exception as e:
+            # 无法注册翻转回调时立即记录，保证Marker不丢失
+            self.logger.warning(f"callOnFlip注册失败，立即记录Marker: {e}")
+            return self.log_marker(marker_code, meaning, trial, phase, additional_info,
+                                   event_time=event_time)
+    
+    def _log_flip_marker(self, win, marker_code, meaning, trial, phase, additional_info, event_time):
+        """(flip回调) 以翻转时刻为时间戳记录Marker"""
+        flip_time = self._get_flip_lsl_timestamp(win)
+        self.log_marker(marker_code, meaning, trial, phase, additional_info,
+                        timestamp=flip_time, event_time=event_time)
+    
+    def _get_flip_lsl_timestamp(self, win):
+        """获取最近一次翻转时刻（LSL时钟）
+        
+        PsychoPy在翻转完成后立即执行callOnFlip回调，win._frameTime为翻转时刻（PsychoPy时钟）。
+        按"距翻转已过去的时间"映射到LSL时钟，避免依赖两个时钟的绝对基准
+        """
+        lsl_now = self._get_lsl_timestamp()
+        try:
+            from psychopy import core
+            frame_time = getattr(win, '_frameTime', None)
+            if frame_time is None:
+                return lsl_now
+            age = core.getTime() - frame_time
+            return lsl_now - max(0.0, age)
+        except Exception:
+            return lsl_now
+    
     def generate_summary(self):
         """生成数据汇总报告"""
         try:
@@ -331,7 +666,12 @@ class DataLogger:
                 'session_info': self.session_info,
                 'output_dir': str(self.output_dir),
                 'total_frames': self.frame_count,
-                'buffer_size': len(self.position_buffer),
+                'native_position': {
+                    'enabled': bool(self.native_subjects),
+                    'frames': self.native_frame_count,
+                    'rows': self.native_row_count
+                },
+                'writer': self.get_writer_stats(),
                 'lsl_clock_offset': self.lsl_clock_offset,
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
@@ -344,7 +684,15 @@ class DataLogger:
             
             print(f"📊 数据汇总:")
             print(f"   总帧数: {self.frame_count}")
-            print(f"   缓冲大小: {len(self.position_buffer)}")
+            if self.native_frame_count:
+                print(f"   NatNet位置: {self.native_frame_count}帧, {self.native_row_count}行")
+            writer_stats = summary['writer']
+            print(f"   写入记录: {writer_stats['records_written']} (待写入 {writer_stats['pending']}, "
+                  f"最大队列 {writer_stats['max_queue_depth']})")
+            if writer_stats['write_errors']:
+                print(f"   ⚠️  写入失败: {writer_stats['write_errors']} 条记录")
+            print(f"   排队延迟: 均值 {writer_stats['queue_latency_mean'] * 1000:.2f}ms, "
+                  f"最大 {writer_stats['queue_latency_max'] * 1000:.2f}ms")
             print(f"   汇总文件: {summary_file}")
             
             return summary
@@ -356,8 +704,14 @@ class DataLogger:
     def close(self):
         """关闭数据记录器并清理资源"""
         try:
-            # 刷新缓冲
-            self.flush_position_buffer()
+            # 先停止采集线程入队，再等待写入线程写完队列中的记录
+            self.stop_native_position_logging()
+            if self.writer_thread:
+                self._enqueue(RECORD_STOP, None)
+                self.writer_thread.join(timeout=10.0)
+                if self.writer_thread.is_alive():
+                    self.logger.warning(f"写入线程未在超时内结束，剩余 {self.record_queue.qsize()} 条记录")
+                self.writer_thread = None
             
             # 关闭文件
             if self.behavior_file:
@@ -0,0 +1,245 @@
+"""
+帧时序记录工具 (V3.4)
+逐帧记录渲染循环的翻转时刻（LSL时钟）、位置读取耗时与绘制耗时，试次结束时输出汇总，
+用于确认显示是否按刷新率翻转、掉帧发生在哪个环节
+
+数据格式（与Behavior.csv同目录、同前缀）：
+- FrameTiming.csv: 每试次一行汇总（帧间隔均值/分位数、掉帧数、最长卡顿及其发生时的各环节耗时，毫秒）
+- FrameTiming.bin: 每帧一条定长记录（FRAME_RECORD_DTYPE，小端），按试次依次追加，
+  用 load_frame_timing(path) 读取为numpy结构化数组
+
+使用方式（渲染循环内）：
+    timer.frame_start()
+    update_positions(); timer.position_read()
+    draw_scene();       timer.drawn()
+    win.flip();         timer.flipped()
+"""
+
+import csv
+import time
+import logging
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from pylsl import local_clock
+except ImportError:
+    local_clock = time.time
+
+
+# ========== 记录格式常量 ==========
+FRAME_RECORD_DTYPE = np.dtype([
+    ('trial', '<i4'),
+    ('phase', '<i1'),
+    ('frame_start', '<f8'),     # 帧开始时刻（LSL时钟，秒）
+    ('flip_time', '<f8'),       # 翻转返回时刻（LSL时钟，秒）
+    ('position_read', '<f4'),   # 位置读取耗时（秒）
+    ('draw', '<f4'),            # 绘制耗时（秒）
+])
+
+# 帧间隔超过刷新间隔的该倍数时计为掉帧
+DROPPED_FRAME_FACTOR = 1.5
+
+SUMMARY_HEADER = [
+    'Trial', 'Phase', 'Frames', 'Refresh_ms', 'Interval_Mean_ms', 'Interval_P50_ms',
+    'Interval_P95_ms', 'Interval_P99_ms', 'Interval_Max_ms', 'Dropped_Frames',
+    'PositionRead_Mean_ms', 'Draw_Mean_ms', 'Stall_Time', 'Stall_PositionRead_ms', 'Stall_Draw_ms'
+]
+
+# 汇总字典键（与SUMMARY_HEADER列顺序一致）
+SUMMARY_KEYS = [
+    'trial', 'phase', 'frames', 'refresh', 'interval_mean', 'interval_p50',
+    'interval_p95', 'interval_p99', 'interval_max', 'dropped',
+    'position_read_mean', 'draw_mean', 'stall_time', 'stall_position_read', 'stall_draw'
+]
+
+# 毫秒统计列（写入时保留3位小数）
+MS_KEY_SUFFIXES = ('refresh', '_mean', '_p50', '_p95', '_p99', '_max', '_position_read', '_draw')
+
+
+def load_frame_timing(path):
+    """读取FrameTiming.bin为结构化数组"""
+    return np.fromfile(path, dtype=FRAME_RECORD_DTYPE)
+
+
+class FrameTimingRecorder:
+    """逐帧时序记录（预分配数组，渲染循环内无内存分配）"""
+
+    def __init__(self, capacity=36000):
+        """
+        Args:
+            capacity: 单试次预分配帧数（120Hz下约5分钟，超出时扩容一倍）
+        """
+        self.logger = logging.getLogger('FrameTimingRecorder')
+        self.records = np.zeros(capacity, dtype=FRAME_RECORD_DTYPE)
+        self.count = 0
+
+        self.refresh_interval = None
+        self.trial = 0
+        self.phase = 0
+        self._stage_time = None
+
+        self.summary_file = None
+        self.summary_writer = None
+        self.binary_path = None
+        self.summaries = []
+
+    def open(self, file_prefix, refresh_interval=None):
+        """创建汇总文件与二进制记录文件
+
+        Args:
+            file_prefix: 文件前缀（DataLogger.file_prefix，与Behavior.csv同目录同前缀）
+            refresh_interval: 显示器刷新间隔（秒），None时按帧间隔中位数估计
+        """
+        try:
+            self.refresh_interval = refresh_interval
+            file_prefix = Path(file_prefix)
+            summary_path = file_prefix.with_name(file_prefix.name + '.FrameTiming.csv')
+            self.binary_path = file_prefix.with_name(file_prefix.name + '.FrameTiming.bin')
+
+            self.summary_file = open(summary_path, 'w', newline='', encoding='utf-8')
+            self.summary_writer = csv.writer(self.summary_file)
+            self.summary_writer.writerow(SUMMARY_HEADER)
+            self.summary_file.flush()
+
+            print(f"✅ 创建帧时序文件: {summary_path.name}, {self.binary_path.name}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"创建帧时序文件错误: {e}")
+            return False
+
+    def begin_trial(self, trial, phase):
+        """开始记录一个试次"""
+        self.trial = int(trial)
+        self.phase = int(phase)
+        self.count = 0
+        self._stage_time = None
+
+    def frame_start(self):
+        """帧开始（读取位置之前）"""
+        if self.count >= len(self.records):
+            self.records = np.concatenate([self.records, np.zeros(len(self.records), dtype=FRAME_RECORD_DTYPE)])
+        now = local_clock()
+        self.records['frame_start'][self.count] = now
+        self._stage_time = now
+
+    def position_read(self):
+        """位置读取完成"""
+        if self._stage_time is None:
+            return
+        now = local_clock()
+        self.records['position_read'][self.count] = now - self._stage_time
+        self._stage_time = now
+
+    def drawn(self):
+        """绘制完成（翻转之前）"""
+        if self._stage_time is None:
+            return
+        now = local_clock()
+        self.records['draw'][self.count] = now - self._stage_time
+        self._stage_time = now
+
+    def flipped(self):
+        """翻转返回（waitBlanking时即垂直同步时刻），本帧记录完成"""
+        if self._stage_time is None:
+            return
+        i = self.count
+        self.records['flip_time'][i] = local_clock()
+        self.records['trial'][i] = self.trial
+        self.records['phase'][i] = self.phase
+        self.count += 1
+        self._stage_time = None
+
+    def end_trial(self):
+        """结束试次：写入汇总行与原始记录
+
+        Returns:
+            dict: 试次汇总（毫秒），无帧时为None
+        """
+        frames = self.records[:self.count]
+        self._stage_time = None
+        if len(frames) == 0:
+            return None
+
+        try:
+            summary = self._summarize(frames)
+            self.summaries.append(summary)
+
+            if self.summary_writer:
+                self.summary_writer.writerow([
+                    round(summary[key], 3) if key.endswith(MS_KEY_SUFFIXES) else summary[key]
+                    for key in SUMMARY_KEYS
+                ])
+                self.summary_file.flush()
+
+            if self.binary_path:
+                with open(self.binary_path, 'ab') as f:
+                    frames.tofile(f)
+
+            print(f"   🖥️  帧时序: {summary['frames']}帧, 间隔均值 {summary['interval_mean']:.2f}ms "
+                  f"(P99 {summary['interval_p99']:.2f}ms), 掉帧 {summary['dropped']}, "
+                  f"最长卡顿 {summary['interval_max']:.1f}ms")
+            if summary['dropped']:
+                self.logger.warning(f"Trial {self.trial} 掉帧 {summary['dropped']}，"
+                                    f"最长卡顿 {summary['interval_max']:.1f}ms "
+                                    f"(位置读取 {summary['stall_position_read']:.2f}ms, 绘制 {summary['stall_draw']:.2f}ms)")
+            return summary
+
+        except Exception as e:
+            self.logger.error(f"写入帧时序错误: {e}")
+            return None
+
+    def _summarize(self, frames):
+        """计算帧间隔统计（毫秒）"""
+        intervals = np.diff(frames['flip_time'])
+        refresh = self.refresh_interval
+        if not refresh:
+            refresh = float(np.median(intervals)) if len(intervals) else 0.0
+
+        summary = {
+            'trial': self.trial,
+            'phase': self.phase,
+            'frames': len(frames),
+            'refresh': refresh * 1000.0,
+            'position_read_mean': float(frames['position_read'].mean()) * 1000.0,
+            'draw_mean': float(frames['draw'].mean()) * 1000.0,
+        }
+
+        if len(intervals) == 0 or refresh <= 0:
+            summary.update(interval_mean=0.0, interval_p50=0.0, interval_p95=0.0, interval_p99=0.0,
+                           interval_max=0.0, dropped=0, stall_time='', stall_position_read=0.0, stall_draw=0.0)
+            return summary
+
+        p50, p95, p99 = np.percentile(intervals, [50, 95, 99])
+        late = intervals > DROPPED_FRAME_FACTOR * refresh
+        dropped = int(np.maximum(np.rint(intervals[late] / refresh) - 1, 1).sum())
+
+        # 最长卡顿归因到间隔结束的那一帧（该帧的位置读取/绘制耗时）
+        worst = int(np.argmax(intervals))
+        stall_frame = frames[worst + 1]
+
+        summary.update(
+            interval_mean=float(intervals.mean()) * 1000.0,
+            interval_p50=float(p50) * 1000.0,
+            interval_p95=float(p95) * 1000.0,
+            interval_p99=float(p99) * 1000.0,
+            interval_max=float(intervals[worst]) * 1000.0,
+            dropped=dropped,
+            stall_time=float(stall_frame['frame_start']),
+            stall_position_read=float(stall_frame['position_read']) * 1000.0,
+            stall_draw=float(stall_frame['draw']) * 1000.0
+        )
+        return summary
+
+    def close(self):
+        """关闭汇总文件"""
+        try:
+            if self.summary_file:
+                self.summary_file.close()
+                self.summary_file = None
+                self.summary_writer = None
+        except Exception as e:
+            self.logger.error(f"关闭帧时序文件错误: {e}")
+